@@ -4,6 +4,7 @@ from .config.config import Config
 from .models.db import db, migrate
 from .utils.error_handlers import register_error_handlers
 from .utils.middleware_config import configure_transaction_middlewares
+from .utils.metrics import init_metrics
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -37,12 +38,16 @@ def create_app(config_class=Config):
     from .routes.rules import bp as rules_bp
     from .routes.users import bp as users_bp
     from .routes.bank_accounts import bp as bank_accounts_bp
+    from .routes.jobs import bp as jobs_bp
+    from .routes.pipeline import bp as pipeline_bp
     
     app.register_blueprint(transactions_bp)
     app.register_blueprint(categories_bp)
     app.register_blueprint(rules_bp)
     app.register_blueprint(users_bp)
     app.register_blueprint(bank_accounts_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(pipeline_bp)
     
     # Create alternative routes for frontend compatibility
     from flask import Blueprint
@@ -67,6 +72,8 @@ def create_app(config_class=Config):
     rules_alt = create_alt_blueprint(rules_bp, '/api/rules', 'alt')
     users_alt = create_alt_blueprint(users_bp, '/api/users', 'alt')
     bank_accounts_alt = create_alt_blueprint(bank_accounts_bp, '/api/bank_accounts', 'alt')
+    jobs_alt = create_alt_blueprint(jobs_bp, '/api/jobs', 'alt')
+    pipeline_alt = create_alt_blueprint(pipeline_bp, '/api/pipeline', 'alt')
     
     # Register alternative blueprints
     app.register_blueprint(transactions_alt)
@@ -74,6 +81,8 @@ def create_app(config_class=Config):
     app.register_blueprint(rules_alt)
     app.register_blueprint(users_alt)
     app.register_blueprint(bank_accounts_alt)
+    app.register_blueprint(jobs_alt)
+    app.register_blueprint(pipeline_alt)
     
     # Register error handlers
     register_error_handlers(app)
@@ -82,6 +91,16 @@ def create_app(config_class=Config):
     with app.app_context():
         configure_transaction_middlewares()
     
+    # Fail import jobs that were interrupted by a restart of the previous process
+    if app.config.get("IMPORT_JOB_RECOVERY"):
+        from .utils.import_jobs import recover_jobs
+        recover_jobs(app)
+    
+    # Request, database and import metrics on /metrics
+    if app.config.get("METRICS_ENABLED"):
+        with app.app_context():
+            init_metrics(app, db.engine)
+    
     @app.route("/api/v1")
     def index():
         """API status endpoint"""
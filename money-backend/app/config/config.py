@@ -1,6 +1,7 @@
 from pathlib import Path
 from dotenv import load_dotenv
 import os
+import tempfile
 
 # Load environment variables from .env file
 env_path = Path(__file__).parent.parent.parent / '.env'
@@ -16,7 +17,43 @@ class Config:
     # TradeRepublic bank account configuration
     TRADEREPUBLIC_IBAN = os.environ.get("TRADEREPUBLIC_IBAN", "DE12345678901234567890")
     TRADEREPUBLIC_SAVING_PLAN_IBAN = os.environ.get("TRADEREPUBLIC_SAVING_PLAN_IBAN", "DE09876543210987654321")
-    
+    MAIN_IBAN = os.environ.get("MAIN_IBAN", "")  # Counterparty IBAN of TradeRepublic deposits
+    TRADEREPUBLIC_DEPOSIT_KEYWORDS = [
+        keyword.strip()
+        for keyword in os.environ.get("TRADEREPUBLIC_DEPOSIT_KEYWORDS", "Einzahlung").split(",")
+        if keyword.strip()
+    ]  # Comma-separated purpose keywords of deposits from MAIN_IBAN, e.g. the sender's name
+
+    # PayPal account configuration
+    PAYPAL_ACCOUNT = os.environ.get("PAYPAL_ACCOUNT", "PayPal")  # Stored as the account IBAN of PayPal transactions
+
+    # Import tuning
+    IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 1000))  # Rows per streamed import chunk
+    DEDUP_LOOKUP_CHUNK_SIZE = int(os.environ.get("DEDUP_LOOKUP_CHUNK_SIZE", 500))  # Hashes per IN (...) lookup
+    IMPORT_BULK_INSERT = os.environ.get("IMPORT_BULK_INSERT", "true").lower() in ("1", "true", "yes")
+    IMPORT_COMMIT_CHUNK_SIZE = int(os.environ.get("IMPORT_COMMIT_CHUNK_SIZE", 1000))  # Rows per executemany + commit
+    IMPORT_ON_DUPLICATE = os.environ.get("IMPORT_ON_DUPLICATE", "ignore")  # "ignore", "update" or "error"
+    IMPORT_JOB_WORKERS = int(os.environ.get("IMPORT_JOB_WORKERS", 2))  # Background import threads per process
+    IMPORT_SPOOL_DIR = os.environ.get("IMPORT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "money-backend-imports"))  # Uploads of queued import jobs
+    IMPORT_JOB_RECOVERY = os.environ.get("IMPORT_JOB_RECOVERY", "true").lower() in ("1", "true", "yes")  # Fail interrupted import jobs on startup; enable in one process only
+    IMPORT_COLUMNAR = os.environ.get("IMPORT_COLUMNAR", "false").lower() in ("1", "true", "yes")  # NumPy columnar middleware mode
+    PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", 1))  # Worker processes for bulk pipeline runs (1 = in-process)
+    PIPELINE_PARALLEL_THRESHOLD = int(os.environ.get("PIPELINE_PARALLEL_THRESHOLD", 20000))  # Min. transactions before using workers
+    PROCESS_CHUNK_SIZE = int(os.environ.get("PROCESS_CHUNK_SIZE", 1000))  # Existing transactions per processing chunk + commit
+    CATEGORY_NAME_CACHE_TTL = float(os.environ.get("CATEGORY_NAME_CACHE_TTL", 30))  # Seconds before the category name map is reloaded
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")  # Prometheus /metrics endpoint
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")  # Bearer token required on /metrics when set
+    PIPELINE_INSTRUMENTATION = os.environ.get("PIPELINE_INSTRUMENTATION", "false").lower() in ("1", "true", "yes")  # Per-middleware timing and counters
+    SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "auto")  # "auto" (full-text index when available) or "like"
+    SEARCH_MIN_TOKEN_LENGTH = int(os.environ.get("SEARCH_MIN_TOKEN_LENGTH", 3))  # Shorter search words use LIKE
+    FINGERPRINT_KEY = os.environ.get("FINGERPRINT_KEY", "")  # Secret key of transaction fingerprints, changing it requires a rehash
+    FINGERPRINT_BACKFILL_CHUNK_SIZE = int(os.environ.get("FINGERPRINT_BACKFILL_CHUNK_SIZE", 5000))  # Transactions per rehash chunk + commit
+    FINGERPRINT_CACHE_ENABLED = os.environ.get("FINGERPRINT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")  # In-memory dedup cache for imports
+    FINGERPRINT_CACHE_TTL = float(os.environ.get("FINGERPRINT_CACHE_TTL", 300))  # Seconds before a user's cached fingerprints are reloaded
+    FINGERPRINT_CACHE_LRU_SIZE = int(os.environ.get("FINGERPRINT_CACHE_LRU_SIZE", 50000))  # Confirmed fingerprints kept per user
+    FINGERPRINT_CACHE_FALSE_POSITIVE_RATE = float(os.environ.get("FINGERPRINT_CACHE_FALSE_POSITIVE_RATE", 0.01))  # Bloom filter target rate
+    STATEMENT_SNIFF_BYTES = int(os.environ.get("STATEMENT_SNIFF_BYTES", 4096))  # Bytes read to detect the format of an upload
+
     @property
     def own_ibans(self):
         """
@@ -2,9 +2,12 @@
 
 from .db import db, migrate
 from .category import Category
+from .category_closure import CategoryClosure
 from .transaction import BankTransaction
 from .rule import Rule, RuleCondition
 from .user import User
 from .bank_account import BankAccount
+from .import_job import ImportJob
+from .transaction_rollup import TransactionRollup
 
-__all__ = ['db', 'migrate', 'Category', 'BankTransaction', 'Rule', 'RuleCondition', 'User', 'BankAccount']
\ No newline at end of file
+__all__ = ['db', 'migrate', 'Category', 'CategoryClosure', 'BankTransaction', 'Rule', 'RuleCondition', 'User', 'BankAccount', 'ImportJob', 'TransactionRollup']
\ No newline at end of file
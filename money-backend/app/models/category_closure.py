@@ -0,0 +1,19 @@
+from .db import db
+
+class CategoryClosure(db.Model):
+    """
+    Closure table of the category hierarchy: one row per (ancestor, descendant)
+    pair, including each category as its own ancestor at depth 0.
+    Maintained by app.utils.category_tree.
+    """
+    __tablename__ = 'category_closure'
+    __table_args__ = (
+        db.Index('ix_category_closure_descendant_id', 'descendant_id'),
+    )
+
+    ancestor_id = db.Column(db.Integer, db.ForeignKey("category.id"), primary_key=True, autoincrement=False)
+    descendant_id = db.Column(db.Integer, db.ForeignKey("category.id"), primary_key=True, autoincrement=False)
+    depth = db.Column(db.Integer, nullable=False, default=0)  # Number of parent links between the two
+
+    def __repr__(self):
+        return f"<CategoryClosure {self.ancestor_id} -> {self.descendant_id} ({self.depth})>"
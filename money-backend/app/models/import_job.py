@@ -0,0 +1,25 @@
+from datetime import datetime
+from .db import db
+
+class ImportJob(db.Model):
+    """Model representing a background transaction import job."""
+    __tablename__ = 'import_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued, running, completed, failed
+    filename = db.Column(db.String(255))
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+
+    # Progress counters, updated after every imported chunk
+    rows_parsed = db.Column(db.Integer, nullable=False, default=0)
+    rows_deduplicated = db.Column(db.Integer, nullable=False, default=0)
+    rows_categorized = db.Column(db.Integer, nullable=False, default=0)
+    rows_inserted = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.JSON, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<ImportJob {self.id}: {self.status}>"
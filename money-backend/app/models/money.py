@@ -0,0 +1,57 @@
+"""
+Money Amounts
+
+Transaction amounts are stored as integer cents (BankTransaction.amount_cents),
+so sums are exact. The API and the rule code keep working with euro
+amounts; these helpers convert between the two without going through binary
+floating point where the input is text.
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Any, Optional
+
+_CENT = Decimal("0.01")
+
+
+def parse_amount_cents(text: str) -> int:
+    """
+    Parse a German formatted amount ("-1.234,56") to cents.
+
+    Raises:
+        ValueError: If the text is not a number
+    """
+    # Remove any thousands separators and convert decimal comma to point
+    normalized = text.replace(".", "").replace(",", ".").strip()
+    try:
+        value = Decimal(normalized)
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {text!r}")
+    if not value.is_finite():
+        raise ValueError(f"Invalid amount: {text!r}")
+    return int(value.quantize(_CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+def to_cents(value: Any) -> Optional[int]:
+    """
+    Convert a euro amount (number, Decimal or German formatted string) to cents.
+    Floats are converted through their shortest decimal representation, so 0.1 is 10 cents.
+
+    Raises:
+        ValueError: If a string is not a number
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return parse_amount_cents(value)
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid amount: {value!r}")
+    if isinstance(value, int):
+        return value * 100
+    return int(Decimal(str(value)).quantize(_CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+def from_cents(cents: Optional[int]) -> Optional[float]:
+    """Convert cents to a euro amount."""
+    if cents is None:
+        return None
+    return cents / 100
+
@@ -1,8 +1,23 @@
+from sqlalchemy import literal_column, type_coerce
+from sqlalchemy.ext.hybrid import hybrid_property
+
 from .db import db
+from .money import from_cents, to_cents
 
 class BankTransaction(db.Model):
     """Model representing a bank transaction."""
     __tablename__ = 'bank_transaction'
+    __table_args__ = (
+        # Keyset pagination orders by (booking_date, id)
+        db.Index('ix_bank_transaction_booking_date_id', 'booking_date', 'id'),
+        # Filtered listings sorted by date (per user, per category, per account) and rule re-evaluation
+        db.Index('ix_bank_transaction_user_id_booking_date_id', 'user_id', 'booking_date', 'id'),
+        db.Index('ix_bank_transaction_category_id_booking_date', 'category_id', 'booking_date'),
+        db.Index('ix_bank_transaction_rule_id', 'rule_id'),
+        db.Index('ix_bank_transaction_bank_account_id_booking_date', 'bank_account_id', 'booking_date'),
+        # Full-text search over the text columns (MySQL; SQLite uses an FTS5 table, see app.utils.search)
+        db.Index('ft_bank_transaction_search', 'payee', 'payer', 'purpose', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     booking_date = db.Column(db.Date)
@@ -13,12 +28,13 @@ class BankTransaction(db.Model):
     purpose = db.Column(db.Text)
     transaction_type = db.Column(db.String(50))
     iban = db.Column(db.String(34))
-    amount = db.Column(db.Float)
+    amount_cents = db.Column(db.BigInteger)  # Exact amount in cents, see the amount property for euros
     creditor_id = db.Column(db.String(255))
     mandate_reference = db.Column(db.String(255))
     customer_reference = db.Column(db.String(255))
     category_id = db.Column(db.Integer, db.ForeignKey("category.id"), nullable=True)
     transaction_hash = db.Column(db.String(32), unique=True, index=True, nullable=True)
+    hash_version = db.Column(db.SmallInteger, nullable=True)  # Fingerprint version of transaction_hash, NULL for legacy MD5 hashes, negative for duplicates keeping their MD5 hash
     rule_id = db.Column(db.Integer, db.ForeignKey("rule.id"), nullable=True)
     
     # New fields for bank account management
@@ -39,6 +55,21 @@ class BankTransaction(db.Model):
     
     # New relationship to User
     user = db.relationship("User", back_populates="transactions")
+
+    @hybrid_property
+    def amount(self):
+        """The amount in euros."""
+        return from_cents(self.amount_cents)
+
+    @amount.inplace.setter
+    def _amount_setter(self, value):
+        self.amount_cents = to_cents(value)
+
+    @amount.inplace.expression
+    @classmethod
+    def _amount_expression(cls):
+        # Literal divisor: a bound float parameter would be CAST(... AS FLOAT), which older MySQL rejects
+        return type_coerce(cls.amount_cents / literal_column("100.0"), db.Float).label("amount")
     
     def __repr__(self):
         return f"<BankTransaction {self.id}: {self.amount}>"
\ No newline at end of file
@@ -0,0 +1,26 @@
+from .db import db
+
+class TransactionRollup(db.Model):
+    """
+    Monthly aggregate of bank transactions per user, bank account and category.
+    Key columns use 0 instead of NULL (no user, account or category; year_month 0
+    for transactions without booking date) so they can form the primary key.
+    Maintained by app.utils.rollup.
+    """
+    __tablename__ = 'transaction_rollup'
+    __table_args__ = (
+        db.Index('ix_transaction_rollup_year_month', 'year_month'),
+    )
+
+    user_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    bank_account_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    category_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    year_month = db.Column(db.Integer, primary_key=True, autoincrement=False)  # YYYYMM of the booking date
+
+    total_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    min_cents = db.Column(db.BigInteger, nullable=True)
+    max_cents = db.Column(db.BigInteger, nullable=True)
+
+    def __repr__(self):
+        return f"<TransactionRollup {self.user_id}/{self.bank_account_id}/{self.category_id}/{self.year_month}: {self.transaction_count}>"
@@ -5,5 +5,7 @@ from .categories import bp as categories_bp
 from .rules import bp as rules_bp
 from .users import bp as users_bp
 from .bank_accounts import bp as bank_accounts_bp
+from .jobs import bp as jobs_bp
+from .pipeline import bp as pipeline_bp
 
-__all__ = ['transactions_bp', 'categories_bp', 'rules_bp', 'users_bp', 'bank_accounts_bp']
\ No newline at end of file
+__all__ = ['transactions_bp', 'categories_bp', 'rules_bp', 'users_bp', 'bank_accounts_bp', 'jobs_bp', 'pipeline_bp']
\ No newline at end of file
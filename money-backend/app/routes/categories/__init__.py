@@ -2,6 +2,8 @@ from flask import Blueprint, jsonify, request
 from flask_cors import CORS
 from app.models.db import db
 from app.models.category import Category
+from app.utils import category_tree
+from app.utils.category_tree import CategoryTreeError
 
 bp = Blueprint('categories', __name__, url_prefix='/api/v1/categories')
 
@@ -43,12 +45,21 @@ def create_category():
                 "message": "name is required"
             }), 400
 
+        parent_id = data.get('parent_id')  # Optional parent_id
+        if parent_id is not None and db.session.get(Category, parent_id) is None:
+            return jsonify({
+                "status": "error",
+                "message": f"Parent category {parent_id} does not exist"
+            }), 400
+
         category = Category(
             name=data['name'],
-            parent_id=data.get('parent_id')  # Optional parent_id
+            parent_id=parent_id
         )
         
         db.session.add(category)
+        db.session.flush()
+        category_tree.add_category(category)
         db.session.commit()
 
         return jsonify({
@@ -72,7 +83,8 @@ def update_category(category_id):
         
         if 'name' in data:
             category.name = data['name']
-        if 'parent_id' in data:
+        if 'parent_id' in data and data['parent_id'] != category.parent_id:
+            category_tree.move_category(category.id, data['parent_id'])
             category.parent_id = data['parent_id']
             
         db.session.commit()
@@ -86,6 +98,9 @@ def update_category(category_id):
                 "parent_id": category.parent_id
             }
         }), 200
+    except CategoryTreeError as e:
+        db.session.rollback()
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -109,6 +124,7 @@ def delete_category(category_id):
                 "message": "Cannot delete category that has subcategories"
             }), 400
 
+        category_tree.remove_category(category.id)
         db.session.delete(category)
         db.session.commit()
 
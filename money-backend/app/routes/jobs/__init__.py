@@ -0,0 +1,39 @@
+from flask import Blueprint, jsonify
+from flask_cors import CORS
+from app.models.db import db
+from app.models.import_job import ImportJob
+
+bp = Blueprint('jobs', __name__, url_prefix='/api/v1/jobs')
+
+# Enable CORS for this blueprint
+CORS(bp)
+
+@bp.route('/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Get the status and progress of a background import job.
+    """
+    try:
+        job = db.session.get(ImportJob, job_id)
+        if not job:
+            return jsonify({"status": "error", "message": "Job not found"}), 404
+
+        return jsonify({
+            "status": "success",
+            "data": {
+                "id": job.id,
+                "status": job.status,
+                "filename": job.filename,
+                "user_id": job.user_id,
+                "rows_parsed": job.rows_parsed,
+                "rows_deduplicated": job.rows_deduplicated,
+                "rows_categorized": job.rows_categorized,
+                "rows_inserted": job.rows_inserted,
+                "errors": job.errors or [],
+                "created_at": job.created_at.isoformat() if job.created_at else None,
+                "started_at": job.started_at.isoformat() if job.started_at else None,
+                "finished_at": job.finished_at.isoformat() if job.finished_at else None
+            }
+        }), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
@@ -0,0 +1,73 @@
+from flask import Blueprint, jsonify, request
+from flask_cors import CORS
+from app.utils.transaction_middleware import transaction_pipeline
+from app.utils.fingerprint_cache import fingerprint_cache
+from app.config import config
+
+bp = Blueprint('pipeline', __name__, url_prefix='/api/v1/pipeline')
+
+# Enable CORS for this blueprint
+CORS(bp)
+
+@bp.route('/stats', methods=['GET'])
+def get_stats():
+    """
+    Get the cumulative timing and counters of each middleware in the transaction pipeline.
+    """
+    try:
+        return jsonify({
+            "status": "success",
+            "data": {
+                "instrumented": transaction_pipeline.instrumented,
+                "middlewares": [str(middleware) for middleware in transaction_pipeline.middlewares],
+                "stats": transaction_pipeline.get_stats()
+            }
+        }), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.route('/stats/reset', methods=['POST'])
+def reset_stats():
+    """
+    Reset the middleware counters.
+    """
+    try:
+        transaction_pipeline.reset_stats()
+        return jsonify({"status": "success", "message": "Pipeline stats reset"}), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.route('/fingerprint-cache', methods=['GET'])
+def get_fingerprint_cache_stats():
+    """
+    Get the lookup counters, hit rate and Bloom filter false positive rate of the import fingerprint cache.
+    """
+    try:
+        return jsonify({
+            "status": "success",
+            "data": {
+                "enabled": config.FINGERPRINT_CACHE_ENABLED,
+                "stats": fingerprint_cache.stats()
+            }
+        }), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.route('/instrumentation', methods=['PUT'])
+def set_instrumentation():
+    """
+    Enable or disable middleware instrumentation.
+    Expects JSON: {"enabled": true|false}
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data.get("enabled"), bool):
+            return jsonify({"status": "error", "message": "'enabled' must be a boolean"}), 400
+
+        transaction_pipeline.instrumented = data["enabled"]
+        return jsonify({
+            "status": "success",
+            "data": {"instrumented": transaction_pipeline.instrumented}
+        }), 200
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
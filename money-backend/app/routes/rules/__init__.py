@@ -106,15 +106,10 @@ def update_rule(rule_id):
         rule = Rule.query.get_or_404(rule_id)
         data = request.get_json()
         
-        # Find all transactions affected by this rule
-        from app.models.transaction import BankTransaction
-        affected_transactions = BankTransaction.query.filter_by(rule_id=rule_id).all()
-        affected_count = len(affected_transactions)
-        
-        # Revert the effects: remove category_id and rule_id from affected transactions
-        for transaction in affected_transactions:
-            transaction.category_id = None
-            transaction.rule_id = None
+        # Capture the transactions currently categorized by this rule
+        from app.utils.rule_planner import RuleChangePlanner
+        planner = RuleChangePlanner(rule)
+        affected_count = len(planner.previous_ids)
         
         # Update the rule data
         if 'name' in data:
@@ -125,14 +120,14 @@ def update_rule(rule_id):
             rule.logical_operator = data['logical_operator']
             
         if 'conditions' in data:
-            # Remove existing conditions and flush to ensure they're deleted
-            for condition in rule.conditions:
-                db.session.delete(condition)
+            # Remove existing conditions (delete-orphan) and flush to ensure they're deleted
+            rule.conditions.clear()
             db.session.flush()
             
             # Add new conditions
             for idx, condition_data in enumerate(data['conditions']):
                 if not all(key in condition_data for key in ['field', 'operator', 'value']):
+                    db.session.rollback()
                     return jsonify({
                         "status": "error",
                         "message": "Each condition must have field, operator, and value"
@@ -147,37 +142,26 @@ def update_rule(rule_id):
                 )
                 db.session.add(condition)  # Explicitly add to session
                 rule.conditions.append(condition)
+        db.session.flush()
         
-        # Commit the changes to the rule and transaction updates
-        db.session.commit()
-        
-        # Re-apply the updated rule to all transactions (if requested)
+        # Re-categorize the affected transactions (if requested)
         reapply_rule = data.get('reapply_rule', True)  # Default to True
-        newly_affected_count = 0
-        
         if reapply_rule:
-            from app.utils.rule_engine import RuleEngine
-            # Get all transactions (or we could limit to previously affected ones)
-            all_transactions = BankTransaction.query.all()
-            
-            # Track if we have changes to commit
-            has_changes = False
-            
-            for transaction in all_transactions:
-                # Apply the updated rule to each transaction
-                if RuleEngine.evaluate_rule(transaction, rule):
-                    transaction.category_id = rule.category_id
-                    transaction.rule_id = rule.id
-                    newly_affected_count += 1
-                    has_changes = True
-            
-            # Commit the re-application of rules if any changes were made
-            if has_changes:
-                db.session.commit()
+            # Old matches plus new candidates are re-run through the full ordered rule set
+            changed_count = RuleChangePlanner.apply(planner.plan())
+        else:
+            # Only revert the previous categorizations of this rule
+            changed_count = RuleChangePlanner.apply(
+                {"id": transaction_id, "category_id": None, "rule_id": None}
+                for transaction_id in planner.previous_ids
+            )
+        
+        # Commit the rule and the re-categorization in one transaction
+        db.session.commit()
 
         return jsonify({
             "status": "success",
-            "message": f"Rule updated successfully. {affected_count} previous categorizations reverted, {newly_affected_count} transactions newly categorized.",
+            "message": f"Rule updated successfully. {affected_count} previous categorizations re-evaluated, {changed_count} transactions re-categorized.",
             "data": {
                 "id": rule.id,
                 "name": rule.name,
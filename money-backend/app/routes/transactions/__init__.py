@@ -5,10 +5,30 @@ from app.models.db import db
 from app.models.transaction import BankTransaction
 from app.models.rule import Rule
 from app.models.category import Category
-from app.utils.rule_engine import RuleEngine
+from app.models.money import from_cents, to_cents
+from app.utils import category_tree, rollup
+from app.utils.rule_sql import apply_rule_to_transactions
 from app.utils.transaction_service import TransactionService
-import csv
-import hashlib
+from app.utils.transaction_filter import TransactionFilter
+from app.utils.csv_import import CsvImportError
+from app.utils.statement_parsers import PARSERS, resolve_parser
+from app.utils.import_jobs import enqueue_csv_import
+from app.utils.pagination import InvalidCursorError, keyset_paginate, resolve_sort_column
+from app.utils.search import apply_search
+from app.utils.fast_json import json_response
+from app.utils.transaction_serializer import (
+    CATEGORY_LIST_FIELDS,
+    DETAIL_FIELDS,
+    LIST_FIELDS,
+    SEARCH_FIELDS,
+    UNCATEGORIZED_FIELDS,
+    InvalidFieldsError,
+    category_names,
+    parse_fields,
+    serialize_rows,
+    serialize_transaction,
+    transaction_columns,
+)
 import logging
 import traceback
 from flask_cors import CORS
@@ -29,40 +49,31 @@ def parse_date(date_str, format="%d.%m.%y"):
         return None
 
 
-def generate_transaction_hash(
-    booking_date, value_date, amount, payee, payer, purpose, transaction_type, iban
-):
+def cursor_pagination(query, endpoint, sort_by, sort_order, per_page, **url_values):
     """
-    Generate a unique hash for a transaction to identify duplicates.
-    Combines several fields that together should uniquely identify a transaction.
-
-    Args:
-        booking_date: The booking date of the transaction
-        value_date: The value date of the transaction
-        amount: The transaction amount
-        payee: The recipient of the transaction
-        payer: The sender of the transaction
-        purpose: The purpose/description of the transaction
-        transaction_type: The type of transaction
-        iban: The IBAN involved
+    Paginate a transaction query with keyset cursors instead of page numbers.
+    Used when the request has a "cursor" argument (empty for the first page);
+    include_total=false skips the COUNT(*) query.
 
     Returns:
-        A unique hash string representing the transaction
+        (transactions, pagination metadata)
     """
-    # Convert dates to strings if they're not None, otherwise use empty string
-    booking_date_str = booking_date.isoformat() if booking_date else ""
-    value_date_str = value_date.isoformat() if value_date else ""
-
-    # Create a string combining all the values
-    transaction_str = (
-        f"{booking_date_str}|{value_date_str}|{str(amount)}|"
-        f"{payee or ''}|{payer or ''}|{purpose or ''}|"
-        f"{transaction_type or ''}|{iban or ''}"
-    )
-
-    # Generate an MD5 hash of the combined string
-    # Using MD5 as it's fast and collision probability is low enough for this use case
-    return hashlib.md5(transaction_str.encode("utf-8")).hexdigest()
+    cursor = request.args.get("cursor") or None
+    include_total = request.args.get("include_total", "true").lower() not in ("0", "false", "no")
+    page = keyset_paginate(query, sort_by, sort_order == "desc", per_page, cursor)
+
+    args = dict(request.args)
+    args.pop("cursor", None)
+    args.pop("page", None)
+    args.update(url_values)
+    return page.items, {
+        "per_page": per_page,
+        "total_items": query.order_by(None).count() if include_total else None,
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+        "next_url": url_for(endpoint, cursor=page.next_cursor, **args) if page.has_next else None,
+        "prev_url": url_for(endpoint, cursor=page.prev_cursor, **args) if page.has_prev else None,
+    }
 
 
 @bp.route("/", methods=["GET"])
@@ -91,97 +102,83 @@ def get_transactions():
         min_amount = request.args.get("min_amount", type=float)
         max_amount = request.args.get("max_amount", type=float)
         if min_amount is not None:
-            query = query.filter(BankTransaction.amount >= min_amount)
+            query = query.filter(BankTransaction.amount_cents >= to_cents(min_amount))
         if max_amount is not None:
-            query = query.filter(BankTransaction.amount <= max_amount)
+            query = query.filter(BankTransaction.amount_cents <= to_cents(max_amount))
 
-        # Apply category filter
+        # Apply category filter, including subcategories unless include_subcategories=false
         category_id = request.args.get("category_id", type=int)
         if category_id is not None:
-            query = query.filter(BankTransaction.category_id == category_id)
+            if request.args.get("include_subcategories", "true").lower() == "false":
+                query = query.filter(BankTransaction.category_id == category_id)
+            else:
+                query = query.filter(category_tree.in_subtree(BankTransaction.category_id, category_id))
 
         # Apply search filter
         search = request.args.get("search")
         if search:
-            search = f"%{search}%"
-            query = query.filter(
-                or_(
-                    BankTransaction.payee.ilike(search),
-                    BankTransaction.payer.ilike(search),
-                    BankTransaction.purpose.ilike(search),
-                )
-            )
+            query = apply_search(query, search)
 
-        # Apply sorting
-        sort_by = request.args.get("sort_by", "booking_date")
+        # Apply sorting, unknown sort columns fall back to booking_date
+        sort_by = resolve_sort_column(request.args.get("sort_by"))
         sort_order = request.args.get("sort_order", "desc")
 
-        if hasattr(BankTransaction, sort_by):
+        # Select only the requested fields
+        fields = parse_fields(request.args.get("fields"), LIST_FIELDS)
+        query = query.with_entities(*transaction_columns(fields, sort_by, "id"))
+
+        if "cursor" in request.args:
+            transactions, pagination = cursor_pagination(
+                query, "transactions.get_transactions", sort_by, sort_order, per_page
+            )
+        else:
             sort_column = getattr(BankTransaction, sort_by)
             if sort_order == "desc":
                 query = query.order_by(sort_column.desc())
             else:
                 query = query.order_by(sort_column.asc())
 
-        # Execute paginated query
-        paginated_txs = query.paginate(page=page, per_page=per_page, error_out=False)
+            # Execute paginated query
+            paginated_txs = query.paginate(page=page, per_page=per_page, error_out=False)
 
-        # Prepare pagination metadata
-        args = dict(request.args)
-        if "page" in args:
-            del args["page"]  # Remove page from args to avoid duplication
+            # Prepare pagination metadata
+            args = dict(request.args)
+            if "page" in args:
+                del args["page"]  # Remove page from args to avoid duplication
 
-        next_url = (
-            url_for(
-                "transactions.get_transactions", page=paginated_txs.next_num, **args
+            next_url = (
+                url_for(
+                    "transactions.get_transactions", page=paginated_txs.next_num, **args
+                )
+                if paginated_txs.has_next
+                else None
             )
-            if paginated_txs.has_next
-            else None
-        )
-        prev_url = (
-            url_for(
-                "transactions.get_transactions", page=paginated_txs.prev_num, **args
+            prev_url = (
+                url_for(
+                    "transactions.get_transactions", page=paginated_txs.prev_num, **args
+                )
+                if paginated_txs.has_prev
+                else None
             )
-            if paginated_txs.has_prev
-            else None
-        )
+            transactions = paginated_txs.items
+            pagination = {
+                "page": page,
+                "per_page": per_page,
+                "total_pages": paginated_txs.pages,
+                "total_items": paginated_txs.total,
+                "next_url": next_url,
+                "prev_url": prev_url,
+            }
 
-        return jsonify(
+        return json_response(
             {
                 "status": "success",
-                "data": [
-                    {
-                        "id": tx.id,
-                        "booking_date": tx.booking_date.strftime("%Y-%m-%d")
-                        if tx.booking_date
-                        else None,
-                        "value_date": tx.value_date.strftime("%Y-%m-%d")
-                        if tx.value_date
-                        else None,
-                        "amount": float(tx.amount) if tx.amount else 0.0,
-                        "payee": tx.payee,
-                        "payer": tx.payer,
-                        "purpose": tx.purpose,
-                        "transaction_type": tx.transaction_type,
-                        "iban": tx.iban,
-                        "creditor_id": tx.creditor_id,
-                        "mandate_reference": tx.mandate_reference,
-                        "customer_reference": tx.customer_reference,
-                        "category_id": tx.category_id,
-                        "category_name": tx.category.name if tx.category else None,
-                    }
-                    for tx in paginated_txs.items
-                ],
-                "pagination": {
-                    "page": page,
-                    "per_page": per_page,
-                    "total_pages": paginated_txs.pages,
-                    "total_items": paginated_txs.total,
-                    "next_url": next_url,
-                    "prev_url": prev_url,
-                },
+                "data": serialize_rows(transactions, fields),
+                "pagination": pagination,
             }
         ), 200
+    except (InvalidCursorError, InvalidFieldsError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify(
             {"status": "error", "message": str(e), "error_type": type(e).__name__}
@@ -220,162 +217,64 @@ def import_csv():
 
         logger.debug(f"Processing CSV file: {file.filename}")
 
+        # The parser is selected by the optional "parser" field or detected from the header
         try:
-            csv_lines = file.read().decode("utf-8").splitlines()
-            logger.debug(f"CSV file read, got {len(csv_lines)} lines")
-
-            if len(csv_lines) < 5:
-                logger.error(f"CSV file has too few lines: {len(csv_lines)}")
-                return jsonify(
-                    {
-                        "status": "error",
-                        "message": "CSV file format is invalid - too few lines",
-                    }
-                ), 400
-
-            try:
-                own_iban = csv_lines[0].split(";")[1].strip()
-                logger.debug(f"Extracted own IBAN: {own_iban}")
-            except (IndexError, KeyError) as e:
-                logger.error(f"Failed to extract own IBAN from first line: {str(e)}")
-                return jsonify(
-                    {
-                        "status": "error",
-                        "message": "CSV format error: Could not extract IBAN from header",
-                    }
-                ), 400
-
-            try:
-                reader = csv.DictReader(csv_lines[4:], delimiter=";")
-                logger.debug("CSV DictReader initialized")
-            except Exception as e:
-                logger.error(f"Failed to create CSV reader: {str(e)}")
-                return jsonify(
-                    {
-                        "status": "error",
-                        "message": f"Failed to parse CSV format: {str(e)}",
-                    }
-                ), 400
-        except UnicodeDecodeError as e:
-            logger.error(f"Unicode decode error on CSV file: {str(e)}")
+            parser = resolve_parser(file.stream, request.form.get("parser"))
+        except CsvImportError as e:
+            logger.warning(f"No statement parser for {file.filename}: {str(e)}")
+            return jsonify({"status": "error", "message": str(e)}), 400
+        logger.info(f"Importing {file.filename} with the {parser.name} parser")
+
+        if request.form.get("async", "").lower() in ("1", "true", "yes"):
+            job = enqueue_csv_import(file, user_id, parser.name)
+            logger.info(f"Queued CSV import job {job.id} for {file.filename}")
             return jsonify(
                 {
-                    "status": "error",
-                    "message": "File encoding is not UTF-8. Please convert to UTF-8 and try again.",
-                }
-            ), 400
-
-        # Prepare transaction data list for processing through middleware
-        transaction_data_list = []
-        row_index = 0
-
-        for row in reader:
-            row_index += 1
-            try:
-                logger.debug(f"Processing row {row_index}")
-                if "Betrag (€)" not in row:
-                    logger.error(
-                        f"Missing 'Betrag (€)' column in row {row_index}: {row}"
-                    )
-                    return jsonify(
-                        {
-                            "status": "error",
-                            "message": f"CSV format error: Missing 'Betrag (€)' column in row {row_index}",
-                        }
-                    ), 400
-
-                try:
-                    amount_str = (
-                        row["Betrag (€)"].replace(".", "").replace(",", ".").strip()
-                    )
-                    amount = float(amount_str)
-                    logger.debug(f"Parsed amount: {amount}")
-                except (ValueError, TypeError) as e:
-                    logger.error(
-                        f"Failed to parse amount in row {row_index}: {row['Betrag (€)']} - {str(e)}"
-                    )
-                    return jsonify(
-                        {
-                            "status": "error",
-                            "message": f"Invalid amount format in row {row_index}: {row['Betrag (€)']}",
-                        }
-                    ), 400
-
-                try:
-                    booking_date = parse_date(row["Buchungsdatum"])
-                    value_date = parse_date(row["Wertstellung"])
-                    logger.debug(
-                        f"Parsed dates: booking={booking_date}, value={value_date}"
-                    )
-
-                    if booking_date is None:
-                        logger.warning(
-                            f"Could not parse booking date in row {row_index}: {row['Buchungsdatum']}"
-                        )
-                except KeyError as e:
-                    logger.error(f"Missing date column in row {row_index}: {str(e)}")
-                    return jsonify(
-                        {
-                            "status": "error",
-                            "message": f"CSV format error: Missing date column {str(e)} in row {row_index}",
-                        }
-                    ), 400
-
-                payee = row.get("Zahlungsempfänger*in", "")
-                payer = row.get("Zahlungspflichtige*r", "")
-                purpose = row.get("Verwendungszweck", "")
-                booking_date = row.get("Buchungsdatum", "")
-                value_date = row.get("Wertstellung", "")
-                transaction_type = row.get("Umsatztyp", "")
-                iban = own_iban
-                counterparty_iban = row.get("IBAN", "")
-
-                # Create transaction data dictionary
-                transaction_data = {
-                    "booking_date": booking_date,
-                    "value_date": value_date,
-                    "status": row.get("Status", ""),
-                    "payer": payer,
-                    "payee": payee,
-                    "purpose": purpose,
-                    "transaction_type": transaction_type,
-                    "iban": iban,
-                    "counterparty_iban": counterparty_iban,
-                    "amount": amount,
-                    "creditor_id": row.get("Gläubiger-ID", ""),
-                    "mandate_reference": row.get("Mandatsreferenz", ""),
-                    "customer_reference": row.get("Kundenreferenz", ""),
-                    "user_id": user_id,  # Add the user_id to the transaction data
+                    "status": "success",
+                    "message": "CSV import queued",
+                    "data": {
+                        "job_id": job.id,
+                        "status_url": url_for("jobs.get_job", job_id=job.id),
+                    },
                 }
+            ), 202
 
-                transaction_data_list.append(transaction_data)
-            except Exception as e:
-                logger.error(f"Error processing row {row_index}: {str(e)}")
-                logger.error(f"Row data: {row}")
-                logger.error(f"Stack trace: {traceback.format_exc()}")
-                return jsonify(
-                    {
-                        "status": "error",
-                        "message": f"Error processing row {row_index}: {str(e)}",
-                    }
-                ), 400
+        # Stream the upload through the middleware pipeline and the DB writer in chunks
+        rows = parser.iter_transactions(file.stream, user_id)
+        stats = {}
+        duplicates = []
 
-        # Process transactions through middleware pipeline and save them
-        logger.info(
-            f"Parsed {len(transaction_data_list)} transactions from CSV, now importing through middleware"
-        )
         try:
-            saved_transactions = TransactionService.import_and_save_transactions(
-                transaction_data_list
+            TransactionService.import_transaction_stream(
+                rows, duplicates=duplicates, stats=stats
             )
-            logger.info(f"Successfully imported {len(saved_transactions)} transactions")
-
+        except CsvImportError as e:
+            # Chunks before the failing row are committed, report how far the import got
+            logger.error(f"CSV import aborted after {stats.get('parsed', 0)} rows: {str(e)}")
+            db.session.rollback()
+            location = f" in line {e.line}" if e.line else ""
             return jsonify(
                 {
-                    "status": "success",
-                    "message": f"CSV imported successfully. {len(saved_transactions)} transactions added.",
+                    "status": "error",
+                    "message": f"{str(e)}{location}. The first {stats.get('parsed', 0)} rows were committed "
+                    f"({stats.get('inserted', 0)} transactions imported, the rest duplicates); "
+                    f"fix the file and upload it again, committed rows are skipped as duplicates.",
+                    "data": {
+                        "rows_committed": stats.get("parsed", 0),
+                        "inserted": stats.get("inserted", 0),
+                        "line": e.line,
+                    },
                 }
-            ), 201
+            ), 400
+        except UnicodeDecodeError as e:
+            logger.error(f"Unicode decode error on CSV file: {str(e)}")
+            db.session.rollback()
+            return jsonify(
+                {
+                    "status": "error",
+                    "message": "File encoding is not UTF-8. Please convert to UTF-8 and try again.",
+                }
+            ), 400
         except Exception as e:
             logger.error(
                 f"Error in TransactionService.import_and_save_transactions: {str(e)}"
@@ -386,6 +285,28 @@ def import_csv():
                 {"status": "error", "message": f"Error saving transactions: {str(e)}"}
             ), 500
 
+        imported_count = stats.get("inserted", 0)
+        logger.info(
+            f"Successfully imported {imported_count} of {stats.get('parsed', 0)} transactions, "
+            f"skipped {len(duplicates)} duplicates"
+        )
+
+        return jsonify(
+            {
+                "status": "success",
+                "message": f"CSV imported successfully. {imported_count} transactions added, "
+                f"{len(duplicates)} duplicates skipped.",
+                "duplicates": [
+                    {
+                        "row": duplicate["index"] + 1,
+                        "transaction_hash": duplicate["transaction_hash"],
+                        "reason": duplicate["reason"],
+                    }
+                    for duplicate in duplicates
+                ],
+            }
+        ), 201
+
     except Exception as e:
         logger.error(f"Unhandled exception in CSV import: {str(e)}")
         logger.error(f"Stack trace: {traceback.format_exc()}")
@@ -393,15 +314,28 @@ def import_csv():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@bp.route("/import/parsers", methods=["GET"])
+def get_import_parsers():
+    """List the statement formats an import can select with the "parser" field."""
+    return jsonify(
+        {
+            "status": "success",
+            "data": {
+                "parsers": [{"name": parser.name, "label": parser.label} for parser in PARSERS.values()],
+            },
+        }
+    ), 200
+
+
 @bp.route("/apply-rules", methods=["POST"])
 def apply_rules_to_transactions():
     """Apply rules to all uncategorized transactions using the middleware system."""
     try:
-        # Define a filter function to get only uncategorized transactions
-        filter_func = lambda tx: tx.category_id is None
+        # Select only uncategorized transactions, in SQL
+        transaction_filter = TransactionFilter.uncategorized()
 
         # Process the transactions through the middleware pipeline
-        count = TransactionService.process_existing_transactions(filter_func)
+        count = TransactionService.process_existing_transactions(transaction_filter)
 
         return jsonify(
             {
@@ -421,18 +355,8 @@ def apply_specific_rule_to_transactions(rule_id):
         # Fetch the specific rule
         rule = Rule.query.get_or_404(rule_id)
 
-        # Get all transactions
-        transactions = BankTransaction.query.all()
-
-        # Apply the rule to each transaction
-        updated_count = 0
-        for transaction in transactions:
-            # Evaluate the rule against the transaction
-            if RuleEngine.evaluate_rule(transaction, rule):
-                # If rule matches, update the transaction's category and rule_id
-                transaction.category_id = rule.category_id
-                transaction.rule_id = rule.id
-                updated_count += 1
+        # Categorize every matching transaction with a single UPDATE ... WHERE
+        updated_count = apply_rule_to_transactions(rule)
 
         if updated_count > 0:
             db.session.commit()
@@ -482,30 +406,10 @@ def revert_rule_application(rule_id):
 def get_transaction(transaction_id):
     try:
         tx = BankTransaction.query.get_or_404(transaction_id)
-        return jsonify(
+        return json_response(
             {
                 "status": "success",
-                "data": {
-                    "id": tx.id,
-                    "booking_date": tx.booking_date.strftime("%Y-%m-%d")
-                    if tx.booking_date
-                    else None,
-                    "value_date": tx.value_date.strftime("%Y-%m-%d")
-                    if tx.value_date
-                    else None,
-                    "amount": float(tx.amount) if tx.amount else 0.0,
-                    "payee": tx.payee,
-                    "payer": tx.payer,
-                    "purpose": tx.purpose,
-                    "transaction_type": tx.transaction_type,
-                    "iban": tx.iban,
-                    "creditor_id": tx.creditor_id,
-                    "mandate_reference": tx.mandate_reference,
-                    "customer_reference": tx.customer_reference,
-                    "category_id": tx.category_id,
-                    "category_name": tx.category.name if tx.category else None,
-                    "transaction_hash": tx.transaction_hash,
-                },
+                "data": serialize_transaction(tx),
             }
         ), 200
     except Exception as e:
@@ -533,7 +437,7 @@ def update_transaction_category(transaction_id):
                 "data": {
                     "id": tx.id,
                     "category_id": tx.category_id,
-                    "category_name": tx.category.name if tx.category else None,
+                    "category_name": category_names.get().get(tx.category_id),
                 },
             }
         ), 200
@@ -549,98 +453,58 @@ def get_statistics():
         start_date = request.args.get("start_date")
         end_date = request.args.get("end_date")
 
-        query = BankTransaction.query
-
         if start_date:
             start_date = parse_date(start_date, "%Y-%m-%d")
-            if start_date:
-                query = query.filter(BankTransaction.booking_date >= start_date)
         if end_date:
             end_date = parse_date(end_date, "%Y-%m-%d")
-            if end_date:
-                query = query.filter(BankTransaction.booking_date <= end_date)
 
-        # Calculate overall statistics
-        stats = (
-            db.session.query(
-                func.sum(BankTransaction.amount).label("total_amount"),
-                func.count().label("total_transactions"),
-                func.avg(BankTransaction.amount).label("average_amount"),
-                func.min(BankTransaction.amount).label("min_amount"),
-                func.max(BankTransaction.amount).label("max_amount"),
-            )
-            .filter(query.whereclause)
-            .first()
-        )
+        # One aggregate per category and month, read from the rollup table
+        groups = rollup.aggregate(start_date or None, end_date or None, ("category_id", "year_month"))
 
-        # Calculate category breakdown
-        category_stats = (
-            db.session.query(
-                Category.id,
-                Category.name,
-                func.count().label("transaction_count"),
-                func.sum(BankTransaction.amount).label("total_amount"),
-            )
-            .join(BankTransaction, BankTransaction.category_id == Category.id)
-            .filter(query.whereclause if query.whereclause is not None else True)
-            .group_by(Category.id)
-            .all()
-        )
+        total = [0, 0, None, None]
+        by_category = {}
+        by_month = {}
+        for (category_id, year_month), values in groups.items():
+            rollup.merge_values(total, values)
+            if category_id:
+                rollup.merge_values(by_category.setdefault(category_id, [0, 0, None, None]), values)
+            if year_month:
+                rollup.merge_values(by_month.setdefault(year_month, [0, 0, None, None]), values)
 
-        # Calculate monthly trends
-        monthly_stats = (
-            db.session.query(
-                extract("year", BankTransaction.booking_date).label("year"),
-                extract("month", BankTransaction.booking_date).label("month"),
-                func.sum(BankTransaction.amount).label("total_amount"),
-                func.count().label("transaction_count"),
-            )
-            .filter(query.whereclause if query.whereclause is not None else True)
-            .group_by("year", "month")
-            .order_by("year", "month")
-            .all()
-        )
+        names = category_names.get()
+        total_cents, total_transactions, min_cents, max_cents = total
 
         return jsonify(
             {
                 "status": "success",
                 "data": {
                     "summary": {
-                        "total_amount": float(stats.total_amount)
-                        if stats.total_amount
-                        else 0.0,
-                        "total_transactions": stats.total_transactions,
-                        "average_amount": float(stats.average_amount)
-                        if stats.average_amount
-                        else 0.0,
-                        "min_amount": float(stats.min_amount)
-                        if stats.min_amount
-                        else 0.0,
-                        "max_amount": float(stats.max_amount)
-                        if stats.max_amount
+                        "total_amount": from_cents(total_cents),
+                        "total_transactions": total_transactions,
+                        "average_amount": from_cents(total_cents) / total_transactions
+                        if total_transactions
                         else 0.0,
+                        "min_amount": from_cents(min_cents or 0),
+                        "max_amount": from_cents(max_cents or 0),
                     },
                     "categories": [
                         {
-                            "id": stat.id,
-                            "name": stat.name,
-                            "transaction_count": stat.transaction_count,
-                            "total_amount": float(stat.total_amount)
-                            if stat.total_amount
-                            else 0.0,
+                            "id": category_id,
+                            "name": names[category_id],
+                            "transaction_count": values[1],
+                            "total_amount": from_cents(values[0]),
                         }
-                        for stat in category_stats
+                        for category_id, values in sorted(by_category.items())
+                        if category_id in names
                     ],
                     "monthly_trends": [
                         {
-                            "year": int(stat.year),
-                            "month": int(stat.month),
-                            "total_amount": float(stat.total_amount)
-                            if stat.total_amount
-                            else 0.0,
-                            "transaction_count": stat.transaction_count,
+                            "year": year_month // 100,
+                            "month": year_month % 100,
+                            "total_amount": from_cents(values[0]),
+                            "transaction_count": values[1],
                         }
-                        for stat in monthly_stats
+                        for year_month, values in sorted(by_month.items())
                     ],
                 },
             }
@@ -652,44 +516,43 @@ def get_statistics():
 @bp.route("/category-summary", methods=["GET"])
 def get_category_summary():
     try:
-        # Get statistics for each category
-        category_stats = (
-            db.session.query(
-                Category.id,
-                Category.name,
-                Category.parent_id,
-                func.count(BankTransaction.id).label("transaction_count"),
-                func.sum(BankTransaction.amount).label("total_amount"),
-                func.avg(BankTransaction.amount).label("average_amount"),
-            )
-            .outerjoin(BankTransaction, BankTransaction.category_id == Category.id)
-            .group_by(Category.id)
-            .all()
-        )
+        # Get statistics for each category and for each category's subtree from the rollup table
+        category_stats = rollup.aggregate(group_by=("category_id",))
+        subtree_stats = category_tree.subtree_totals()
+        categories = db.session.query(Category.id, Category.name, Category.parent_id).order_by(Category.id).all()
 
         # Organize categories into a hierarchy
         categories_dict = {}
         root_categories = []
 
-        for stat in category_stats:
-            category_data = {
-                "id": stat.id,
-                "name": stat.name,
-                "transaction_count": stat.transaction_count,
-                "total_amount": float(stat.total_amount) if stat.total_amount else 0.0,
-                "average_amount": float(stat.average_amount)
-                if stat.average_amount
+        for category in categories:
+            total_cents, transaction_count, _, _ = category_stats.get((category.id,), [0, 0, None, None])
+            subtree_cents, subtree_count = subtree_stats.get(category.id, (0, 0))
+            categories_dict[category.id] = {
+                "id": category.id,
+                "name": category.name,
+                "transaction_count": transaction_count,
+                "total_amount": from_cents(total_cents),
+                "average_amount": from_cents(total_cents) / transaction_count
+                if transaction_count
+                else 0.0,
+                # Including all subcategories
+                "subtree_transaction_count": subtree_count,
+                "subtree_total_amount": from_cents(subtree_cents),
+                "subtree_average_amount": from_cents(subtree_cents) / subtree_count
+                if subtree_count
                 else 0.0,
                 "subcategories": [],
             }
-            categories_dict[stat.id] = category_data
 
-            if stat.parent_id is None:
+        # Attach children after all nodes exist, so the order of the rows does not matter
+        for category in categories:
+            category_data = categories_dict[category.id]
+            parent = categories_dict.get(category.parent_id) if category.parent_id is not None else None
+            if parent is not None:
+                parent["subcategories"].append(category_data)
+            elif category.parent_id is None:
                 root_categories.append(category_data)
-            else:
-                parent = categories_dict.get(stat.parent_id)
-                if parent:
-                    parent["subcategories"].append(category_data)
 
         return jsonify({"status": "success", "data": root_categories}), 200
     except Exception as e:
@@ -734,35 +597,19 @@ def search_transactions_by_column():
             ), 400
 
         # Build the query with case-insensitive LIKE filter
-        query = BankTransaction.query.filter(column.ilike(f"%{search_value}%")).limit(5)
+        query = (
+            BankTransaction.query.with_entities(*transaction_columns(SEARCH_FIELDS))
+            .filter(column.ilike(f"%{search_value}%"))
+            .limit(5)
+        )
 
         # Execute the query
         transactions = query.all()
 
-        return jsonify(
+        return json_response(
             {
                 "status": "success",
-                "data": [
-                    {
-                        "id": tx.id,
-                        "booking_date": tx.booking_date.strftime("%Y-%m-%d")
-                        if tx.booking_date
-                        else None,
-                        "value_date": tx.value_date.strftime("%Y-%m-%d")
-                        if tx.value_date
-                        else None,
-                        "amount": float(tx.amount) if tx.amount else 0.0,
-                        "payee": tx.payee,
-                        "payer": tx.payer,
-                        "purpose": tx.purpose,
-                        "transaction_type": tx.transaction_type,
-                        "iban": tx.iban,
-                        "category_id": tx.category_id,
-                        "category_name": tx.category.name if tx.category else None,
-                        "transaction_hash": tx.transaction_hash,
-                    }
-                    for tx in transactions
-                ],
+                "data": serialize_rows(transactions, SEARCH_FIELDS),
                 "count": len(transactions),
             }
         ), 200
@@ -775,11 +622,16 @@ def search_transactions_by_column():
 @bp.route("/columns", methods=["GET"])
 def get_transaction_columns():
     try:
-        # Get all columns from BankTransaction model
-        columns = BankTransaction.__table__.columns.keys()
+        # Get all columns from BankTransaction model. Rules match the euro amount, so it is
+        # listed in place of amount_cents; fingerprint bookkeeping is internal
+        columns = [
+            "amount" if name == "amount_cents" else name
+            for name in BankTransaction.__table__.columns.keys()
+            if name != "hash_version"
+        ]
 
         # Return the list of column names
-        return jsonify({"status": "success", "data": {"columns": list(columns)}}), 200
+        return jsonify({"status": "success", "data": {"columns": columns}}), 200
     except Exception as e:
         return jsonify(
             {"status": "error", "message": str(e), "error_type": type(e).__name__}
@@ -794,57 +646,78 @@ def get_transactions_by_category(category_id):
         per_page = request.args.get("per_page", 25, type=int)
         user_id = request.args.get('user_id', None, type=int)  # Get user_id from query params
 
-        # Get all transactions with the specified category ID
-        query = BankTransaction.query.filter_by(category_id=category_id)
+        # Get all transactions of the category and its subcategories, unless include_subcategories=false
+        if request.args.get("include_subcategories", "true").lower() == "false":
+            query = BankTransaction.query.filter_by(category_id=category_id)
+        else:
+            query = BankTransaction.query.filter(category_tree.in_subtree(BankTransaction.category_id, category_id))
         
         # Add user filter if provided
         if user_id:
             query = query.filter(BankTransaction.user_id == user_id)
 
-        # Apply sorting
-        sort_by = request.args.get("sort_by", "booking_date")
+        # Apply sorting, unknown sort columns fall back to booking_date
+        sort_by = resolve_sort_column(request.args.get("sort_by"))
         sort_order = request.args.get("sort_order", "desc")
 
-        if hasattr(BankTransaction, sort_by):
+        # Select only the requested fields
+        fields = parse_fields(request.args.get("fields"), CATEGORY_LIST_FIELDS)
+        query = query.with_entities(*transaction_columns(fields, sort_by, "id"))
+
+        if "cursor" in request.args:
+            transactions, pagination = cursor_pagination(
+                query, "transactions.get_transactions_by_category", sort_by, sort_order, per_page,
+                category_id=category_id,
+            )
+        else:
             sort_column = getattr(BankTransaction, sort_by)
             if sort_order == "desc":
                 query = query.order_by(sort_column.desc())
             else:
                 query = query.order_by(sort_column.asc())
 
-        # Execute paginated query
-        paginated_txs = query.paginate(page=page, per_page=per_page, error_out=False)
+            # Execute paginated query
+            paginated_txs = query.paginate(page=page, per_page=per_page, error_out=False)
 
-        # Get category info
-        category = Category.query.get_or_404(category_id)
+            # Prepare pagination metadata
+            args = dict(request.args)
+            if "page" in args:
+                del args["page"]  # Remove page from args to avoid duplication
 
-        # Prepare pagination metadata
-        args = dict(request.args)
-        if "page" in args:
-            del args["page"]  # Remove page from args to avoid duplication
-
-        next_url = (
-            url_for(
-                "transactions.get_transactions_by_category",
-                category_id=category_id,
-                page=paginated_txs.next_num,
-                **args,
+            next_url = (
+                url_for(
+                    "transactions.get_transactions_by_category",
+                    category_id=category_id,
+                    page=paginated_txs.next_num,
+                    **args,
+                )
+                if paginated_txs.has_next
+                else None
             )
-            if paginated_txs.has_next
-            else None
-        )
-        prev_url = (
-            url_for(
-                "transactions.get_transactions_by_category",
-                category_id=category_id,
-                page=paginated_txs.prev_num,
-                **args,
+            prev_url = (
+                url_for(
+                    "transactions.get_transactions_by_category",
+                    category_id=category_id,
+                    page=paginated_txs.prev_num,
+                    **args,
+                )
+                if paginated_txs.has_prev
+                else None
             )
-            if paginated_txs.has_prev
-            else None
-        )
+            transactions = paginated_txs.items
+            pagination = {
+                "page": page,
+                "per_page": per_page,
+                "total_pages": paginated_txs.pages,
+                "total_items": paginated_txs.total,
+                "next_url": next_url,
+                "prev_url": prev_url,
+            }
 
-        return jsonify(
+        # Get category info
+        category = Category.query.get_or_404(category_id)
+
+        return json_response(
             {
                 "status": "success",
                 "data": {
@@ -855,39 +728,13 @@ def get_transactions_by_category(category_id):
                         if hasattr(category, "description")
                         else None,
                     },
-                    "transactions": [
-                        {
-                            "id": tx.id,
-                            "booking_date": tx.booking_date.strftime("%Y-%m-%d")
-                            if tx.booking_date
-                            else None,
-                            "value_date": tx.value_date.strftime("%Y-%m-%d")
-                            if tx.value_date
-                            else None,
-                            "amount": float(tx.amount) if tx.amount else 0.0,
-                            "payee": tx.payee,
-                            "payer": tx.payer,
-                            "purpose": tx.purpose,
-                            "transaction_type": tx.transaction_type,
-                            "iban": tx.iban,
-                            "creditor_id": tx.creditor_id,
-                            "mandate_reference": tx.mandate_reference,
-                            "customer_reference": tx.customer_reference,
-                            "transaction_hash": tx.transaction_hash,
-                        }
-                        for tx in paginated_txs.items
-                    ],
-                    "pagination": {
-                        "page": page,
-                        "per_page": per_page,
-                        "total_pages": paginated_txs.pages,
-                        "total_items": paginated_txs.total,
-                        "next_url": next_url,
-                        "prev_url": prev_url,
-                    },
+                    "transactions": serialize_rows(transactions, fields),
+                    "pagination": pagination,
                 },
             }
         ), 200
+    except (InvalidCursorError, InvalidFieldsError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify(
             {"status": "error", "message": str(e), "error_type": type(e).__name__}
@@ -912,39 +759,39 @@ def get_uncategorized_transactions():
         if user_id:
             query = query.filter(BankTransaction.user_id == user_id)
         
-        # Order by booking date (newest first)
-        query = query.order_by(BankTransaction.booking_date.desc())
+        # Select only the requested fields
+        fields = parse_fields(request.args.get("fields"), UNCATEGORIZED_FIELDS)
+        query = query.with_entities(*transaction_columns(fields, "booking_date", "id"))
         
-        # Apply pagination
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        if "cursor" in request.args:
+            transactions, pagination_data = cursor_pagination(
+                query, "transactions.get_uncategorized_transactions", "booking_date", "desc", per_page
+            )
+        else:
+            # Order by booking date (newest first)
+            query = query.order_by(BankTransaction.booking_date.desc())
+            
+            # Apply pagination
+            pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+            transactions = pagination.items
+            pagination_data = {
+                "page": pagination.page,
+                "per_page": pagination.per_page,
+                "total_items": pagination.total,
+                "total_pages": pagination.pages
+            }
         
         # Format the response
-        return jsonify({
+        return json_response({
             "status": "success",
             "data": {
-                "transactions": [
-                    {
-                        "id": tx.id,
-                        "booking_date": tx.booking_date.isoformat() if tx.booking_date else None,
-                        "value_date": tx.value_date.isoformat() if tx.value_date else None,
-                        "amount": float(tx.amount) if tx.amount is not None else None,
-                        "purpose": tx.purpose,
-                        "payee": tx.payee,
-                        "payer": tx.payer,
-                        "category_id": tx.category_id,
-                        "transaction_hash": tx.transaction_hash
-                    }
-                    for tx in pagination.items
-                ],
-                "pagination": {
-                    "page": pagination.page,
-                    "per_page": pagination.per_page,
-                    "total_items": pagination.total,
-                    "total_pages": pagination.pages
-                }
+                "transactions": serialize_rows(transactions, fields),
+                "pagination": pagination_data
             }
         }), 200
         
+    except (InvalidCursorError, InvalidFieldsError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         logger.error(f"Error in get_uncategorized_transactions: {e}")
         logger.error(traceback.format_exc())
@@ -984,81 +831,65 @@ def search_transactions():
         if user_id:
             query = query.filter(BankTransaction.user_id == user_id)
 
-        # Add fuzzy search across multiple columns
-        search_term = f"%{search_term}%"
-        query = query.filter(
-            or_(
-                BankTransaction.payee.ilike(search_term),
-                BankTransaction.payer.ilike(search_term),
-                BankTransaction.purpose.ilike(search_term),
-            )
-        )
+        # Full-text search across payee, payer and purpose, best matches first with sort_by=relevance
+        ranked = request.args.get("sort_by") == "relevance" and "cursor" not in request.args
+        query = apply_search(query, search_term, ranked=ranked)
+
+        # Select only the requested fields
+        fields = parse_fields(request.args.get("fields"), DETAIL_FIELDS)
+        query = query.with_entities(*transaction_columns(fields, "booking_date", "id"))
 
-        # Apply sorting - newest transactions first by default
-        query = query.order_by(BankTransaction.booking_date.desc())
+        if "cursor" in request.args:
+            transactions, pagination = cursor_pagination(
+                query, "transactions.search_transactions", "booking_date", "desc", per_page
+            )
+        else:
+            # Apply sorting - newest transactions first by default, and among equally relevant matches
+            query = query.order_by(BankTransaction.booking_date.desc())
 
-        # Execute paginated query
-        paginated_txs = query.paginate(page=page, per_page=per_page, error_out=False)
+            # Execute paginated query
+            paginated_txs = query.paginate(page=page, per_page=per_page, error_out=False)
 
-        # Prepare pagination metadata
-        args = dict(request.args)
-        if "page" in args:
-            del args["page"]  # Remove page from args to avoid duplication
+            # Prepare pagination metadata
+            args = dict(request.args)
+            if "page" in args:
+                del args["page"]  # Remove page from args to avoid duplication
 
-        next_url = (
-            url_for(
-                "transactions.search_transactions", page=paginated_txs.next_num, **args
+            next_url = (
+                url_for(
+                    "transactions.search_transactions", page=paginated_txs.next_num, **args
+                )
+                if paginated_txs.has_next
+                else None
             )
-            if paginated_txs.has_next
-            else None
-        )
-        prev_url = (
-            url_for(
-                "transactions.search_transactions", page=paginated_txs.prev_num, **args
+            prev_url = (
+                url_for(
+                    "transactions.search_transactions", page=paginated_txs.prev_num, **args
+                )
+                if paginated_txs.has_prev
+                else None
             )
-            if paginated_txs.has_prev
-            else None
-        )
+            transactions = paginated_txs.items
+            pagination = {
+                "page": page,
+                "per_page": per_page,
+                "total_pages": paginated_txs.pages,
+                "total_items": paginated_txs.total,
+                "next_url": next_url,
+                "prev_url": prev_url,
+            }
 
-        return jsonify(
+        return json_response(
             {
                 "status": "success",
                 "data": {
-                    "transactions": [
-                        {
-                            "id": tx.id,
-                            "booking_date": tx.booking_date.strftime("%Y-%m-%d")
-                            if tx.booking_date
-                            else None,
-                            "value_date": tx.value_date.strftime("%Y-%m-%d")
-                            if tx.value_date
-                            else None,
-                            "amount": float(tx.amount) if tx.amount else 0.0,
-                            "payee": tx.payee,
-                            "payer": tx.payer,
-                            "purpose": tx.purpose,
-                            "transaction_type": tx.transaction_type,
-                            "iban": tx.iban,
-                            "creditor_id": tx.creditor_id,
-                            "mandate_reference": tx.mandate_reference,
-                            "customer_reference": tx.customer_reference,
-                            "category_id": tx.category_id,
-                            "category_name": tx.category.name if tx.category else None,
-                            "transaction_hash": tx.transaction_hash,
-                        }
-                        for tx in paginated_txs.items
-                    ],
-                    "pagination": {
-                        "page": page,
-                        "per_page": per_page,
-                        "total_pages": paginated_txs.pages,
-                        "total_items": paginated_txs.total,
-                        "next_url": next_url,
-                        "prev_url": prev_url,
-                    },
+                    "transactions": serialize_rows(transactions, fields),
+                    "pagination": pagination,
                 },
             }
         ), 200
+    except (InvalidCursorError, InvalidFieldsError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         return jsonify(
             {"status": "error", "message": str(e), "error_type": type(e).__name__}
@@ -1,7 +1,8 @@
 """Utility modules for the application."""
 
 from .error_handlers import register_error_handlers
-from .rule_engine import RuleEngine
+from .rule_engine import RuleEngine, CompiledRuleSet
+from .transaction_filter import TransactionFilter
 from .transaction_middleware import TransactionMiddleware, TransactionMiddlewarePipeline, transaction_pipeline
 from .transaction_middlewares import (
     DataCleaningMiddleware,
@@ -15,6 +16,8 @@ from .transaction_middlewares import (
 __all__ = [
     'register_error_handlers',
     'RuleEngine',
+    'CompiledRuleSet',
+    'TransactionFilter',
     'TransactionMiddleware',
     'TransactionMiddlewarePipeline',
     'transaction_pipeline',
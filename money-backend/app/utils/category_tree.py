@@ -0,0 +1,156 @@
+"""
+Category Tree
+
+This module maintains the category_closure table, which stores every
+(ancestor, descendant) pair of the category hierarchy with its depth, and
+answers subtree questions from it with plain joins instead of walking
+Category.parent links in Python.
+
+The categories routes keep the table in sync through add_category(),
+move_category() and remove_category(). rebuild() recomputes it from the
+parent_id column, e.g. after categories were written by other means.
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models.category import Category
+from app.models.category_closure import CategoryClosure
+from app.models.db import db
+from app.models.transaction_rollup import TransactionRollup
+
+# Set up logger
+logger = logging.getLogger("money_backend.category_tree")
+
+closure_table = CategoryClosure.__table__
+
+
+class CategoryTreeError(ValueError):
+    """Raised when a change would make the category hierarchy invalid."""
+
+
+def add_category(category: Category) -> None:
+    """
+    Add a new (flushed) category below its parent.
+    The caller is responsible for committing.
+    """
+    rows = [{"ancestor_id": category.id, "descendant_id": category.id, "depth": 0}]
+    if category.parent_id is not None:
+        rows += [
+            {"ancestor_id": ancestor_id, "descendant_id": category.id, "depth": depth + 1}
+            for ancestor_id, depth in _ancestors(category.parent_id)
+        ]
+    db.session.execute(insert(closure_table), rows)
+
+
+def move_category(category_id: int, parent_id: Optional[int]) -> None:
+    """
+    Move a category and its subtree below another parent, or to the top level.
+    Call before changing Category.parent_id. The caller is responsible for committing.
+
+    Raises:
+        CategoryTreeError: If the parent does not exist or lies inside the moved subtree
+    """
+    subtree = dict(db.session.execute(
+        select(closure_table.c.descendant_id, closure_table.c.depth)
+        .where(closure_table.c.ancestor_id == category_id)
+    ).all())
+    if not subtree:
+        # Not in the tree yet (written without add_category)
+        db.session.execute(insert(closure_table), [{"ancestor_id": category_id, "descendant_id": category_id, "depth": 0}])
+        subtree = {category_id: 0}
+    new_ancestors: List[Tuple[int, int]] = []
+    if parent_id is not None:
+        if parent_id in subtree:
+            raise CategoryTreeError("A category cannot be moved below itself or one of its subcategories")
+        if db.session.get(Category, parent_id) is None:
+            raise CategoryTreeError(f"Parent category {parent_id} does not exist")
+        new_ancestors = _ancestors(parent_id)
+
+    # Detach the subtree from its current ancestors, keeping the paths inside it
+    old_ancestors = [ancestor_id for ancestor_id, _ in _ancestors(category_id) if ancestor_id != category_id]
+    if old_ancestors:
+        db.session.execute(
+            delete(closure_table)
+            .where(closure_table.c.ancestor_id.in_(old_ancestors))
+            .where(closure_table.c.descendant_id.in_(list(subtree)))
+        )
+    if new_ancestors:
+        db.session.execute(insert(closure_table), [
+            {"ancestor_id": ancestor_id, "descendant_id": descendant_id, "depth": ancestor_depth + depth + 1}
+            for ancestor_id, ancestor_depth in new_ancestors
+            for descendant_id, depth in subtree.items()
+        ])
+
+
+def remove_category(category_id: int) -> None:
+    """
+    Remove a category without subcategories from the tree.
+    Call before deleting the category. The caller is responsible for committing.
+    """
+    db.session.execute(delete(closure_table).where(closure_table.c.descendant_id == category_id))
+
+
+def _ancestors(category_id: int) -> List[Tuple[int, int]]:
+    """(ancestor id, depth) of a category, including itself at depth 0."""
+    return [tuple(row) for row in db.session.execute(
+        select(closure_table.c.ancestor_id, closure_table.c.depth)
+        .where(closure_table.c.descendant_id == category_id)
+    )]
+
+
+def rebuild() -> int:
+    """
+    Recompute the closure table from Category.parent_id.
+    Categories in a parent cycle are stored with the path up to the repeated category.
+    The caller is responsible for committing.
+
+    Returns:
+        Number of closure rows written
+    """
+    parents = dict(db.session.execute(select(Category.id, Category.parent_id)).all())
+    rows = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id in parents and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append({"ancestor_id": ancestor_id, "descendant_id": category_id, "depth": depth})
+            ancestor_id, depth = parents[ancestor_id], depth + 1
+    db.session.execute(delete(closure_table))
+    if rows:
+        db.session.execute(insert(closure_table), rows)
+    logger.info(f"Rebuilt category closure with {len(rows)} rows for {len(parents)} categories")
+    return len(rows)
+
+
+def descendant_ids(category_id: int):
+    """Subquery of the ids of a category and all its subcategories."""
+    return select(closure_table.c.descendant_id).where(closure_table.c.ancestor_id == category_id)
+
+
+def in_subtree(column: ColumnElement, category_id: int) -> ColumnElement:
+    """Condition matching a category id column against a category and its subcategories."""
+    return column.in_(descendant_ids(category_id))
+
+
+def subtree_totals() -> Dict[int, Tuple[int, int]]:
+    """
+    Transaction totals of every category including all its subcategories,
+    with a single query over the transaction rollup.
+
+    Returns:
+        Category id -> (total amount in cents, transaction count)
+    """
+    rollup = TransactionRollup.__table__
+    rows = db.session.execute(
+        select(
+            closure_table.c.ancestor_id,
+            func.sum(rollup.c.total_cents),
+            func.sum(rollup.c.transaction_count),
+        )
+        .join(rollup, rollup.c.category_id == closure_table.c.descendant_id)
+        .group_by(closure_table.c.ancestor_id)
+    )
+    return {ancestor_id: (int(total or 0), int(count or 0)) for ancestor_id, total, count in rows}
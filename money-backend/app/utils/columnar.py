@@ -0,0 +1,313 @@
+"""
+Columnar Transaction Batches
+
+This module provides a column-oriented representation of a batch of imported
+transaction dictionaries, backed by NumPy arrays, plus the vectorized kernels
+the built-in middlewares use in columnar mode (see
+TransactionMiddleware.process_columns).
+
+Euro amounts are stored as a float64 array, dates as a datetime64[D] array and other
+fields as object arrays. A column falls back to an object array whenever its
+values cannot be represented exactly, so writing a batch back to dictionaries
+always gives the same values the dictionary path would produce.
+
+Kernels only use NumPy where it beats plain Python on object columns: moving
+strings between Python objects and NumPy string arrays has a cost, so e.g.
+stripping whitespace stays a list comprehension over the column.
+"""
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.models.money import to_cents
+
+# Columns stored as float64 when every value is a float
+FLOAT_COLUMNS = ("amount",)
+# Columns stored as datetime64[D] when every value is a date (or None)
+DATE_COLUMNS = ("booking_date", "value_date")
+
+
+def _narrow(name: str, values: np.ndarray) -> np.ndarray:
+    """Convert an object column to its typed representation where that is lossless."""
+    if values.dtype != object or len(values) == 0:
+        return values
+    if name in FLOAT_COLUMNS and set(map(type, values.tolist())) == {float}:
+        return values.astype(np.float64)
+    if name in DATE_COLUMNS and set(map(type, values.tolist())) <= {date, type(None)}:
+        return values.astype("datetime64[D]")
+    return values
+
+
+def _as_strings(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert the str elements of an object column to a NumPy string array.
+    An element counts as a string if converting it to str and back gives the same
+    value, which also leaves out strings NumPy would alter (it drops trailing NULs).
+
+    Returns:
+        (rows, strings): indexes of the converted rows and their values
+    """
+    strings = values.astype(str)
+    exact = np.flatnonzero(strings.astype(object) == values)
+    return exact, strings[exact]
+
+
+class TransactionColumns:
+    """
+    A batch of transaction dictionaries viewed column by column.
+
+    Columns are extracted from the dictionaries the first time a middleware reads
+    them, and to_dicts() writes back only the columns that were assigned, into the
+    original dictionaries (like process_bulk, which modifies them in place).
+    Keys missing from some dictionaries are tracked per row, so reading and
+    writing back preserves exactly which keys each row has.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+        self.size = len(rows)
+        self.columns: Dict[str, np.ndarray] = {}
+        self.missing: Dict[str, np.ndarray] = {}
+        self._assigned: Dict[str, Optional[np.ndarray]] = {}
+        self._shared_keys = None
+
+    @classmethod
+    def from_dicts(cls, rows: List[Dict[str, Any]]) -> "TransactionColumns":
+        """Wrap transaction dictionaries in a columnar batch."""
+        return cls(rows)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Write the assigned columns back and return the transaction dictionaries."""
+        for name, where in self._assigned.items():
+            values = self.columns[name].tolist()
+            if where is None:
+                for row, value in zip(self.rows, values):
+                    row[name] = value
+            else:
+                for index in np.flatnonzero(where):
+                    self.rows[index][name] = values[index]
+        self._assigned.clear()
+        return self.rows
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, name: str) -> bool:
+        if name in self.columns:
+            return True
+        if self._keys_are_shared():
+            return name in self._shared_keys
+        return any(name in row for row in self.rows)
+
+    def _keys_are_shared(self) -> bool:
+        """Whether every row has the same keys (the usual case), checked once."""
+        if self._shared_keys is None:
+            first = self.rows[0].keys() if self.rows else {}.keys()
+            self._shared_keys = set(first) if all(row.keys() == first for row in self.rows) else False
+        return self._shared_keys is not False
+
+    def _load(self, name: str) -> None:
+        """Extract a column from the dictionaries."""
+        values = np.empty(self.size, dtype=object)
+        if self._keys_are_shared():
+            values[:] = [row[name] for row in self.rows]
+        else:
+            values[:] = [row.get(name) for row in self.rows]
+            missing = np.fromiter((name not in row for row in self.rows), dtype=bool, count=self.size)
+            if missing.any():
+                self.missing[name] = missing
+        self.columns[name] = _narrow(name, values)
+
+    def present(self, name: str) -> np.ndarray:
+        """Boolean mask of the rows that have the given key."""
+        if name not in self:
+            return np.zeros(self.size, dtype=bool)
+        if name not in self.columns:
+            self._load(name)
+        if name in self.missing:
+            return ~self.missing[name]
+        return np.ones(self.size, dtype=bool)
+
+    def get(self, name: str) -> np.ndarray:
+        """A column, or an object array of None if no row has the key."""
+        if name not in self:
+            return np.full(self.size, None, dtype=object)
+        if name not in self.columns:
+            self._load(name)
+        return self.columns[name]
+
+    def set(self, name: str, values: np.ndarray, where: Optional[np.ndarray] = None) -> None:
+        """
+        Assign a column, or only the rows selected by a mask.
+        Assigned rows are marked as having the key.
+        """
+        values = np.asarray(values)
+        if where is None:
+            self.columns[name] = _narrow(name, values)
+            self.missing.pop(name, None)
+            self._assigned[name] = None
+            return
+
+        if name in self:
+            column = self.get(name)
+        else:
+            column = np.full(self.size, None, dtype=object)
+            self.missing[name] = np.ones(self.size, dtype=bool)
+        if column.dtype != values.dtype:
+            column = column.astype(object)
+            values = values.astype(object)
+        column = column.copy()
+        column[where] = values[where]
+        self.columns[name] = _narrow(name, column) if column.dtype == object else column
+
+        if name in self.missing:
+            self.missing[name] = self.missing[name] & ~where
+            if not self.missing[name].any():
+                del self.missing[name]
+        if name in self._assigned:
+            previous = self._assigned[name]
+            self._assigned[name] = None if previous is None else previous | where
+        else:
+            self._assigned[name] = where.copy()
+
+    def remove(self, name: str, where: Optional[np.ndarray] = None) -> None:
+        """
+        Remove a key from every row, or only from the rows selected by a mask.
+        The key is removed from the dictionaries immediately.
+        """
+        if name not in self:
+            return
+        if where is None:
+            where = np.ones(self.size, dtype=bool)
+        if name not in self.columns:
+            self._load(name)
+        for index in np.flatnonzero(where):
+            self.rows[index].pop(name, None)
+        self._shared_keys = None
+
+        missing = self.missing.get(name, np.zeros(self.size, dtype=bool)) | where
+        if missing.all():
+            del self.columns[name]
+            self.missing.pop(name, None)
+            self._assigned.pop(name, None)
+            return
+        self.missing[name] = missing
+        if name in self._assigned:
+            # Values assigned to the remaining rows are still written back
+            previous = self._assigned[name]
+            self._assigned[name] = (np.ones(self.size, dtype=bool) if previous is None else previous) & ~where
+
+    def values(self, name: str, default: Any = None) -> List[Any]:
+        """The column as a list of Python values, like transaction.get(name, default) for every row."""
+        if name not in self:
+            return [default] * self.size
+        values = self.get(name).tolist()
+        if name in self.missing:
+            for index in np.flatnonzero(self.missing[name]):
+                values[index] = default
+        return values
+
+
+def strip_strings(values: np.ndarray) -> np.ndarray:
+    """str.strip() every string in an object column, leave other values unchanged."""
+    # A list comprehension over the column beats NumPy's string functions here:
+    # converting object arrays to fixed-width strings and back costs more than the strip
+    result = np.empty(len(values), dtype=object)
+    result[:] = [value.strip() if type(value) is str else value for value in values.tolist()]
+    return result
+
+
+def amounts_to_cents(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert euro amounts (numbers or German formatted strings like "1.234,56")
+    to integer cents with money.to_cents.
+
+    Returns:
+        (cents, converted): an object array of cents, and a mask of the rows that
+        could be converted; other rows hold None
+    """
+    # Exact decimal conversion per value; a float64 round trip could round differently
+    cents = np.full(len(values), None, dtype=object)
+    converted = np.zeros(len(values), dtype=bool)
+    for index, value in enumerate(values.tolist()):
+        try:
+            cents[index] = to_cents(value)
+        except (ValueError, TypeError):
+            continue
+        converted[index] = cents[index] is not None
+    return cents, converted
+
+
+def is_member(values: np.ndarray, members: Iterable[str]) -> np.ndarray:
+    """Boolean mask of the rows holding a non-empty string contained in members."""
+    members = [member for member in members if member]
+    result = np.zeros(len(values), dtype=bool)
+    if not members:
+        return result
+    rows, strings = _as_strings(values)
+    result[rows] = np.isin(strings, np.array(members, dtype=str)) & (strings != "")
+    return result
+
+
+def parse_dates(values: np.ndarray, parse_one: Callable[[str], Any]) -> np.ndarray:
+    """
+    Parse every truthy value of a date column.
+
+    Strings in the DKB format "dd.mm.yy" are parsed vectorized; everything else
+    goes through parse_one once per distinct value.
+
+    Args:
+        values: The date column
+        parse_one: Scalar parser, used for values outside the vectorized format
+
+    Returns:
+        A datetime64[D] array if every value is a date (or None), an object array otherwise
+    """
+    if values.dtype != object:
+        return values
+    dates = np.full(len(values), np.datetime64("NaT"), dtype="datetime64[D]")
+    fast = np.zeros(len(values), dtype=bool)
+
+    rows, strings = _as_strings(values)
+    eight = np.char.str_len(strings) == 8
+    rows, strings = rows[eight], strings[eight]
+    if len(rows):
+        # Work on the Unicode code points of the 8 characters
+        codes = strings.astype("U8").view(np.uint32).reshape(-1, 8).astype(np.int64)
+        digits = codes[:, [0, 1, 3, 4, 6, 7]] - ord("0")
+        shaped = (codes[:, 2] == ord(".")) & (codes[:, 5] == ord(".")) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+        rows = rows[shaped]
+        digits = digits[shaped]
+        day = digits[:, 0] * 10 + digits[:, 1]
+        month = digits[:, 2] * 10 + digits[:, 3]
+        year = digits[:, 4] * 10 + digits[:, 5]
+        # Same century rule as strptime's %y
+        year = np.where(year < 69, 2000 + year, 1900 + year)
+
+        months = ((year - 1970) * 12 + np.clip(month, 1, 12) - 1).astype("datetime64[M]")
+        first_day = months.astype("datetime64[D]")
+        days_in_month = ((months + 1).astype("datetime64[D]") - first_day).astype(np.int64)
+        valid = (month >= 1) & (month <= 12) & (day >= 1) & (day <= days_in_month)
+
+        # Invalid dates stay NaT, like the None strptime failures give
+        dates[rows[valid]] = first_day[valid] + (day[valid] - 1)
+        fast[rows] = True
+
+    others = np.flatnonzero(~fast & np.not_equal(values, None))
+    if not len(others):
+        return dates
+
+    result = np.empty(len(values), dtype=object)
+    result[:] = dates.tolist()
+    cache = {}
+    for index in others:
+        value = values[index]
+        if not value:
+            # Falsy values are not parsed
+            result[index] = value
+            continue
+        if value not in cache:
+            cache[value] = parse_one(value)
+        result[index] = cache[value]
+    return result
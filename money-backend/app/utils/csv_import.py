@@ -0,0 +1,142 @@
+"""
+CSV Import
+
+This module turns uploaded bank statement CSV files into transaction data
+dictionaries. Uploads are read incrementally so that memory usage does not
+grow with the size of the file.
+"""
+import csv
+import io
+import logging
+from datetime import datetime
+from itertools import islice
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+from app.models.money import parse_amount_cents
+
+# Set up logger
+logger = logging.getLogger("money_backend.csv_import")
+
+# Number of metadata lines before the column header in DKB exports
+DKB_HEADER_LINE = 4
+
+
+class CsvImportError(Exception):
+    """Raised when an uploaded CSV file does not match the expected layout."""
+
+    def __init__(self, message: str, line: Optional[int] = None):
+        super().__init__(message)
+        # Line of the file the error was found in, if known
+        self.line = line
+
+
+def parse_date(date_str, format="%d.%m.%y"):
+    try:
+        return datetime.strptime(date_str, format).date()
+    except Exception:
+        return None
+
+
+def chunked(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """
+    Split an iterable into lists of at most `size` items without materializing it.
+
+    Args:
+        iterable: The items to split
+        size: Maximum number of items per chunk
+
+    Returns:
+        An iterator over the chunks
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_dkb_transactions(stream: BinaryIO, user_id: int) -> Iterator[Dict[str, Any]]:
+    """
+    Parse a DKB CSV export into transaction data dictionaries, one row at a time.
+    The account IBAN is read from the first line and the column header from line 5.
+
+    Args:
+        stream: Binary file object of the uploaded CSV
+        user_id: ID of the user the transactions belong to
+
+    Returns:
+        An iterator over transaction data dictionaries
+
+    Raises:
+        CsvImportError: If the file layout or a row is invalid
+        UnicodeDecodeError: If the file is not UTF-8 encoded
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    reader = csv.reader(text, delimiter=";")
+
+    try:
+        own_iban = next(reader)[1].strip()
+        logger.debug(f"Extracted own IBAN: {own_iban}")
+    except StopIteration:
+        raise CsvImportError("CSV file format is invalid - too few lines")
+    except IndexError as e:
+        logger.error(f"Failed to extract own IBAN from first line: {str(e)}")
+        raise CsvImportError("CSV format error: Could not extract IBAN from header")
+
+    # Skip the remaining metadata lines and read the column header
+    header = next(islice(reader, DKB_HEADER_LINE - 1, None), None)
+    if header is None:
+        raise CsvImportError("CSV file format is invalid - too few lines")
+    logger.debug(f"CSV header: {header}")
+
+    for row_index, values in enumerate(reader, start=1):
+        if not values:
+            continue
+        row = dict(zip(header, values))
+        try:
+            transaction = _parse_dkb_row(row, row_index, own_iban, user_id)
+        except CsvImportError as e:
+            e.line = reader.line_num
+            raise
+        yield transaction
+
+
+def _parse_dkb_row(row: Dict[str, str], row_index: int, own_iban: str, user_id: int) -> Dict[str, Any]:
+    """Convert a single DKB CSV row into a transaction data dictionary."""
+    logger.debug(f"Processing row {row_index}")
+    if "Betrag (€)" not in row:
+        logger.error(f"Missing 'Betrag (€)' column in row {row_index}: {row}")
+        raise CsvImportError(f"CSV format error: Missing 'Betrag (€)' column in row {row_index}")
+
+    try:
+        amount_cents = parse_amount_cents(row["Betrag (€)"])
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.error(f"Failed to parse amount in row {row_index}: {row['Betrag (€)']} - {str(e)}")
+        raise CsvImportError(f"Invalid amount format in row {row_index}: {row['Betrag (€)']}")
+
+    try:
+        if parse_date(row["Buchungsdatum"]) is None:
+            logger.warning(f"Could not parse booking date in row {row_index}: {row['Buchungsdatum']}")
+        value_date = row["Wertstellung"]
+    except KeyError as e:
+        logger.error(f"Missing date column in row {row_index}: {str(e)}")
+        raise CsvImportError(f"CSV format error: Missing date column {str(e)} in row {row_index}")
+
+    # Dates are kept as raw strings, DateFormattingMiddleware parses them
+    return {
+        "booking_date": row["Buchungsdatum"],
+        "value_date": value_date,
+        "status": row.get("Status", ""),
+        "payer": row.get("Zahlungspflichtige*r", ""),
+        "payee": row.get("Zahlungsempfänger*in", ""),
+        "purpose": row.get("Verwendungszweck", ""),
+        "transaction_type": row.get("Umsatztyp", ""),
+        "iban": own_iban,
+        "counterparty_iban": row.get("IBAN", ""),
+        "amount_cents": amount_cents,
+        "creditor_id": row.get("Gläubiger-ID", ""),
+        "mandate_reference": row.get("Mandatsreferenz", ""),
+        "customer_reference": row.get("Kundenreferenz", ""),
+        "user_id": user_id,
+    }
@@ -0,0 +1,42 @@
+"""
+Fast JSON Responses
+
+This module builds JSON responses with orjson when it is installed, and with
+the standard json module otherwise. Both produce the same output: dates and
+datetimes as ISO 8601 strings, Decimals as numbers.
+
+Unlike flask.jsonify, which formats dates as HTTP dates, serializers can hand
+date objects to json_response directly, so the conversion happens in the
+encoder instead of per field in Python.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload: Any) -> bytes:
+    """Encode a payload as compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(payload: Any) -> Response:
+    """A JSON response, like flask.jsonify but with the fast encoder."""
+    return Response(dumps(payload), mimetype="application/json")
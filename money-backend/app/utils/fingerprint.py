@@ -0,0 +1,169 @@
+"""
+Transaction Fingerprint
+
+This module computes transaction_hash, the fingerprint imports use to detect
+duplicates, for every write path: the import middleware (dictionary, object and
+columnar mode) and the backfill of stored transactions. All of them hash the
+same canonical fields of the parsed values, so a transaction gets the same
+fingerprint on import and in a backfill.
+
+Fingerprint version 2 is a 128-bit BLAKE2b digest (32 hex characters, like the
+former MD5 hashes) of booking date, value date, amount in cents, payee, payer,
+purpose, transaction type and account IBAN, keyed with FINGERPRINT_KEY.
+BankTransaction.hash_version records the version of each stored hash; NULL
+marks hashes of the former MD5 functions. A stored transaction whose fingerprint
+is already held by another one is a duplicate the former functions did not
+recognize: the backfill leaves its MD5 hash and marks it with
+DUPLICATE_HASH_VERSION, so it is not rehashed again.
+
+Changing FINGERPRINT_VERSION or FINGERPRINT_KEY changes every fingerprint, so
+stored hashes have to be rehashed with backfill() afterwards (see
+app/utils/generate_transaction_hashes.py), or reimports are not recognized as
+duplicates.
+"""
+import logging
+from datetime import date, datetime
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, or_, select, update
+
+from app.config import config
+from app.models.transaction import BankTransaction
+
+# Set up logger
+logger = logging.getLogger("money_backend.fingerprint")
+
+FINGERPRINT_VERSION = 2
+
+# hash_version of duplicates that keep their former hash under FINGERPRINT_VERSION
+DUPLICATE_HASH_VERSION = -FINGERPRINT_VERSION
+
+# Fields of the fingerprint, in hashing order
+FINGERPRINT_FIELDS = (
+    "booking_date", "value_date", "amount_cents", "payee", "payer", "purpose", "transaction_type", "iban",
+)
+
+# Unit separator, so field boundaries are unambiguous ("ab|c" vs "a|bc")
+_SEPARATOR = "\x1f"
+_PERSON = b"money-tx-fp-v2"
+_DIGEST_SIZE = 16
+
+transaction_table = BankTransaction.__table__
+
+
+@lru_cache(maxsize=4)
+def _base_digest(key: str):
+    key_bytes = key.encode("utf-8")
+    if len(key_bytes) > blake2b.MAX_KEY_SIZE:
+        key_bytes = blake2b(key_bytes).digest()
+    return blake2b(digest_size=_DIGEST_SIZE, key=key_bytes, person=_PERSON)
+
+
+def _canonical(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.strip()
+    return str(value)
+
+
+def fingerprint(values: Sequence[Any]) -> str:
+    """
+    The fingerprint of the FINGERPRINT_FIELDS values of a transaction.
+    Dates may be date or datetime objects, strings are compared stripped.
+    """
+    digest = _base_digest(config.FINGERPRINT_KEY).copy()
+    digest.update(_SEPARATOR.join(_canonical(value) for value in values).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def transaction_fingerprint(transaction: Any) -> str:
+    """The fingerprint of a transaction data dictionary or BankTransaction."""
+    if isinstance(transaction, dict):
+        return fingerprint([transaction.get(name) for name in FINGERPRINT_FIELDS])
+    return fingerprint([getattr(transaction, name) for name in FINGERPRINT_FIELDS])
+
+
+# --- Backfill ------------------------------------------------------------------------------------
+
+
+def _outdated():
+    hash_version = transaction_table.c.hash_version
+    return or_(hash_version.is_(None), hash_version.not_in((FINGERPRINT_VERSION, DUPLICATE_HASH_VERSION)))
+
+
+def backfill_chunk(connection, after_id: int = 0, chunk_size: Optional[int] = None) -> Tuple[Optional[int], int, List[Tuple[int, int]]]:
+    """
+    Rehash the next chunk of transactions without a current fingerprint. Does not commit.
+
+    A transaction whose new fingerprint is already taken, by a stored transaction
+    or an earlier one of the chunk, is a duplicate the former hash functions did
+    not recognize; it keeps its hash, is marked with DUPLICATE_HASH_VERSION so
+    later chunks and runs skip it, and is reported.
+
+    Args:
+        connection: Connection to run the statements on
+        after_id: Only transactions with a larger id
+        chunk_size: Transactions per chunk (defaults to config.FINGERPRINT_BACKFILL_CHUNK_SIZE)
+
+    Returns:
+        (last id of the chunk or None when done, number of rehashed transactions,
+        (id, id of the transaction holding the fingerprint) pairs of the duplicates)
+    """
+    chunk_size = chunk_size or config.FINGERPRINT_BACKFILL_CHUNK_SIZE
+    c = transaction_table.c
+    rows = connection.execute(
+        select(c.id, *(c[name] for name in FINGERPRINT_FIELDS))
+        .where(c.id > after_id, _outdated())
+        .order_by(c.id)
+        .limit(chunk_size)
+    ).all()
+    if not rows:
+        return None, 0, []
+
+    new_hashes = {row[0]: fingerprint(row[1:]) for row in rows}
+
+    # Set-based collision check: one IN (...) lookup per DEDUP_LOOKUP_CHUNK_SIZE hashes
+    holders: Dict[str, int] = {}
+    hashes = list(set(new_hashes.values()))
+    for start in range(0, len(hashes), config.DEDUP_LOOKUP_CHUNK_SIZE):
+        lookup = hashes[start:start + config.DEDUP_LOOKUP_CHUNK_SIZE]
+        holders.update(
+            (transaction_hash, transaction_id)
+            for transaction_id, transaction_hash in connection.execute(
+                select(c.id, c.transaction_hash).where(c.transaction_hash.in_(lookup))
+            )
+        )
+
+    params = []
+    duplicates = []
+    for transaction_id, transaction_hash in new_hashes.items():
+        holder = holders.get(transaction_hash)
+        if holder is not None and holder != transaction_id:
+            duplicates.append((transaction_id, holder))
+            continue
+        holders[transaction_hash] = transaction_id
+        params.append({"_id": transaction_id, "_hash": transaction_hash})
+
+    if params:
+        connection.execute(
+            update(transaction_table)
+            .where(c.id == bindparam("_id"))
+            .values(transaction_hash=bindparam("_hash"), hash_version=FINGERPRINT_VERSION),
+            params,
+        )
+    if duplicates:
+        connection.execute(
+            update(transaction_table)
+            .where(c.id.in_([transaction_id for transaction_id, _ in duplicates]))
+            .values(hash_version=DUPLICATE_HASH_VERSION)
+        )
+    for transaction_id, holder in duplicates:
+        logger.warning(f"Duplicate found: Transaction ID {transaction_id} has the fingerprint of transaction ID {holder}")
+    return rows[-1][0], len(params), duplicates
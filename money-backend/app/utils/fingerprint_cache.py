@@ -0,0 +1,276 @@
+"""
+Fingerprint Cache
+
+This module keeps the transaction fingerprints (transaction_hash) of the
+stored transactions in memory, so re-uploads of overlapping statements are
+deduplicated without asking the database about rows it has already seen. Like
+the unique index on transaction_hash, the cache spans all users. It holds:
+
+- a Bloom filter over all stored fingerprints: a fingerprint it does not
+  contain is certainly not stored, the row is new
+- an LRU of confirmed fingerprints: a fingerprint it contains is stored, the
+  row is a duplicate
+
+Only fingerprints the Bloom filter contains but the LRU does not are looked up
+in the database, with the chunked lookup of TransactionService.
+
+The fingerprints are loaded with one query on first use and updated when
+transactions are committed through the ORM or TransactionService in this
+process; transactions deleted through the ORM leave the LRU. After
+FINGERPRINT_CACHE_TTL seconds they are reloaded, which bounds how long
+changes made by other processes or by plain SQL stay invisible: until then a
+row inserted elsewhere is not reported as a duplicate, but rejected by the
+unique transaction_hash index (skipped by INSERT IGNORE / ON CONFLICT DO
+NOTHING in bulk mode), and a row deleted elsewhere is still reported as one.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app.config import config
+from app.models.db import db
+from app.models.transaction import BankTransaction
+from app.utils import metrics
+
+# Set up logger
+logger = logging.getLogger("money_backend.fingerprint_cache")
+
+# Smallest Bloom filter capacity, so small databases can import without an early reload
+MIN_CAPACITY = 1024
+
+# Lookup results: answered by the Bloom filter (new), by the LRU (duplicate), or by the
+# database, which either confirms the fingerprint or shows a Bloom filter false positive
+RESULTS = ("bloom_negative", "lru_hit", "db_hit", "false_positive")
+
+
+class BloomFilter:
+    """Bloom filter over strings, sized for a capacity and false positive rate."""
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        self.capacity = max(capacity, 1)
+        self.size = max(64, math.ceil(-self.capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterator[int]:
+        # Double hashing: k positions from the two halves of one digest
+        digest = blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def full(self) -> bool:
+        """Whether more items were added than the filter was sized for."""
+        return self.count > self.capacity
+
+
+class _Fingerprints:
+    def __init__(self, bloom: BloomFilter):
+        self.bloom = bloom
+        self.confirmed: "OrderedDict[str, None]" = OrderedDict()
+        self.loaded_at = time.monotonic()
+
+
+class FingerprintCache:
+    """Bloom filter and LRU of the stored transaction fingerprints of all users."""
+
+    def __init__(self, ttl: float = 300.0, lru_size: int = 50000, false_positive_rate: float = 0.01):
+        self.ttl = ttl
+        self.lru_size = lru_size
+        self.false_positive_rate = false_positive_rate
+        self._fingerprints: Optional[_Fingerprints] = None
+        self._counts = dict.fromkeys(RESULTS, 0)
+        self._loads = 0
+        self._lock = threading.RLock()
+
+    def _load(self) -> _Fingerprints:
+        column = BankTransaction.transaction_hash
+        hashes = db.session.scalars(select(column).where(column.is_not(None)).order_by(BankTransaction.id)).all()
+        fingerprints = _Fingerprints(BloomFilter(max(2 * len(hashes), MIN_CAPACITY), self.false_positive_rate))
+        for transaction_hash in hashes:
+            fingerprints.bloom.add(transaction_hash)
+        # Every loaded fingerprint is confirmed; keep the most recent ones
+        fingerprints.confirmed.update(dict.fromkeys(hashes[-self.lru_size:]))
+        self._loads += 1
+        logger.debug(f"Loaded {len(hashes)} fingerprints")
+        return fingerprints
+
+    def _current(self) -> _Fingerprints:
+        fingerprints = self._fingerprints
+        if fingerprints is None or fingerprints.bloom.full or time.monotonic() - fingerprints.loaded_at >= self.ttl:
+            fingerprints = self._fingerprints = self._load()
+        return fingerprints
+
+    def _confirm(self, fingerprints: _Fingerprints, transaction_hash: str) -> None:
+        fingerprints.confirmed[transaction_hash] = None
+        fingerprints.confirmed.move_to_end(transaction_hash)
+        if len(fingerprints.confirmed) > self.lru_size:
+            fingerprints.confirmed.popitem(last=False)
+
+    def find_existing(self, hashes: Iterable[str], lookup: Callable[[Iterable[str]], Set[str]]) -> Set[str]:
+        """
+        Resolve which fingerprints are already stored, for any user.
+
+        Args:
+            hashes: The fingerprints to check
+            lookup: Database lookup for the fingerprints the cache cannot answer,
+                    returning the stored subset
+
+        Returns:
+            The stored fingerprints
+        """
+        counts = dict.fromkeys(RESULTS, 0)
+        existing: Set[str] = set()
+        unknown: List[str] = []
+        with self._lock:
+            fingerprints = self._current()
+            for transaction_hash in set(hashes):
+                if transaction_hash not in fingerprints.bloom:
+                    counts["bloom_negative"] += 1
+                elif transaction_hash in fingerprints.confirmed:
+                    fingerprints.confirmed.move_to_end(transaction_hash)
+                    existing.add(transaction_hash)
+                    counts["lru_hit"] += 1
+                else:
+                    unknown.append(transaction_hash)
+
+        if unknown:
+            found = lookup(unknown)
+            existing |= found
+            with self._lock:
+                for transaction_hash in unknown:
+                    if transaction_hash in found:
+                        counts["db_hit"] += 1
+                        if self._fingerprints is fingerprints:
+                            self._confirm(fingerprints, transaction_hash)
+                    else:
+                        counts["false_positive"] += 1
+
+        with self._lock:
+            for result, count in counts.items():
+                self._counts[result] += count
+        for result, count in counts.items():
+            if count:
+                metrics.fingerprint_cache_lookups.inc(count, result=result)
+        return existing
+
+    def add(self, hashes: Iterable[str]) -> None:
+        """Add fingerprints of committed transactions, if the fingerprints are loaded."""
+        with self._lock:
+            fingerprints = self._fingerprints
+            if fingerprints is None:
+                return
+            for transaction_hash in hashes:
+                fingerprints.bloom.add(transaction_hash)
+                self._confirm(fingerprints, transaction_hash)
+
+    def discard(self, hashes: Iterable[str]) -> None:
+        """
+        Forget fingerprints of deleted transactions. They stay in the Bloom filter,
+        so checking them again costs a database lookup.
+        """
+        with self._lock:
+            fingerprints = self._fingerprints
+            if fingerprints is None:
+                return
+            for transaction_hash in hashes:
+                fingerprints.confirmed.pop(transaction_hash, None)
+
+    def clear(self) -> None:
+        """Drop the fingerprints, e.g. after stored fingerprints were rehashed; they are reloaded on the next lookup."""
+        with self._lock:
+            self._fingerprints = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Lookup counters since the start of the process, plus:
+        hit_rate: share of lookups answered without the database
+        false_positive_rate: share of new fingerprints the Bloom filter did not rule out
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            fingerprints = self._fingerprints
+            confirmed = len(fingerprints.confirmed) if fingerprints is not None else 0
+            loads = self._loads
+        lookups = sum(counts.values())
+        new = counts["bloom_negative"] + counts["false_positive"]
+        return {
+            **counts,
+            "lookups": lookups,
+            "hit_rate": (counts["bloom_negative"] + counts["lru_hit"]) / lookups if lookups else 0.0,
+            "false_positive_rate": counts["false_positive"] / new if new else 0.0,
+            "loaded": fingerprints is not None,
+            "confirmed_fingerprints": confirmed,
+            "loads": loads,
+        }
+
+
+fingerprint_cache = FingerprintCache(
+    ttl=config.FINGERPRINT_CACHE_TTL,
+    lru_size=config.FINGERPRINT_CACHE_LRU_SIZE,
+    false_positive_rate=config.FINGERPRINT_CACHE_FALSE_POSITIVE_RATE,
+)
+
+
+def record_inserted(rows: Iterable[Dict[str, Any]], session: Optional[Session] = None) -> None:
+    """Remember the fingerprints of rows inserted with Core statements; they are cached on commit."""
+    if not config.FINGERPRINT_CACHE_ENABLED:
+        return
+    pending: List[str] = (session or db.session).info.setdefault("fingerprint_cache_added", [])
+    pending.extend(row["transaction_hash"] for row in rows if row.get("transaction_hash"))
+
+
+def _previous_hash(obj: BankTransaction) -> Optional[str]:
+    history = inspect(obj).attrs.transaction_hash.history
+    if history.deleted:
+        return history.deleted[0]
+    return history.unchanged[0] if history.unchanged else obj.transaction_hash
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_fingerprint_changes(session, flush_context):
+    if not config.FINGERPRINT_CACHE_ENABLED:
+        return
+    pending = session.info.setdefault("fingerprint_cache_added", [])
+    for obj in session.new:
+        if isinstance(obj, BankTransaction) and obj.transaction_hash:
+            pending.append(obj.transaction_hash)
+    for obj in session.dirty:
+        if isinstance(obj, BankTransaction) and inspect(obj).attrs.transaction_hash.history.has_changes():
+            fingerprint_cache.discard([_previous_hash(obj)])
+            if obj.transaction_hash:
+                pending.append(obj.transaction_hash)
+    for obj in session.deleted:
+        if isinstance(obj, BankTransaction):
+            fingerprint_cache.discard([_previous_hash(obj)])
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_fingerprint_changes(session):
+    pending = session.info.pop("fingerprint_cache_added", None)
+    if pending:
+        fingerprint_cache.add(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_fingerprint_changes(session):
+    session.info.pop("fingerprint_cache_added", None)
@@ -1,41 +1,34 @@
 """
-Utility script to generate transaction hashes for existing transactions.
-This should be run after adding the transaction_hash column to the database.
+Utility script to (re)generate the fingerprints of stored transactions.
+Hashes every transaction without a current fingerprint (see app.utils.fingerprint),
+in chunks that are committed one by one, so an interrupted run can simply be
+started again and continues with the transactions it has not rehashed yet.
+
+Duplicates, transactions whose fingerprint another transaction already holds,
+keep their former hash and are skipped by later runs; --retry-duplicates
+checks them again, e.g. after the transactions holding their fingerprints
+were deleted.
 
 Run with:
-python -m app.utils.generate_transaction_hashes
+python -m app.utils.generate_transaction_hashes [--chunk-size N] [--limit N] [--retry-duplicates]
 """
 
-import hashlib
+import argparse
 import logging
+from typing import Optional
+
+from sqlalchemy import update
+
+from ..config import config
 from ..models.db import db
 from ..models.transaction import BankTransaction
-from flask import current_app
+from .fingerprint import DUPLICATE_HASH_VERSION, FINGERPRINT_VERSION, backfill_chunk
+from .fingerprint_cache import fingerprint_cache
 
 # Set up logger
 logger = logging.getLogger("money_backend.transaction_hashes")
 
 
-def generate_transaction_hash(tx):
-    """
-    Generate a unique hash for a transaction to identify duplicates.
-    This is the same function as in the routes/transactions/__init__.py file.
-    """
-    # Convert dates to strings if they're not None, otherwise use empty string
-    booking_date_str = tx.booking_date.isoformat() if tx.booking_date else ""
-    value_date_str = tx.value_date.isoformat() if tx.value_date else ""
-
-    # Create a string combining all the values
-    transaction_str = (
-        f"{booking_date_str}|{value_date_str}|{str(tx.amount)}|"
-        f"{tx.payee or ''}|{tx.payer or ''}|{tx.purpose or ''}|"
-        f"{tx.transaction_type or ''}|{tx.iban or ''}"
-    )
-
-    # Generate an MD5 hash of the combined string
-    return hashlib.md5(transaction_str.encode("utf-8")).hexdigest()
-
-
 def setup_logging():
     """Set up logging if run as standalone script"""
     if not logger.handlers:
@@ -49,68 +42,59 @@ def setup_logging():
         logger.setLevel(logging.INFO)
 
 
-def update_transaction_hashes():
+def update_transaction_hashes(
+    chunk_size: Optional[int] = None, limit: Optional[int] = None, retry_duplicates: bool = False
+):
     """
-    Update the transaction_hash field for all transactions that don't have one.
-    """
-    logger.info("Starting transaction hash generation...")
+    Rehash all transactions without a current fingerprint, committing after each chunk.
 
-    # Get all transactions without a hash
-    transactions = BankTransaction.query.filter(
-        BankTransaction.transaction_hash.is_(None)
-    ).all()
-    total = len(transactions)
+    Args:
+        chunk_size: Transactions per chunk (defaults to config.FINGERPRINT_BACKFILL_CHUNK_SIZE)
+        limit: Stop after about this many transactions, e.g. to spread a large backfill over several runs
+        retry_duplicates: Also check the duplicates found by earlier runs again
 
-    logger.info(f"Found {total} transactions without hashes")
+    Returns:
+        (number of rehashed transactions, number of duplicates that keep their former hash)
+    """
+    logger.info(f"Starting fingerprint backfill (version {FINGERPRINT_VERSION})...")
 
-    # Track duplicate hashes to report potential issues
-    hash_counter = {}
+    chunk_size = chunk_size or config.FINGERPRINT_BACKFILL_CHUNK_SIZE
+    last_id = 0
+    processed = 0
     updated = 0
     duplicates = 0
-
-    for i, tx in enumerate(transactions):
-        tx_hash = generate_transaction_hash(tx)
-
-        # Check if this hash already exists in the database
-        existing = BankTransaction.query.filter_by(transaction_hash=tx_hash).first()
-
-        if existing and existing.id != tx.id:
-            # Duplicate transaction found
-            duplicates += 1
-            logger.warning(
-                f"Duplicate found: Transaction ID {tx.id} and {existing.id} have the same hash {tx_hash}"
+    try:
+        if retry_duplicates:
+            db.session.execute(
+                update(BankTransaction)
+                .where(BankTransaction.hash_version == DUPLICATE_HASH_VERSION)
+                .values(hash_version=None)
+                .execution_options(synchronize_session=False)
             )
-            logger.warning(f"  - Tx1: {tx.booking_date} | {tx.payee} | {tx.amount}")
-            logger.warning(
-                f"  - Tx2: {existing.booking_date} | {existing.payee} | {existing.amount}"
-            )
-        else:
-            # No duplicate, safe to assign the hash
-            tx.transaction_hash = tx_hash
-            updated += 1
-
-        # Track hash frequency
-        hash_counter[tx_hash] = hash_counter.get(tx_hash, 0) + 1
-
-        # Log progress every 100 transactions
-        if (i + 1) % 100 == 0:
-            logger.info(f"Processed {i + 1}/{total} transactions")
-
-    # Commit all changes
-    db.session.commit()
+            db.session.commit()
+        while limit is None or processed < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - processed)
+            chunk_last_id, chunk_updated, chunk_duplicates = backfill_chunk(db.session.connection(), last_id, size)
+            if chunk_last_id is None:
+                break
+            db.session.commit()
+            last_id = chunk_last_id
+            updated += chunk_updated
+            duplicates += len(chunk_duplicates)
+            processed += chunk_updated + len(chunk_duplicates)
+            logger.info(f"Processed {processed} transactions, up to ID {last_id}")
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        # Cached fingerprints may be outdated now
+        fingerprint_cache.clear()
 
     # Report results
-    logger.info("\nHash generation complete!")
-    logger.info(f"Updated {updated} transactions with hashes")
+    logger.info("Fingerprint backfill complete!")
+    logger.info(f"Updated {updated} transactions with fingerprints")
     logger.info(f"Found {duplicates} potential duplicate transactions")
 
-    # Report any hashes with more than one occurrence
-    duplicate_hashes = {h: count for h, count in hash_counter.items() if count > 1}
-    if duplicate_hashes:
-        logger.warning(f"Found {len(duplicate_hashes)} hash collisions:")
-        for tx_hash, count in duplicate_hashes.items():
-            logger.warning(f"Hash {tx_hash} appears {count} times")
-
     return updated, duplicates
 
 
@@ -118,9 +102,14 @@ if __name__ == "__main__":
     # Import and create app to get the application context
     from app import create_app
 
+    parser = argparse.ArgumentParser(description="Rehash transactions without a current fingerprint.")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Transactions per chunk and commit")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after about this many transactions")
+    parser.add_argument("--retry-duplicates", action="store_true", help="Check duplicates of earlier runs again")
+    args = parser.parse_args()
+
     setup_logging()
     app = create_app()
 
     with app.app_context():
-        update_transaction_hashes()
-
+        update_transaction_hashes(args.chunk_size, args.limit, args.retry_duplicates)
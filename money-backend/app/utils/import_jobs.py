@@ -0,0 +1,208 @@
+"""
+Background Import Jobs
+
+This module runs CSV imports outside of the Flask request on a local thread pool.
+Job state is kept in the import_job table so that any worker process can report
+the progress of a job, without an external message broker.
+
+Queued jobs live only in the thread pool of the process that accepted them. A
+job whose process stopped before finishing is marked failed by fail_stale_jobs,
+which create_app runs on startup (IMPORT_JOB_RECOVERY), and the upload spooled
+for it in IMPORT_SPOOL_DIR is removed.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config import config
+from app.models.db import db
+from app.models.import_job import ImportJob
+from app.utils.csv_import import CsvImportError
+from app.utils.statement_parsers import get_parser
+from app.utils.transaction_service import TransactionService
+
+# Set up logger
+logger = logging.getLogger("money_backend.import_jobs")
+
+# File name prefix of spooled uploads in IMPORT_SPOOL_DIR
+SPOOL_PREFIX = "import_"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Create the worker pool on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=config.IMPORT_JOB_WORKERS, thread_name_prefix="import-job"
+            )
+    return _executor
+
+
+def _spool_dir() -> str:
+    os.makedirs(config.IMPORT_SPOOL_DIR, exist_ok=True)
+    return config.IMPORT_SPOOL_DIR
+
+
+def _remove_spool(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"Could not remove import spool file {path}: {str(e)}")
+
+
+def enqueue_csv_import(file, user_id: int, parser_name: str = "dkb") -> ImportJob:
+    """
+    Queue a CSV upload for import on the background worker pool.
+    The upload is spooled to a temporary file because the request stream is
+    closed once the request has been answered; the file is removed again if the
+    job cannot be created.
+
+    Args:
+        file: The uploaded werkzeug FileStorage
+        user_id: ID of the user the transactions belong to
+        parser_name: Name of the statement parser (see app.utils.statement_parsers)
+
+    Returns:
+        The created ImportJob
+    """
+    fd, path = tempfile.mkstemp(prefix=SPOOL_PREFIX, suffix=".csv", dir=_spool_dir())
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            shutil.copyfileobj(file.stream, spool)
+
+        job = ImportJob(status="queued", filename=file.filename, user_id=user_id)
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        _remove_spool(path)
+        raise
+
+    app = current_app._get_current_object()
+    try:
+        _get_executor().submit(_run_csv_import, app, job.id, path, user_id, parser_name)
+    except Exception as e:
+        # E.g. the pool is shut down because the process is exiting
+        _remove_spool(path)
+        job.status = "failed"
+        job.errors = [f"Could not start the import: {str(e)}"]
+        job.finished_at = datetime.now()
+        db.session.commit()
+        raise
+    return job
+
+
+def fail_stale_jobs() -> int:
+    """
+    Mark jobs left queued or running by a stopped process as failed, and remove
+    the spooled uploads in IMPORT_SPOOL_DIR. Only safe while no other process is
+    importing: with several processes sharing the database, run it from one of
+    them only (see IMPORT_JOB_RECOVERY).
+
+    Returns:
+        Number of jobs marked as failed
+    """
+    stale = ImportJob.query.filter(ImportJob.status.in_(("queued", "running"))).all()
+    for job in stale:
+        job.status = "failed"
+        job.errors = (job.errors or []) + ["The import was interrupted by a restart, please upload the file again."]
+        job.finished_at = datetime.now()
+    db.session.commit()
+    if stale:
+        logger.warning(f"Marked {len(stale)} interrupted import jobs as failed")
+
+    if os.path.isdir(config.IMPORT_SPOOL_DIR):
+        for name in os.listdir(config.IMPORT_SPOOL_DIR):
+            if name.startswith(SPOOL_PREFIX):
+                _remove_spool(os.path.join(config.IMPORT_SPOOL_DIR, name))
+    return len(stale)
+
+
+def recover_jobs(app) -> None:
+    """Run fail_stale_jobs on startup; a database without the import_job table yet is skipped."""
+    with app.app_context():
+        try:
+            fail_stale_jobs()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.warning(f"Skipped import job recovery: {str(getattr(e, 'orig', None) or e)}")
+        finally:
+            db.session.remove()
+
+
+def _update_job(job: ImportJob, stats: dict) -> None:
+    """Copy the import counters onto the job row and commit."""
+    job.rows_parsed = stats.get("parsed", 0)
+    job.rows_deduplicated = stats.get("deduplicated", 0)
+    job.rows_categorized = stats.get("categorized", 0)
+    job.rows_inserted = stats.get("inserted", 0)
+    db.session.commit()
+
+
+def _run_csv_import(app, job_id: int, path: str, user_id: int, parser_name: str) -> None:
+    """Run a queued CSV import inside its own application context, then remove its spool file."""
+    try:
+        with app.app_context():
+            try:
+                _import_job(job_id, path, user_id, parser_name)
+            finally:
+                db.session.remove()
+    finally:
+        _remove_spool(path)
+
+
+def _import_job(job_id: int, path: str, user_id: int, parser_name: str) -> None:
+    job = db.session.get(ImportJob, job_id)
+    job.status = "running"
+    job.started_at = datetime.now()
+    db.session.commit()
+    logger.info(f"Starting import job {job_id}")
+
+    stats = {}
+    try:
+        with open(path, "rb") as stream:
+            TransactionService.import_transaction_stream(
+                get_parser(parser_name).iter_transactions(stream, user_id),
+                stats=stats,
+                progress=lambda counters: _update_job(job, counters),
+            )
+        job.status = "completed"
+        logger.info(f"Import job {job_id} completed, {stats.get('inserted', 0)} transactions added")
+    except CsvImportError as e:
+        db.session.rollback()
+        job.status = "failed"
+        job.errors = [f"{str(e)} (line {e.line})" if e.line else str(e)]
+        logger.error(f"Import job {job_id} aborted: {str(e)}")
+    except UnicodeDecodeError:
+        db.session.rollback()
+        job.status = "failed"
+        job.errors = ["File encoding is not UTF-8. Please convert to UTF-8 and try again."]
+        logger.error(f"Import job {job_id} failed: file is not UTF-8")
+    except Exception as e:
+        db.session.rollback()
+        job.status = "failed"
+        job.errors = [str(e)]
+        logger.error(f"Import job {job_id} failed: {str(e)}")
+        logger.error(f"Stack trace: {traceback.format_exc()}")
+
+    try:
+        job.finished_at = datetime.now()
+        _update_job(job, stats)
+    except SQLAlchemyError as e:
+        # The job stays running until fail_stale_jobs marks it on the next start
+        db.session.rollback()
+        logger.error(f"Could not record the result of import job {job_id}: {str(e)}")
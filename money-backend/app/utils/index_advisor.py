@@ -0,0 +1,212 @@
+"""
+Index Advisor
+
+This module runs EXPLAIN over the query shapes of the hot transaction routes and
+reports the ones the database would answer with a full scan of a large table,
+so a missing or unusable index shows up before it shows up as latency.
+
+Supported databases: MySQL (EXPLAIN, access type ALL) and SQLite (EXPLAIN QUERY
+PLAN, a SCAN step without an index). Query planners prefer full scans on tiny
+tables, so run it against a database with realistic data, e.g. one filled with
+seed_transactions(). See index_advisor.py in the project root for the CLI.
+"""
+import logging
+import random
+import re
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.sql import Select
+
+from app.models.bank_account import BankAccount
+from app.models.category import Category
+from app.models.db import db
+from app.models.rule import Rule
+from app.models.transaction import BankTransaction
+from app.models.transaction_rollup import TransactionRollup
+from app.models.user import User
+from app.utils import category_tree, rollup
+
+# Set up logger
+logger = logging.getLogger("money_backend.index_advisor")
+
+# Tables that grow with the transaction history; full scans of other tables are not reported
+LARGE_TABLES = ("bank_transaction", "transaction_rollup")
+
+# Rows per page of the listing queries (per_page + 1 for the next-page check)
+PAGE_LIMIT = 26
+
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+
+def _first_id(model) -> int:
+    return db.session.scalar(select(func.min(model.id))) or 1
+
+
+def route_queries() -> List[Tuple[str, Select]]:
+    """
+    The query shapes of the hot routes, with sample values taken from the database.
+
+    Returns:
+        (name, statement) pairs
+    """
+    user_id = _first_id(User)
+    category_id = _first_id(Category)
+    rule_id = _first_id(Rule)
+    bank_account_id = _first_id(BankAccount)
+    last_date = db.session.scalar(select(func.max(BankTransaction.booking_date))) or date.today()
+    month = rollup.year_month(last_date)
+    hashes = list(db.session.scalars(select(BankTransaction.transaction_hash).limit(50))) or ["0" * 32]
+
+    def page(*criteria) -> Select:
+        # Keyset first page, as built by keyset_paginate
+        return (
+            select(BankTransaction.id, BankTransaction.booking_date, BankTransaction.amount, BankTransaction.payee)
+            .where(*criteria)
+            .order_by(BankTransaction.booking_date.desc(), BankTransaction.id.desc())
+            .limit(PAGE_LIMIT)
+        )
+
+    return [
+        ("transactions.list", page()),
+        ("transactions.list by user", page(BankTransaction.user_id == user_id)),
+        ("transactions.list by date range", page(
+            BankTransaction.booking_date >= last_date - timedelta(days=30), BankTransaction.booking_date <= last_date
+        )),
+        ("transactions.list by account", page(BankTransaction.bank_account_id == bank_account_id)),
+        ("transactions.by_category", page(category_tree.in_subtree(BankTransaction.category_id, category_id))),
+        ("transactions.uncategorized", page(BankTransaction.category_id.is_(None))),
+        ("transactions.get", select(BankTransaction).where(BankTransaction.id == 1)),
+        ("import.existing_hashes", select(BankTransaction.transaction_hash).where(BankTransaction.transaction_hash.in_(hashes))),
+        ("rule_planner.previous_ids", select(BankTransaction.id).where(BankTransaction.rule_id == rule_id)),
+        ("rollup.refresh", rollup.group_select([(user_id, bank_account_id, category_id, month)])),
+        ("statistics.rollup_months", (
+            select(TransactionRollup.category_id, TransactionRollup.year_month, func.sum(TransactionRollup.total_cents))
+            .where(TransactionRollup.year_month.between(month - 100, month))
+            .group_by(TransactionRollup.category_id, TransactionRollup.year_month)
+        )),
+    ]
+
+
+def _compile(statement: Select, dialect) -> str:
+    return str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+def _explain_sqlite(connection, sql: str) -> Tuple[List[str], List[str]]:
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+    plan = [row[3] for row in rows]
+    scans = []
+    for detail in plan:
+        found = _SQLITE_SCAN.match(detail)
+        if found and found.group(1) in LARGE_TABLES:
+            scans.append(found.group(1))
+    return plan, scans
+
+
+def _explain_mysql(connection, sql: str) -> Tuple[List[str], List[str]]:
+    rows = connection.exec_driver_sql(f"EXPLAIN {sql}").mappings().all()
+    plan = [
+        f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']} {row['Extra'] or ''}".rstrip()
+        for row in rows
+    ]
+    scans = [row["table"] for row in rows if row["type"] == "ALL" and row["table"] in LARGE_TABLES]
+    return plan, scans
+
+
+EXPLAINERS: Dict[str, Callable[[Any, str], Tuple[List[str], List[str]]]] = {
+    "sqlite": _explain_sqlite,
+    "mysql": _explain_mysql,
+}
+
+
+def explain_route_queries() -> List[Dict[str, Any]]:
+    """
+    EXPLAIN every route query shape.
+
+    Returns:
+        One {"name", "sql", "plan", "full_scans"} entry per query; full_scans lists
+        the large tables the query reads completely
+
+    Raises:
+        ValueError: If the database is not supported
+    """
+    connection = db.session.connection()
+    explain = EXPLAINERS.get(connection.dialect.name)
+    if explain is None:
+        raise ValueError(f"EXPLAIN is not supported for {connection.dialect.name}")
+
+    results = []
+    for name, statement in route_queries():
+        sql = _compile(statement, connection.dialect)
+        plan, scans = explain(connection, sql)
+        if scans:
+            logger.warning(f"Full scan of {', '.join(scans)} in {name}")
+        results.append({"name": name, "sql": sql, "plan": plan, "full_scans": scans})
+    return results
+
+
+def seed_transactions(count: int, seed: int = 0) -> int:
+    """
+    Fill an empty database with synthetic users, accounts, categories, rules and
+    transactions, and refresh the planner statistics. Commits.
+
+    Args:
+        count: Number of transactions to create
+        seed: Random seed
+
+    Returns:
+        Number of transactions created
+
+    Raises:
+        ValueError: If the database already contains transactions
+    """
+    if db.session.scalar(select(func.count()).select_from(BankTransaction)):
+        raise ValueError("Refusing to seed a database that already contains transactions")
+
+    rnd = random.Random(seed)
+    users = [User(name=f"Seed user {i}", email=f"seed{i}@example.invalid") for i in range(3)]
+    db.session.add_all(users)
+    db.session.flush()
+    accounts = [BankAccount(name=f"Seed account {i}", iban=f"DE00SEED{i:014d}", user_id=users[i % 3].id) for i in range(6)]
+    categories = [Category(name=f"Seed category {i}") for i in range(20)]
+    db.session.add_all(accounts + categories)
+    db.session.flush()
+    rules = [Rule(name=f"Seed rule {i}", category_id=categories[i].id) for i in range(10)]
+    db.session.add_all(rules)
+    db.session.flush()
+
+    start = date.today() - timedelta(days=5 * 365)
+    batch = []
+    for i in range(count):
+        account = rnd.choice(accounts)
+        rule = rnd.choice(rules) if rnd.random() < 0.5 else None
+        category_id = rule.category_id if rule else (rnd.choice(categories).id if rnd.random() < 0.5 else None)
+        batch.append({
+            "booking_date": start + timedelta(days=rnd.randrange(5 * 365)),
+            "amount_cents": rnd.randint(-200000, 200000),
+            "payee": f"Payee {rnd.randrange(500)}",
+            "purpose": f"Seed purpose {i}",
+            "user_id": account.user_id,
+            "bank_account_id": account.id,
+            "category_id": category_id,
+            "rule_id": rule.id if rule else None,
+            "transaction_hash": f"{i:032x}",
+        })
+        if len(batch) == 10000:
+            db.session.execute(insert(BankTransaction), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(BankTransaction), batch)
+    category_tree.rebuild()
+    rollup.rebuild()
+    db.session.commit()
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite":
+        db.session.execute(text("ANALYZE"))
+    elif dialect == "mysql":
+        db.session.execute(text("ANALYZE TABLE bank_transaction, transaction_rollup"))
+    db.session.commit()
+    logger.info(f"Seeded {count} transactions")
+    return count
@@ -0,0 +1,330 @@
+"""
+Application Metrics
+
+This module keeps process-wide counters, gauges and histograms and renders them
+in the Prometheus text exposition format for the /metrics endpoint.
+
+Collected metrics:
+- HTTP request latency per endpoint, method and status
+- Database queries and query time, in total and per request (SQLAlchemy engine events)
+- Connection pool checkout waits and pool usage
+- Imported rows per stage and time spent importing; import throughput is
+  rate(import_rows_total[5m]) / rate(import_seconds_total[5m])
+- Rule engine evaluations
+- Cache lookups per cache and result (hit/miss)
+- Import fingerprint cache lookups per result (Bloom filter negative, LRU hit,
+  database hit, Bloom filter false positive)
+- The per-middleware pipeline stats, when pipeline instrumentation is enabled
+
+Values are per process: with several gunicorn workers, every worker reports its
+own series and the scraper sees whichever worker answers.
+
+The endpoint is unauthenticated unless METRICS_TOKEN is set, in which case
+scrapers must send it as "Authorization: Bearer <token>".
+"""
+import hmac
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask, Response, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Default latency buckets in seconds, as used by the Prometheus client libraries
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A metric family: one value (or histogram) per combination of label values."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[Any, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[Any, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values = {}
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                    for key, value in self._values.items()]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"] + self.samples()
+
+
+class Counter(_Metric):
+    """A value that only goes up."""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that is set to the current state."""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, with their sum and count."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(float(bound))}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The set of metrics rendered by /metrics. Collectors are callbacks run before
+    rendering, to update gauges from state that is read at scrape time.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: _Metric) -> Any:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("endpoint", "method", "status"))
+http_request_db_queries = registry.histogram(
+    "http_request_db_queries", "Database queries per HTTP request", ("endpoint",), COUNT_BUCKETS)
+http_request_db_seconds = registry.histogram(
+    "http_request_db_seconds", "Database query time per HTTP request", ("endpoint",))
+db_queries = registry.counter("db_queries_total", "Database queries executed")
+db_query_seconds = registry.counter("db_query_seconds_total", "Time spent executing database queries")
+db_pool_checkout_seconds = registry.histogram(
+    "db_pool_checkout_seconds", "Time waited for a connection from the pool")
+db_pool_checked_out = registry.gauge("db_pool_checked_out", "Connections currently checked out of the pool")
+db_pool_overflow = registry.gauge("db_pool_overflow", "Connections open beyond the pool size")
+import_rows = registry.counter("import_rows_total", "Imported transaction rows per stage", ("stage",))
+import_seconds = registry.counter("import_seconds_total", "Time spent processing and saving imports")
+rule_evaluations = registry.counter(
+    "rule_engine_evaluations_total", "Transactions evaluated against the rule set", ("source",))
+cache_requests = registry.counter("cache_requests_total", "Cache lookups", ("cache", "result"))
+fingerprint_cache_lookups = registry.counter(
+    "fingerprint_cache_lookups_total", "Import fingerprint cache lookups by result", ("result",))
+pipeline_seconds = registry.gauge(
+    "pipeline_middleware_seconds", "Cumulative time spent per pipeline middleware (instrumented runs only)", ("middleware",))
+pipeline_rows = registry.gauge(
+    "pipeline_middleware_rows", "Rows processed per pipeline middleware (instrumented runs only)", ("middleware",))
+pipeline_rows_changed = registry.gauge(
+    "pipeline_middleware_rows_changed", "Rows changed per pipeline middleware (instrumented runs only)", ("middleware",))
+pipeline_errors = registry.gauge(
+    "pipeline_middleware_errors", "Exceptions per pipeline middleware (instrumented runs only)", ("middleware",))
+
+
+def record_cache(cache: str, lookups: int, misses: int) -> None:
+    """Count the lookups of a cache, given the total number of lookups and how many missed."""
+    if lookups:
+        cache_requests.inc(lookups - misses, cache=cache, result="hit")
+        cache_requests.inc(misses, cache=cache, result="miss")
+
+
+# Per-thread query counters of the request being handled
+_request_local = threading.local()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's execution context, so a failed statement leaves nothing behind;
+    # statements without a context overwrite the connection's single slot
+    if context is not None:
+        context._query_start = time.perf_counter()
+    else:
+        conn.info["query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        start = context._query_start
+    else:
+        start = conn.info.pop("query_start")
+    elapsed = time.perf_counter() - start
+    db_queries.inc()
+    db_query_seconds.inc(elapsed)
+    counters = getattr(_request_local, "db", None)
+    if counters is not None:
+        counters[0] += 1
+        counters[1] += elapsed
+
+
+def _instrument_engine(engine: Engine) -> None:
+    """Attach query listeners and checkout timing to an engine, once."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    # The pool has no event before a checkout starts, so time Pool.connect itself
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            db_pool_checkout_seconds.observe(time.perf_counter() - start)
+
+    pool.connect = timed_connect
+
+    def collect_pool():
+        if hasattr(pool, "checkedout"):
+            db_pool_checked_out.set(pool.checkedout())
+        if hasattr(pool, "overflow"):
+            db_pool_overflow.set(max(pool.overflow(), 0))
+
+    registry.add_collector(collect_pool)
+
+
+def _collect_pipeline_stats() -> None:
+    from app.utils.transaction_middleware import transaction_pipeline
+
+    for name, stats in transaction_pipeline.get_stats().items():
+        pipeline_seconds.set(stats["seconds"], middleware=name)
+        pipeline_rows.set(stats["rows"], middleware=name)
+        pipeline_rows_changed.set(stats["rows_changed"], middleware=name)
+        pipeline_errors.set(stats["errors"], middleware=name)
+
+
+registry.add_collector(_collect_pipeline_stats)
+
+
+def init_metrics(app: Flask, engine: Optional[Engine] = None) -> None:
+    """
+    Record request and database metrics for an application and expose them on /metrics.
+
+    Args:
+        app: The Flask application
+        engine: The SQLAlchemy engine to instrument
+    """
+    if engine is not None:
+        _instrument_engine(engine)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+        _request_local.db = [0, 0.0]
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop("metrics_start", None)
+        counters = getattr(_request_local, "db", None)
+        _request_local.db = None
+        if start is None:
+            return response
+        endpoint = request.endpoint or "unmatched"
+        http_request_seconds.observe(
+            time.perf_counter() - start, endpoint=endpoint, method=request.method, status=response.status_code
+        )
+        if counters is not None:
+            http_request_db_queries.observe(counters[0], endpoint=endpoint)
+            http_request_db_seconds.observe(counters[1], endpoint=endpoint)
+        return response
+
+    token = app.config.get("METRICS_TOKEN")
+
+    @app.route("/metrics")
+    def metrics():
+        """Prometheus metrics endpoint"""
+        if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return Response("Unauthorized\n", status=401, headers={"WWW-Authenticate": "Bearer"}, content_type=CONTENT_TYPE)
+        return Response(registry.render(), content_type=CONTENT_TYPE)
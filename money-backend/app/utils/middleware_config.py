@@ -5,6 +5,7 @@ This module sets up the global transaction middleware pipeline.
 """
 
 from app.models import transaction
+from app.config import config
 from app.utils.transaction_middleware import transaction_pipeline
 from app.utils.transaction_middlewares import (
     DataCleaningMiddleware,
@@ -23,22 +24,30 @@ def configure_transaction_middlewares():
     # Clear any existing middleware first
     transaction_pipeline.middlewares = []
 
+    # Shard large bulk runs across worker processes
+    transaction_pipeline.parallel_workers = config.PIPELINE_WORKERS
+    transaction_pipeline.parallel_threshold = config.PIPELINE_PARALLEL_THRESHOLD
+
+    # Per-middleware timing and counters (also switchable at runtime via the pipeline API)
+    transaction_pipeline.instrumented = config.PIPELINE_INSTRUMENTATION
+
     # Add middleware in the desired processing order
 
     # 1. First, clean and normalize the data
     transaction_pipeline.add_middleware(DataCleaningMiddleware())
 
-    # 2. Generate transaction hash for duplicate detection
+    # 2. Parse the dates, the fingerprint is computed from the parsed values
+    transaction_pipeline.add_middleware(DateFormattingMiddleware())
+
+    # 3. Generate transaction hash for duplicate detection
     transaction_pipeline.add_middleware(TransactionHashMiddleware())
 
-    # 3. Detect internal transfers between own accounts
+    # 4. Detect internal transfers between own accounts
     transaction_pipeline.add_middleware(InternalTransferDetectionMiddleware())
 
-    # 4. Apply categorization rules
+    # 5. Apply categorization rules
     transaction_pipeline.add_middleware(ApplyRulesMiddleware())
 
-    transaction_pipeline.add_middleware(DateFormattingMiddleware())
-
     # Additional middlewares can be added here based on configuration or other requirements
 
     return transaction_pipeline
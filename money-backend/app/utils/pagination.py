@@ -0,0 +1,212 @@
+"""
+Keyset Pagination
+
+This module pages through transaction queries with keyset (cursor) pagination:
+instead of OFFSET, each page continues after the (sort value, id) of the last row
+of the previous page, so every page costs the same as the first one.
+
+Cursors are opaque, URL-safe strings. They record the sort column, the sort order
+and the position, so a cursor cannot be reused with a different sort.
+
+NULL sort values are ordered like MySQL and SQLite order them: before every other
+value in ascending order, after them in descending order.
+"""
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models.transaction import BankTransaction
+
+# Columns transactions can be sorted by in cursor mode, id is always the tie-breaker
+SORTABLE_COLUMNS = (
+    "booking_date", "value_date", "amount", "payee", "payer", "purpose",
+    "transaction_type", "iban", "category_id", "id",
+)
+
+
+# Sort column of requests that name none, or one that is not sortable
+DEFAULT_SORT_COLUMN = "booking_date"
+
+
+def resolve_sort_column(sort_by: Optional[str]) -> str:
+    """The sort column of a request: sort_by if it is in SORTABLE_COLUMNS, else DEFAULT_SORT_COLUMN."""
+    return sort_by if sort_by in SORTABLE_COLUMNS else DEFAULT_SORT_COLUMN
+
+
+class InvalidCursorError(ValueError):
+    """Raised for a malformed cursor, or a cursor that does not fit the requested sort."""
+
+
+class KeysetPage:
+    """One page of a keyset paginated query."""
+
+    def __init__(self, items: List[Any], next_cursor: Optional[str], prev_cursor: Optional[str]):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _decode_value(column: ColumnElement, value: Any) -> Any:
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is float and isinstance(value, int):
+        return float(value)
+    if not isinstance(value, python_type):
+        raise InvalidCursorError("Cursor value does not match the sort column")
+    return value
+
+
+def encode_cursor(sort_by: str, descending: bool, item: Any, direction: str) -> str:
+    """
+    Build the cursor pointing just past an item.
+
+    Args:
+        sort_by: Name of the sort column
+        descending: Whether the sort order is descending
+        item: The transaction at the page boundary
+        direction: "next" for the rows after the item, "prev" for the rows before it
+    """
+    payload = {
+        "s": sort_by,
+        "o": "desc" if descending else "asc",
+        "v": _encode_value(getattr(item, sort_by)),
+        "i": item.id,
+        "d": direction,
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, descending: bool) -> Dict[str, Any]:
+    """
+    Decode a cursor and check that it belongs to the requested sort.
+
+    Returns:
+        {"value", "id", "direction"} of the cursor
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed or was made for another sort
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        position = {"sort_by": payload["s"], "order": payload["o"], "value": payload["v"],
+                    "id": int(payload["i"]), "direction": payload["d"]}
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursorError("Malformed cursor")
+
+    if position["sort_by"] != sort_by or position["order"] != ("desc" if descending else "asc"):
+        raise InvalidCursorError("Cursor was created for a different sort order")
+    if position["direction"] not in ("next", "prev"):
+        raise InvalidCursorError("Malformed cursor")
+    try:
+        position["value"] = _decode_value(getattr(BankTransaction, sort_by), position["value"])
+    except ValueError:
+        raise InvalidCursorError("Malformed cursor")
+    return position
+
+
+def _after(column: ColumnElement, value: Any, last_id: int) -> ColumnElement:
+    """Rows after (value, last_id) in ascending (column, id) order, NULLs first."""
+    id_column = BankTransaction.id
+    if column is id_column:
+        return id_column > last_id
+    if value is None:
+        return or_(and_(column.is_(None), id_column > last_id), column.is_not(None))
+    return or_(column > value, and_(column == value, id_column > last_id))
+
+
+def _before(column: ColumnElement, value: Any, last_id: int) -> ColumnElement:
+    """Rows before (value, last_id) in ascending (column, id) order, NULLs first."""
+    id_column = BankTransaction.id
+    if column is id_column:
+        return id_column < last_id
+    if value is None:
+        return and_(column.is_(None), id_column < last_id)
+    return or_(column < value, and_(column == value, id_column < last_id), column.is_(None))
+
+
+def keyset_paginate(
+    query: Query,
+    sort_by: str = "booking_date",
+    descending: bool = True,
+    per_page: int = 25,
+    cursor: Optional[str] = None,
+) -> KeysetPage:
+    """
+    Fetch one page of a transaction query ordered by (sort column, id).
+
+    Args:
+        query: Filtered BankTransaction query without ORDER BY
+        sort_by: Name of the sort column, one of SORTABLE_COLUMNS
+        descending: Sort order
+        per_page: Rows per page
+        cursor: A next or prev cursor of a previous page, None for the first page
+
+    Returns:
+        The page, with cursors for the neighbouring pages where they exist
+
+    Raises:
+        InvalidCursorError: If the sort column is not allowed or the cursor is invalid
+    """
+    if sort_by not in SORTABLE_COLUMNS:
+        raise InvalidCursorError(f"Cannot paginate by '{sort_by}', allowed: {', '.join(SORTABLE_COLUMNS)}")
+
+    column = getattr(BankTransaction, sort_by)
+    position = decode_cursor(cursor, sort_by, descending) if cursor else None
+    backwards = position is not None and position["direction"] == "prev"
+
+    if position is not None:
+        # Going forward in descending order means going backwards in ascending order
+        if backwards == descending:
+            query = query.filter(_after(column, position["value"], position["id"]))
+        else:
+            query = query.filter(_before(column, position["value"], position["id"]))
+
+    # Fetch backwards pages in reverse order, then flip them
+    ascending = descending == backwards
+    order = [column.asc(), BankTransaction.id.asc()] if ascending else [column.desc(), BankTransaction.id.desc()]
+    if column is BankTransaction.id:
+        order = order[1:]
+
+    # One extra row tells whether there is another page in the direction of travel
+    rows = query.order_by(*order).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    items = rows[:per_page]
+    if backwards:
+        items.reverse()
+
+    if not items:
+        return KeysetPage([], None, None)
+
+    has_next = more if not backwards else True
+    has_prev = more if backwards else position is not None
+    return KeysetPage(
+        items,
+        encode_cursor(sort_by, descending, items[-1], "next") if has_next else None,
+        encode_cursor(sort_by, descending, items[0], "prev") if has_prev else None,
+    )
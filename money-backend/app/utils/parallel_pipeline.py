@@ -0,0 +1,173 @@
+"""
+Parallel Pipeline Execution
+
+This module runs the pure, database-free stages of the middleware pipeline
+(cleaning, hashing, date formatting, rule matching against a compiled rule set)
+in a process pool. Batches are split into shards, each shard runs through the
+stages in a worker process, and the results are merged back in order.
+Database reads happen in the parent before dispatch (TransactionMiddleware.prepare)
+and writes stay in the parent; workers never touch the database.
+
+BankTransaction objects are not sent to workers. Their column values are, and the
+worker processes transient copies; the parent then copies the changed values
+back onto the original objects.
+
+When the pipeline is instrumented, workers measure their stages and return the
+counters with the shard; the parent adds them to the pipeline's stats.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.transaction import BankTransaction
+from app.utils.transaction_middleware import (
+    MiddlewareStats, TransactionData, TransactionMiddleware, TransactionMiddlewarePipeline, run_measured
+)
+
+# Set up logger
+logger = logging.getLogger("money_backend.parallel_pipeline")
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    """Create the worker pool on first use, or again when the worker count changes."""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # spawn: forked children would inherit database connections and locks held by other threads
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _executor_workers = workers
+        return _executor
+
+
+def _reset_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+
+
+def _column_names() -> List[str]:
+    return [column.key for column in BankTransaction.__table__.columns]
+
+
+ShardResult = Tuple[List[Any], Dict[str, MiddlewareStats]]
+
+
+def _run_stages(stages: List[TransactionMiddleware], shard: List[Any], instrumented: bool) -> ShardResult:
+    stats = {}
+    for stage in stages:
+        if not instrumented:
+            shard = stage.process_batch(shard)
+            continue
+        current = shard
+        shard, stage_stats = run_measured(stage, lambda: stage.process_batch(current), list, current)
+        stats[str(stage)] = stage_stats
+    return shard, stats
+
+
+def _process_dict_shard(stages: List[TransactionMiddleware], shard: List[TransactionData], instrumented: bool) -> ShardResult:
+    """Worker: run a shard of transaction dictionaries through the stages."""
+    return _run_stages(stages, shard, instrumented)
+
+
+def _process_object_shard(stages: List[TransactionMiddleware], shard: List[Dict[str, Any]], instrumented: bool) -> ShardResult:
+    """Worker: run column values of BankTransactions through the stages as transient objects."""
+    transactions, stats = _run_stages(stages, [BankTransaction(**values) for values in shard], instrumented)
+    names = _column_names()
+    return [{name: getattr(transaction, name) for name in names} for transaction in transactions], stats
+
+
+def _shards(items: List[Any], count: int) -> List[List[Any]]:
+    size = -(-len(items) // count)
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def run_stages_in_pool(
+    stages: List[TransactionMiddleware],
+    transactions: List[Any],
+    workers: int,
+    pipeline: Optional[TransactionMiddlewarePipeline] = None,
+) -> List[Any]:
+    """
+    Run a list of transactions through pure middleware stages in the process pool.
+
+    Args:
+        stages: Middlewares with pure = True, already prepared
+        transactions: Transaction data dictionaries or BankTransaction objects (not mixed)
+        workers: Number of worker processes
+        pipeline: Pipeline to record stage stats on, if it is instrumented
+
+    Returns:
+        The original transactions, updated in place
+    """
+    executor = _get_executor(workers)
+    shards = _shards(transactions, workers)
+    instrumented = pipeline is not None and pipeline.instrumented
+    logger.debug(f"Running {len(stages)} stages on {len(transactions)} transactions in {len(shards)} shards")
+
+    def merged(results):
+        for shard, stats in results:
+            if instrumented:
+                for name, stage_stats in stats.items():
+                    pipeline.record_stats(name, stage_stats)
+            yield from shard
+
+    try:
+        if isinstance(transactions[0], dict):
+            results = executor.map(_process_dict_shard, [stages] * len(shards), shards, [instrumented] * len(shards))
+            # Update the original dictionaries, like the in-process path does;
+            # replace their contents, stages also remove keys (e.g. amount)
+            for transaction, values in zip(transactions, merged(results)):
+                transaction.clear()
+                transaction.update(values)
+            return transactions
+
+        names = _column_names()
+        payloads = [[{name: getattr(transaction, name) for name in names} for transaction in shard] for shard in shards]
+        results = executor.map(_process_object_shard, [stages] * len(shards), payloads, [instrumented] * len(shards))
+        for transaction, values in zip(transactions, merged(results)):
+            for name, value in values.items():
+                # Only assign changed values, so unchanged rows are not flushed
+                if getattr(transaction, name) != value:
+                    setattr(transaction, name, value)
+        return transactions
+    except BrokenProcessPool:
+        _reset_executor()
+        raise
+
+
+def process_bulk_parallel(pipeline: TransactionMiddlewarePipeline, transactions: List[Any]) -> List[Any]:
+    """
+    Process transactions through a pipeline's middlewares, running consecutive pure
+    stages in the process pool and all other stages in-process, in order.
+
+    Args:
+        pipeline: The pipeline, providing middlewares and worker count
+        transactions: Transaction data dictionaries or BankTransaction objects (not mixed)
+
+    Returns:
+        The processed transactions
+    """
+    result = list(transactions)
+    pure_run = []
+    for middleware in pipeline.middlewares + [None]:
+        if middleware is not None and middleware.pure:
+            middleware.prepare()
+            pure_run.append(middleware)
+            continue
+        if pure_run:
+            result = run_stages_in_pool(pure_run, result, pipeline.parallel_workers, pipeline)
+            pure_run = []
+        if middleware is not None:
+            result = pipeline.run_batch(middleware, result)
+    return result
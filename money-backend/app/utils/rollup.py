@@ -0,0 +1,440 @@
+"""
+Transaction Rollup
+
+This module maintains the transaction_rollup table, a monthly aggregate (sum,
+count, min and max of the amount in cents) of bank transactions per user, bank account
+and category, and answers the statistics queries from it.
+
+Maintenance is incremental:
+- New transactions are added to their groups with an upsert of the deltas.
+- Groups that lose transactions or whose transactions change (recategorization,
+  amount or date edits, deletes) are recomputed from that month's transactions,
+  since min and max cannot be decremented.
+
+ORM changes are picked up by session flush events. Bulk statements that bypass
+the ORM call add_rows(), refresh_groups() or the tracking helpers themselves.
+rebuild() recomputes the whole table.
+
+Statistics for a date range read whole months from the rollup; only the days of
+partially covered months at the edges of the range are aggregated from
+bank_transaction, using the booking_date index.
+"""
+import logging
+from calendar import monthrange
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import Select, and_, delete, event, extract, func, insert, inspect, or_, select, tuple_
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models.db import db
+from app.models.transaction import BankTransaction
+from app.models.transaction_rollup import TransactionRollup
+from app.models.user import User
+
+# Set up logger
+logger = logging.getLogger("money_backend.rollup")
+
+# (user_id, bank_account_id, category_id, year_month), 0 standing in for NULL
+RollupKey = Tuple[int, int, int, int]
+
+# Groups recomputed per query
+REFRESH_CHUNK_SIZE = 200
+
+# Transaction attributes that decide a transaction's group or its contribution
+TRACKED_ATTRIBUTES = ("user_id", "bank_account_id", "category_id", "booking_date", "amount_cents")
+
+rollup_table = TransactionRollup.__table__
+KEY_COLUMNS = (rollup_table.c.user_id, rollup_table.c.bank_account_id, rollup_table.c.category_id, rollup_table.c.year_month)
+
+
+def year_month(value: Any) -> int:
+    """YYYYMM of a date (or ISO date string), 0 for None."""
+    if isinstance(value, str):
+        try:
+            value = date.fromisoformat(value[:10])
+        except ValueError:
+            return 0
+    if value is None or not hasattr(value, "year"):
+        return 0
+    return value.year * 100 + value.month
+
+
+def rollup_key(user_id: Any, bank_account_id: Any, category_id: Any, booking_date: Any) -> RollupKey:
+    return (user_id or 0, bank_account_id or 0, category_id or 0, year_month(booking_date))
+
+
+def _year_month_expression() -> ColumnElement:
+    booking_date = BankTransaction.booking_date
+    return func.coalesce(extract("year", booking_date) * 100 + extract("month", booking_date), 0)
+
+
+def _key_expressions() -> List[ColumnElement]:
+    """The rollup key of bank_transaction rows, in SQL."""
+    return [
+        func.coalesce(BankTransaction.user_id, 0),
+        func.coalesce(BankTransaction.bank_account_id, 0),
+        func.coalesce(BankTransaction.category_id, 0),
+        _year_month_expression(),
+    ]
+
+
+def _aggregate_columns() -> List[ColumnElement]:
+    amount = BankTransaction.amount_cents
+    return [func.coalesce(func.sum(amount), 0), func.count(), func.min(amount), func.max(amount)]
+
+
+def _month_range(value: int) -> Tuple[date, date]:
+    """First day of the month and first day of the next month."""
+    year, month = divmod(value, 100)
+    start = date(year, month, 1)
+    return start, start + timedelta(days=monthrange(year, month)[1])
+
+
+def _connection(session: Optional[Session] = None):
+    # Core statements on the connection, so no autoflush is triggered from flush events
+    return (session or db.session).connection()
+
+
+# --- Maintenance ---------------------------------------------------------------------------------
+
+
+def _upsert_deltas(deltas: Dict[RollupKey, List[Any]], session: Optional[Session] = None) -> None:
+    """Add per-group [sum, count, min, max] deltas to the rollup."""
+    if not deltas:
+        return
+    connection = _connection(session)
+    dialect = connection.dialect.name
+    params = [
+        {
+            "user_id": key[0], "bank_account_id": key[1], "category_id": key[2], "year_month": key[3],
+            "total_cents": values[0], "transaction_count": values[1],
+            "min_cents": values[2], "max_cents": values[3],
+        }
+        for key, values in deltas.items()
+    ]
+    c = rollup_table.c
+
+    if dialect == "mysql":
+        stmt = mysql.insert(rollup_table)
+        new = stmt.inserted
+        least, greatest = func.least, func.greatest
+        statement = stmt.on_duplicate_key_update(
+            total_cents=c.total_cents + new.total_cents,
+            transaction_count=c.transaction_count + new.transaction_count,
+            # LEAST/GREATEST return NULL if any argument is NULL
+            min_cents=least(func.coalesce(c.min_cents, new.min_cents), func.coalesce(new.min_cents, c.min_cents)),
+            max_cents=greatest(func.coalesce(c.max_cents, new.max_cents), func.coalesce(new.max_cents, c.max_cents)),
+        )
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(rollup_table)
+        new = stmt.excluded
+        statement = stmt.on_conflict_do_update(
+            index_elements=list(KEY_COLUMNS),
+            set_={
+                "total_cents": c.total_cents + new.total_cents,
+                "transaction_count": c.transaction_count + new.transaction_count,
+                # Two-argument min()/max() are scalar functions in SQLite, NULL if any argument is NULL
+                "min_cents": func.min(func.coalesce(c.min_cents, new.min_cents), func.coalesce(new.min_cents, c.min_cents)),
+                "max_cents": func.max(func.coalesce(c.max_cents, new.max_cents), func.coalesce(new.max_cents, c.max_cents)),
+            },
+        )
+    else:
+        # No portable upsert, recompute the groups instead
+        refresh_groups(deltas.keys(), session)
+        return
+    connection.execute(statement, params)
+
+
+def add_rows(rows: Iterable[Any], session: Optional[Session] = None) -> int:
+    """
+    Add newly inserted transactions (dictionaries or BankTransaction objects) to the rollup.
+
+    Returns:
+        Number of groups updated
+    """
+    deltas: Dict[RollupKey, List[Any]] = {}
+    for row in rows:
+        get = row.get if isinstance(row, dict) else (lambda name, row=row: getattr(row, name, None))
+        key = rollup_key(get("user_id"), get("bank_account_id"), get("category_id"), get("booking_date"))
+        amount = get("amount_cents")
+        delta = deltas.get(key)
+        if delta is None:
+            delta = deltas[key] = [0, 0, None, None]
+        delta[1] += 1
+        if amount is not None:
+            delta[0] += amount
+            delta[2] = amount if delta[2] is None else min(delta[2], amount)
+            delta[3] = amount if delta[3] is None else max(delta[3], amount)
+    _upsert_deltas(deltas, session)
+    return len(deltas)
+
+
+def group_select(keys: Sequence[RollupKey]) -> Select:
+    """The aggregate of bank_transaction for some rollup groups, as used by refresh_groups()."""
+    key_expressions = _key_expressions()
+
+    # One condition per month, so each can use the booking_date index
+    by_month: Dict[int, List[Tuple[int, int, int]]] = {}
+    for key in keys:
+        by_month.setdefault(key[3], []).append(key[:3])
+    conditions = []
+    for month, owners in by_month.items():
+        if month == 0:
+            date_condition = BankTransaction.booking_date.is_(None)
+        else:
+            first, following = _month_range(month)
+            date_condition = and_(BankTransaction.booking_date >= first, BankTransaction.booking_date < following)
+        conditions.append(and_(date_condition, tuple_(*key_expressions[:3]).in_(owners)))
+
+    return select(*key_expressions, *_aggregate_columns()).where(or_(*conditions)).group_by(*key_expressions)
+
+
+def refresh_groups(keys: Iterable[RollupKey], session: Optional[Session] = None) -> int:
+    """
+    Recompute rollup groups from bank_transaction. Groups without transactions are removed.
+
+    Returns:
+        Number of groups recomputed
+    """
+    keys = sorted(set(keys))
+    connection = _connection(session)
+    for start in range(0, len(keys), REFRESH_CHUNK_SIZE):
+        chunk = keys[start:start + REFRESH_CHUNK_SIZE]
+        rows = connection.execute(group_select(chunk)).all()
+
+        connection.execute(delete(rollup_table).where(tuple_(*KEY_COLUMNS).in_(chunk)))
+        if rows:
+            connection.execute(insert(rollup_table), [
+                {
+                    "user_id": row[0], "bank_account_id": row[1], "category_id": row[2], "year_month": row[3],
+                    "total_cents": row[4], "transaction_count": row[5], "min_cents": row[6], "max_cents": row[7],
+                }
+                for row in rows
+            ])
+    return len(keys)
+
+
+def keys_where(clause: ColumnElement, session: Optional[Session] = None) -> Set[RollupKey]:
+    """The groups of the transactions matching a WHERE clause."""
+    expressions = _key_expressions()
+    return {tuple(row) for row in _connection(session).execute(select(*expressions).where(clause).distinct())}
+
+
+def keys_for_ids(ids: Sequence[int], session: Optional[Session] = None) -> Set[RollupKey]:
+    """The groups of the transactions with the given ids."""
+    ids = list(ids)
+    keys = set()
+    for start in range(0, len(ids), REFRESH_CHUNK_SIZE * 5):
+        keys |= keys_where(BankTransaction.id.in_(ids[start:start + REFRESH_CHUNK_SIZE * 5]), session)
+    return keys
+
+
+@contextmanager
+def tracking_ids(ids: Sequence[int]) -> Iterator[None]:
+    """Refresh the groups of some transactions before and after a bulk statement changes them."""
+    ids = list(ids)
+    before = keys_for_ids(ids)
+    yield
+    refresh_groups(before | keys_for_ids(ids))
+
+
+@contextmanager
+def tracking_recategorization(clause: ColumnElement, category_id: Optional[int]) -> Iterator[None]:
+    """
+    Refresh the groups affected by a bulk UPDATE that sets the category of the
+    transactions matching a clause.
+    """
+    before = keys_where(clause)
+    yield
+    refresh_groups(before | {key[:2] + (category_id or 0,) + key[3:] for key in before})
+
+
+def rebuild() -> int:
+    """
+    Recompute the whole rollup table from bank_transaction.
+    The caller is responsible for committing.
+
+    Returns:
+        Number of groups written
+    """
+    connection = _connection()
+    key_expressions = _key_expressions()
+    rows = connection.execute(select(*key_expressions, *_aggregate_columns()).group_by(*key_expressions)).all()
+    connection.execute(delete(rollup_table))
+    if rows:
+        connection.execute(insert(rollup_table), [
+            {
+                "user_id": row[0], "bank_account_id": row[1], "category_id": row[2], "year_month": row[3],
+                "total_cents": row[4], "transaction_count": row[5], "min_cents": row[6], "max_cents": row[7],
+            }
+            for row in rows
+        ])
+    logger.info(f"Rebuilt transaction rollup with {len(rows)} groups")
+    return len(rows)
+
+
+def _previous_key(transaction: BankTransaction) -> RollupKey:
+    """The group a loaded transaction belonged to before its pending changes."""
+    state = inspect(transaction)
+    values = {}
+    for name in ("user_id", "bank_account_id", "category_id", "booking_date"):
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        else:
+            values[name] = getattr(transaction, name)
+    return rollup_key(values["user_id"], values["bank_account_id"], values["category_id"], values["booking_date"])
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_rollup_changes(session, flush_context, instances):
+    added = session.info.setdefault("rollup_added", [])
+    refresh = session.info.setdefault("rollup_refresh", set())
+    deleted_users = session.info.setdefault("rollup_deleted_users", set())
+
+    for obj in session.new:
+        if isinstance(obj, BankTransaction):
+            added.append(obj)
+    for obj in session.dirty:
+        if not isinstance(obj, BankTransaction):
+            continue
+        state = inspect(obj)
+        if state.persistent and any(state.attrs[name].history.has_changes() for name in TRACKED_ATTRIBUTES):
+            refresh.add(_previous_key(obj))
+            refresh.add(rollup_key(obj.user_id, obj.bank_account_id, obj.category_id, obj.booking_date))
+    for obj in session.deleted:
+        if isinstance(obj, BankTransaction):
+            refresh.add(_previous_key(obj))
+        elif isinstance(obj, User):
+            # The flush sets user_id to NULL on the user's transactions
+            deleted_users.add(obj.id)
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_rollup_changes(session, flush_context):
+    added = session.info.pop("rollup_added", [])
+    refresh = session.info.pop("rollup_refresh", set())
+    deleted_users = session.info.pop("rollup_deleted_users", set())
+    if not (added or refresh or deleted_users):
+        return
+
+    connection = _connection(session)
+    for user_id in deleted_users:
+        for key in connection.execute(select(*KEY_COLUMNS).where(rollup_table.c.user_id == user_id)):
+            refresh.add(tuple(key))
+            refresh.add((0,) + tuple(key)[1:])
+
+    # Groups being recomputed already include the new transactions
+    new_rows = []
+    for transaction in added:
+        key = rollup_key(transaction.user_id, transaction.bank_account_id, transaction.category_id, transaction.booking_date)
+        if key not in refresh:
+            new_rows.append(transaction)
+    add_rows(new_rows, session)
+    if refresh:
+        refresh_groups(refresh, session)
+
+
+# --- Queries -------------------------------------------------------------------------------------
+
+
+def merge_values(current: List[Any], values: Sequence[Any]) -> None:
+    """Merge [sum, count, min, max] values into an accumulator of the same shape."""
+    total, count, minimum, maximum = values
+    current[0] += total or 0
+    current[1] += count
+    if minimum is not None:
+        current[2] = minimum if current[2] is None else min(current[2], minimum)
+    if maximum is not None:
+        current[3] = maximum if current[3] is None else max(current[3], maximum)
+
+
+def _int(value: Any) -> Optional[int]:
+    # MySQL returns SUM() of integers as Decimal
+    return None if value is None else int(value)
+
+
+def _merge(target: Dict[Any, List[Any]], key: Any, total: Any, count: int, minimum: Any, maximum: Any) -> None:
+    merge_values(target.setdefault(key, [0, 0, None, None]), (_int(total), count, _int(minimum), _int(maximum)))
+
+
+def _split_range(start: Optional[date], end: Optional[date]) -> Tuple[Optional[Tuple[int, int]], List[Tuple[date, date]]]:
+    """
+    Split a booking date range into whole months and partially covered days.
+
+    Returns:
+        (year_month bounds of the whole months or None, list of (first, last) date ranges)
+    """
+    first_full = year_month(start) if start is None or start.day == 1 else year_month(_month_range(year_month(start))[1])
+    last_full = (
+        year_month(end) if end is None or (end + timedelta(days=1)).day == 1
+        else year_month(_month_range(year_month(end))[0] - timedelta(days=1))
+    )
+    if start is not None and end is not None and first_full > last_full:
+        return None, [(start, end)] if start <= end else []
+
+    partial = []
+    if start is not None and start.day != 1:
+        partial.append((start, _month_range(year_month(start))[1] - timedelta(days=1)))
+    if end is not None and (end + timedelta(days=1)).day != 1:
+        partial.append((_month_range(year_month(end))[0], end))
+    return (first_full, last_full), partial
+
+
+def aggregate(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    group_by: Sequence[str] = (),
+) -> Dict[Tuple[int, ...], List[Any]]:
+    """
+    Aggregate transaction amounts over a booking date range.
+
+    Args:
+        start_date: Earliest booking date (inclusive), or None
+        end_date: Latest booking date (inclusive), or None
+        group_by: Rollup key columns to group by, e.g. ("category_id", "year_month")
+
+    Returns:
+        Group values (0 for NULL) -> [sum, count, min, max], amounts in cents. With a date range,
+        transactions without booking date are excluded, like a booking_date
+        comparison would exclude them.
+    """
+    result: Dict[Tuple[int, ...], List[Any]] = {}
+    group_columns = [rollup_table.c[name] for name in group_by]
+    full, partial = _split_range(start_date, end_date)
+
+    if full is not None:
+        first_full, last_full = full
+        statement = select(
+            *group_columns,
+            func.sum(rollup_table.c.total_cents),
+            func.sum(rollup_table.c.transaction_count),
+            func.min(rollup_table.c.min_cents),
+            func.max(rollup_table.c.max_cents),
+        ).group_by(*group_columns)
+        if start_date is not None or end_date is not None:
+            statement = statement.where(rollup_table.c.year_month != 0)
+        if first_full:
+            statement = statement.where(rollup_table.c.year_month >= first_full)
+        if last_full:
+            statement = statement.where(rollup_table.c.year_month <= last_full)
+        for row in db.session.execute(statement):
+            _merge(result, tuple(row[:len(group_by)]), row[-4], int(row[-3] or 0), row[-2], row[-1])
+
+    if partial:
+        expressions = dict(zip(("user_id", "bank_account_id", "category_id", "year_month"), _key_expressions()))
+        group_expressions = [expressions[name] for name in group_by]
+        statement = (
+            select(*group_expressions, *_aggregate_columns())
+            .where(or_(*(BankTransaction.booking_date.between(first, last) for first, last in partial)))
+            .group_by(*group_expressions)
+        )
+        for row in db.session.execute(statement):
+            _merge(result, tuple(row[:len(group_by)]), row[-4], row[-3], row[-2], row[-1])
+    return result
@@ -1,7 +1,10 @@
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, List, Tuple, Optional, Union, Sequence
 import logging
+from app.models.money import from_cents
 from app.models.rule import Rule, RuleCondition
 from app.models.transaction import BankTransaction
+from app.utils import metrics
+from app.utils.string_matching import AhoCorasick, PrefixTrie
 
 # Set up logger
 logger = logging.getLogger('money_backend.rule_engine')
@@ -89,4 +92,301 @@ class RuleEngine:
                 logger.info(f"Transaction {transaction.id} matched rule {rule.id}, setting category to {rule.category_id}")
                 return True, rule.category_id, rule.id
         logger.debug(f"No rules matched for transaction {transaction.id}")
-        return False, None, None
\ No newline at end of file
+        return False, None, None
+
+
+def _op_equals(field_value: str, value: str) -> bool:
+    return field_value == value
+
+
+def _op_contains(field_value: str, value: str) -> bool:
+    return value in field_value
+
+
+def _op_starts_with(field_value: str, value: str) -> bool:
+    return field_value.startswith(value)
+
+
+def _op_ends_with(field_value: str, value: str) -> bool:
+    return field_value.endswith(value)
+
+
+def _op_unknown(field_value: str, value: str) -> bool:
+    return False
+
+
+# Rule fields that are not stored columns: field -> (stored column, conversion).
+# Rules on "amount" compare the euro amount, like BankTransaction.amount
+DERIVED_FIELDS = {
+    "amount": ("amount_cents", from_cents),
+}
+
+
+def field_value(transaction: Union[BankTransaction, Dict[str, Any]], field: str) -> Any:
+    """
+    The raw value of a rule field of a transaction, deriving fields that are not
+    stored (see DERIVED_FIELDS) from their column when a data dictionary or
+    selected row lacks them.
+    """
+    if not isinstance(transaction, dict):
+        return getattr(transaction, field, None)
+    if field in transaction or field not in DERIVED_FIELDS:
+        return transaction.get(field)
+    source, convert = DERIVED_FIELDS[field]
+    return convert(transaction.get(source))
+
+
+def source_columns(fields) -> List[str]:
+    """Names of the bank_transaction columns needed to evaluate rules on the given fields."""
+    table_columns = BankTransaction.__table__.columns
+    names = set()
+    for field in fields:
+        if field in DERIVED_FIELDS:
+            names.add(DERIVED_FIELDS[field][0])
+        elif field in table_columns:
+            names.add(field)
+    return sorted(names)
+
+
+# Operator name -> comparison on lowercased values (module level so rule sets can be pickled)
+CONDITION_OPERATORS = {
+    "equals": _op_equals,
+    "contains": _op_contains,
+    "starts_with": _op_starts_with,
+    "ends_with": _op_ends_with,
+}
+_OPERATOR_NAMES = {op: name for name, op in CONDITION_OPERATORS.items()}
+
+
+class CompiledRule:
+    """
+    A rule reduced to plain data: the rule's ids, its logical operator and a
+    tuple of (field, operator function, lowercased value) conditions.
+    """
+    __slots__ = ("rule_id", "category_id", "match_any", "conditions")
+
+    def __init__(self, rule: Rule):
+        self.rule_id = rule.id
+        self.category_id = rule.category_id
+        logical_operator = getattr(rule, 'logical_operator', 'AND')
+        if logical_operator not in ('AND', 'OR'):
+            logger.warning(f"Unknown logical operator '{logical_operator}' for rule {rule.id}, defaulting to AND")
+        self.match_any = logical_operator == 'OR'
+        self.conditions = tuple(
+            (
+                condition.field,
+                CONDITION_OPERATORS.get(condition.operator, _op_unknown),
+                str(condition.value).lower(),
+            )
+            for condition in rule.conditions
+        )
+
+    def matches(self, field_values: Dict[str, Optional[str]]) -> bool:
+        """Evaluate the rule against a mapping of field name to lowercased value."""
+        if self.match_any:
+            for field, op, value in self.conditions:
+                field_value = field_values[field]
+                if field_value is not None and op(field_value, value):
+                    return True
+            return False
+        for field, op, value in self.conditions:
+            field_value = field_values[field]
+            if field_value is None or not op(field_value, value):
+                return False
+        return True
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+
+class _FieldIndex:
+    """
+    Condition index for a single transaction field: a hash map for equals, an
+    Aho-Corasick automaton for contains and tries for starts_with/ends_with.
+    Searching a value yields the ids of every condition it satisfies.
+    """
+
+    def __init__(self, conditions: List[Tuple[int, str, str]]):
+        """
+        Args:
+            conditions: (condition id, operator name, lowercased value) tuples
+        """
+        by_operator = {name: {} for name in CONDITION_OPERATORS}
+        self.always = []
+        for condition_id, operator, value in conditions:
+            if value == "" and operator != "equals":
+                # An empty contains/starts_with/ends_with value matches any value
+                self.always.append(condition_id)
+            else:
+                by_operator[operator].setdefault(value, []).append(condition_id)
+
+        self.equals = by_operator["equals"]
+        self.contains, self.contains_ids = self._build(AhoCorasick, by_operator["contains"])
+        self.prefixes, self.prefix_ids = self._build(PrefixTrie, by_operator["starts_with"])
+        self.suffixes, self.suffix_ids = self._build(
+            PrefixTrie, {value[::-1]: ids for value, ids in by_operator["ends_with"].items()}
+        )
+
+    @staticmethod
+    def _build(matcher_class, condition_ids_by_value: Dict[str, List[int]]):
+        if not condition_ids_by_value:
+            return None, []
+        matcher = matcher_class(condition_ids_by_value)
+        return matcher, [condition_ids_by_value[pattern] for pattern in matcher.patterns]
+
+    def search(self, value: str) -> List[int]:
+        """Return the ids of all conditions satisfied by a lowercased field value."""
+        matched = list(self.always)
+        matched.extend(self.equals.get(value, ()))
+        if self.contains is not None:
+            for pattern in self.contains.search(value):
+                matched.extend(self.contains_ids[pattern])
+        if self.prefixes is not None:
+            for pattern in self.prefixes.search(value):
+                matched.extend(self.prefix_ids[pattern])
+        if self.suffixes is not None:
+            for pattern in self.suffixes.search(value[::-1]):
+                matched.extend(self.suffix_ids[pattern])
+        return matched
+
+
+class CompiledRuleSet:
+    """
+    An ordered set of rules compiled once from Rule/RuleCondition rows.
+    Condition values are lowercased and operators bound at compile time, and each
+    transaction field is lowercased once per transaction instead of once per condition.
+
+    Conditions are indexed per field, so a transaction is matched by scanning each
+    field once and counting satisfied conditions per rule; only rules whose
+    conditions are all (AND) or partly (OR) satisfied can match. The lowest rule
+    position wins, which keeps the first-match semantics of RuleEngine.apply_rules.
+    """
+
+    def __init__(self, rules: List[Rule]):
+        """
+        Compile a list of rules.
+
+        Args:
+            rules: Rules in priority order, each with its conditions loaded
+        """
+        self.rules = []
+        for rule in rules:
+            if not rule.conditions:
+                logger.debug(f"Rule {rule.id} has no conditions, skipping")
+                continue
+            self.rules.append(CompiledRule(rule))
+        self.fields = tuple(sorted({field for rule in self.rules for field, _, _ in rule.conditions}))
+        self._derived = any(field in DERIVED_FIELDS for field in self.fields)
+
+        # Condition id -> position of its rule, and hits each rule needs to match
+        self._condition_rule = []
+        self._required = []
+        conditions_by_field = {field: [] for field in self.fields}
+        for position, rule in enumerate(self.rules):
+            self._required.append(1 if rule.match_any else len(rule.conditions))
+            for field, op, value in rule.conditions:
+                condition_id = len(self._condition_rule)
+                self._condition_rule.append(position)
+                operator = _OPERATOR_NAMES.get(op)
+                if operator is not None:
+                    # Unknown operators never match, so they are simply not indexed
+                    conditions_by_field[field].append((condition_id, operator, value))
+        self._indexes = {field: _FieldIndex(conditions) for field, conditions in conditions_by_field.items()}
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def field_values(self, transaction: Union[BankTransaction, Dict[str, Any]]) -> Dict[str, Optional[str]]:
+        """Lowercase every field referenced by a condition, once."""
+        if isinstance(transaction, dict) and not self._derived:
+            raw_values = ((field, transaction.get(field)) for field in self.fields)
+        elif isinstance(transaction, dict):
+            raw_values = ((field, field_value(transaction, field)) for field in self.fields)
+        else:
+            raw_values = ((field, getattr(transaction, field, None)) for field in self.fields)
+        return {
+            field: str(value).lower() if value is not None else None
+            for field, value in raw_values
+        }
+
+    def apply(self, transaction: Union[BankTransaction, Dict[str, Any]]) -> Tuple[bool, Optional[int], Optional[int]]:
+        """
+        Find the first rule matching a transaction.
+
+        Args:
+            transaction: A BankTransaction or a dictionary of transaction data
+
+        Returns:
+            A tuple of (matched, category_id, rule_id), as RuleEngine.apply_rules
+        """
+        condition_rule = self._condition_rule
+        hits = {}
+        for field, value in self.field_values(transaction).items():
+            if value is None:
+                continue
+            for condition_id in self._indexes[field].search(value):
+                position = condition_rule[condition_id]
+                hits[position] = hits.get(position, 0) + 1
+
+        return self._first_match(hits)
+
+    def apply_columns(self, columns: Dict[str, Sequence[Any]]) -> List[Tuple[bool, Optional[int], Optional[int]]]:
+        """
+        Find the first matching rule for every row of a column-oriented batch.
+        Each distinct value of a field is lowercased and searched only once.
+
+        Args:
+            columns: Raw values per field (None for missing values), all of the same length
+
+        Returns:
+            One (matched, category_id, rule_id) tuple per row, as apply()
+        """
+        condition_rule = self._condition_rule
+        size = len(next(iter(columns.values()))) if columns else 0
+        positions_per_field = []
+        lookups = misses = 0
+        for field in self.fields:
+            index = self._indexes[field]
+            cache = {}
+            positions = []
+            for value in columns.get(field, [None] * size):
+                if value is None:
+                    positions.append(())
+                    continue
+                lookups += 1
+                # Keyed by text, equal values of different types (1, 1.0, True) format differently
+                text = value if type(value) is str else str(value)
+                found = cache.get(text)
+                if found is None:
+                    found = tuple(condition_rule[condition_id] for condition_id in index.search(text.lower()))
+                    cache[text] = found
+                positions.append(found)
+            positions_per_field.append(positions)
+            misses += len(cache)
+        metrics.record_cache("rule_values", lookups, misses)
+
+        results = []
+        for row_positions in zip(*positions_per_field) if self.fields else [()] * size:
+            hits = {}
+            for positions in row_positions:
+                for position in positions:
+                    hits[position] = hits.get(position, 0) + 1
+            results.append(self._first_match(hits))
+        return results
+
+    def _first_match(self, hits: Dict[int, int]) -> Tuple[bool, Optional[int], Optional[int]]:
+        """Pick the lowest rule position whose required number of conditions was hit."""
+        required = self._required
+        best = None
+        for position, count in hits.items():
+            if count >= required[position] and (best is None or position < best):
+                best = position
+
+        if best is None:
+            return False, None, None
+        rule = self.rules[best]
+        return True, rule.category_id, rule.rule_id
@@ -0,0 +1,194 @@
+"""
+Rule SQL Translation
+
+This module translates categorization rules into SQLAlchemy WHERE clauses so a
+rule can be applied to the whole transaction history with a single UPDATE
+statement instead of loading every transaction into Python.
+"""
+import logging
+from typing import List, Optional
+
+from sqlalchemy import String, Text, and_, false, func, or_, select, update
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models.db import db
+from app.models.rule import Rule, RuleCondition
+from app.models.transaction import BankTransaction
+from app.utils import rollup
+from app.utils.rule_engine import CompiledRule, field_value, source_columns
+
+# Set up logger
+logger = logging.getLogger("money_backend.rule_sql")
+
+# Rows per chunk when a rule has to be evaluated in Python
+FALLBACK_CHUNK_SIZE = 1000
+
+
+class UnsupportedRuleError(Exception):
+    """Raised when a rule cannot be expressed in SQL with the same semantics as the rule engine."""
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def condition_to_sql(condition: RuleCondition, dialect: Optional[str] = None) -> ColumnElement:
+    """
+    Translate a single rule condition into a case-insensitive SQL expression.
+    NULL columns never match, like a None field in RuleEngine.evaluate_condition.
+
+    Args:
+        condition: The condition to translate
+        dialect: Name of the database dialect the clause will run on
+
+    Returns:
+        A boolean SQL expression
+
+    Raises:
+        UnsupportedRuleError: If the condition targets a non-string column, or if the
+                              database cannot lowercase the value like Python does
+    """
+    if not hasattr(BankTransaction, condition.field):
+        # Unknown attributes are always None for the rule engine
+        return false()
+
+    column = BankTransaction.__table__.columns.get(condition.field)
+    if column is None or not isinstance(column.type, (String, Text)):
+        # str() of numbers and dates differs between Python and SQL
+        raise UnsupportedRuleError(f"Field '{condition.field}' is not a string column")
+
+    value = str(condition.value).lower()
+    if dialect == "sqlite" and not value.isascii():
+        # SQLite's lower() only folds ASCII characters
+        raise UnsupportedRuleError(f"Value '{condition.value}' cannot be lowercased by SQLite")
+
+    lowered = func.lower(column)
+    if dialect == "mysql":
+        # Compare exactly after lowercasing, default collations also ignore accents
+        lowered = lowered.collate("utf8mb4_bin")
+
+    if condition.operator == "equals":
+        return lowered == value
+    if condition.operator == "contains":
+        return lowered.like(f"%{_escape_like(value)}%", escape="\\")
+    if condition.operator == "starts_with":
+        return lowered.like(f"{_escape_like(value)}%", escape="\\")
+    if condition.operator == "ends_with":
+        return lowered.like(f"%{_escape_like(value)}", escape="\\")
+    return false()
+
+
+def rule_to_sql(rule: Rule, dialect: Optional[str] = None) -> ColumnElement:
+    """
+    Translate a rule with its conditions into a WHERE clause on bank_transaction.
+
+    Args:
+        rule: The rule to translate
+        dialect: Name of the database dialect the clause will run on
+
+    Returns:
+        A boolean SQL expression matching the same transactions as RuleEngine.evaluate_rule
+
+    Raises:
+        UnsupportedRuleError: If one of the conditions cannot be translated
+    """
+    if not rule.conditions:
+        return false()
+
+    clauses = [condition_to_sql(condition, dialect) for condition in rule.conditions]
+    if getattr(rule, "logical_operator", "AND") == "OR":
+        return or_(*clauses)
+    return and_(*clauses)
+
+
+def find_matching_transaction_ids(rule: Rule) -> List[int]:
+    """
+    Find the ids of all transactions a rule matches.
+    Uses the rule's WHERE clause, or compiled Python matching for rules that
+    cannot be translated.
+
+    Args:
+        rule: The rule to evaluate
+
+    Returns:
+        Ids of the matching transactions
+    """
+    dialect = db.session.get_bind().dialect.name
+    try:
+        clause = rule_to_sql(rule, dialect)
+    except UnsupportedRuleError as e:
+        logger.info(f"Rule {rule.id} evaluated in Python: {str(e)}")
+        return _match_rule_in_python(rule)
+    return list(db.session.scalars(select(BankTransaction.id).where(clause)))
+
+
+def apply_rule_to_transactions(rule: Rule) -> int:
+    """
+    Assign the rule's category to every transaction the rule matches.
+    Runs as a single UPDATE ... WHERE statement; rules that cannot be translated
+    are evaluated in Python over the rule's fields only, in chunks. The
+    transaction rollup groups of the matched transactions are recomputed.
+    The caller is responsible for committing.
+
+    Args:
+        rule: The rule to apply
+
+    Returns:
+        Number of transactions updated
+    """
+    dialect = db.session.get_bind().dialect.name
+    try:
+        clause = rule_to_sql(rule, dialect)
+    except UnsupportedRuleError as e:
+        logger.info(f"Rule {rule.id} evaluated in Python: {str(e)}")
+        matched_ids = _match_rule_in_python(rule)
+        with rollup.tracking_ids(matched_ids):
+            for start in range(0, len(matched_ids), FALLBACK_CHUNK_SIZE):
+                db.session.execute(
+                    update(BankTransaction)
+                    .where(BankTransaction.id.in_(matched_ids[start:start + FALLBACK_CHUNK_SIZE]))
+                    .values(category_id=rule.category_id, rule_id=rule.id)
+                    .execution_options(synchronize_session=False)
+                )
+        return len(matched_ids)
+
+    with rollup.tracking_recategorization(clause, rule.category_id):
+        result = db.session.execute(
+            update(BankTransaction)
+            .where(clause)
+            .values(category_id=rule.category_id, rule_id=rule.id)
+            .execution_options(synchronize_session=False)
+        )
+    return result.rowcount
+
+
+def _match_rule_in_python(rule: Rule) -> List[int]:
+    """Fallback matching for rules that have no SQL equivalent."""
+    if not rule.conditions:
+        return []
+
+    compiled = CompiledRule(rule)
+    table_columns = BankTransaction.__table__.columns
+    columns = [table_columns[name] for name in source_columns({field for field, _, _ in compiled.conditions})]
+
+    matched_ids = []
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(BankTransaction.id, *columns)
+            .where(BankTransaction.id > last_id)
+            .order_by(BankTransaction.id)
+            .limit(FALLBACK_CHUNK_SIZE)
+        ).mappings().all()
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        for row in rows:
+            values = dict(row)
+            field_values = {}
+            for field, _, _ in compiled.conditions:
+                value = field_value(values, field)
+                field_values[field] = str(value).lower() if value is not None else None
+            if compiled.matches(field_values):
+                matched_ids.append(row["id"])
+    return matched_ids
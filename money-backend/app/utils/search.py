@@ -0,0 +1,197 @@
+"""
+Transaction Search
+
+This module implements the free-text search over payee, payer and purpose used
+by the transaction search endpoints, with one backend per database:
+
+- MySQL: a FULLTEXT index, queried with MATCH ... AGAINST in boolean mode
+- SQLite: an external-content FTS5 table (bank_transaction_fts)
+- Anything else, or when the index is missing: ILIKE '%term%' on each column
+
+Both indexes are maintained by the database itself, InnoDB for the FULLTEXT
+index and triggers on bank_transaction for the FTS5 table, so every write path
+(ORM, bulk imports, rule UPDATEs) keeps them in sync.
+
+Every word of the term has to match, in any of the columns. MySQL matches
+words by prefix ("rew" finds "REWE Markt"); the FTS5 table uses the trigram
+tokenizer (SQLite 3.34+), which matches substrings like LIKE does ("essen"
+finds "Abendessen"). Terms containing a word shorter than
+SEARCH_MIN_TOKEN_LENGTH, or no word characters at all, are searched with LIKE
+like before, since such words cannot be looked up in the index.
+"""
+import logging
+import re
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy import DDL, column, event, literal_column, or_, table, text
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Query
+
+from app.config import config
+from app.models.db import db
+from app.models.transaction import BankTransaction
+
+# Set up logger
+logger = logging.getLogger("money_backend.search")
+
+SEARCH_COLUMNS = ("payee", "payer", "purpose")
+
+FTS_TABLE = "bank_transaction_fts"
+FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"payee, payer, purpose, content='bank_transaction', content_rowid='id', tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON bank_transaction BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, payee, payer, purpose) VALUES (new.id, new.payee, new.payer, new.purpose);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON bank_transaction BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, payee, payer, purpose) VALUES ('delete', old.id, old.payee, old.payer, old.purpose);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF payee, payer, purpose ON bank_transaction BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, payee, payer, purpose) VALUES ('delete', old.id, old.payee, old.payer, old.purpose);
+        INSERT INTO {FTS_TABLE}(rowid, payee, payer, purpose) VALUES (new.id, new.payee, new.payer, new.purpose);
+    END""",
+]
+
+fts_table = table(FTS_TABLE, column("rowid"), column("rank"))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchBackend:
+    """LIKE search, the fallback of every backend."""
+
+    name = "like"
+
+    def __init__(self, min_token_length: int = 3):
+        self.min_token_length = min_token_length
+
+    def tokens(self, term: str) -> Optional[List[str]]:
+        """The words of a term, or None if the term has to be searched with LIKE."""
+        words = _WORD.findall(term)
+        if not words or any(len(word) < self.min_token_length for word in words):
+            return None
+        return words
+
+    def like(self, query: Query, term: str) -> Query:
+        pattern = f"%{term}%"
+        return query.filter(or_(*(getattr(BankTransaction, name).ilike(pattern) for name in SEARCH_COLUMNS)))
+
+    def apply(self, query: Query, term: str, ranked: bool = False) -> Query:
+        """
+        Restrict a BankTransaction query to the transactions matching a term.
+
+        Args:
+            query: The query to filter
+            term: The search term as entered
+            ranked: Order the results by relevance, best match first (ignored by LIKE)
+        """
+        return self.like(query, term)
+
+    def rebuild(self) -> None:
+        """Rebuild the search index from bank_transaction, where the backend has one."""
+
+
+class MySQLFulltextBackend(SearchBackend):
+    """MATCH ... AGAINST on the ft_bank_transaction_search FULLTEXT index."""
+
+    name = "mysql_fulltext"
+
+    def _match(self, words: List[str]):
+        # Every word required, matched by prefix
+        against = " ".join(f"+{word}*" for word in words)
+        return match(*(getattr(BankTransaction, name) for name in SEARCH_COLUMNS), against=against).in_boolean_mode()
+
+    def apply(self, query: Query, term: str, ranked: bool = False) -> Query:
+        words = self.tokens(term)
+        if words is None:
+            return self.like(query, term)
+        expression = self._match(words)
+        query = query.filter(expression)
+        if ranked:
+            query = query.order_by(expression.desc())
+        return query
+
+    def rebuild(self) -> None:
+        db.session.execute(text("OPTIMIZE TABLE bank_transaction"))
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """MATCH on the trigram-tokenized bank_transaction_fts table, ranked with bm25."""
+
+    name = "sqlite_fts5"
+
+    def apply(self, query: Query, term: str, ranked: bool = False) -> Query:
+        words = self.tokens(term)
+        if words is None:
+            return self.like(query, term)
+        # Quoted strings, so words cannot act as FTS5 operators
+        expression = " ".join(f'"{word}"' for word in words)
+        query = (
+            query.join(fts_table, fts_table.c.rowid == BankTransaction.id)
+            .filter(literal_column(FTS_TABLE).op("MATCH")(expression))
+        )
+        if ranked:
+            query = query.order_by(fts_table.c.rank)
+        return query
+
+    def rebuild(self) -> None:
+        db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def _create_fts_table(target, connection, **kw):
+    """Create the FTS5 table and its triggers along with bank_transaction on SQLite."""
+    if connection.dialect.name != "sqlite":
+        return
+    try:
+        for statement in FTS_DDL:
+            connection.execute(DDL(statement))
+    except DBAPIError as e:
+        logger.warning(f"SQLite full-text search unavailable, searching with LIKE: {str(e)}")
+
+
+event.listen(BankTransaction.__table__, "after_create", _create_fts_table)
+
+_backends: Dict[int, SearchBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def _detect_backend(connection) -> SearchBackend:
+    min_token_length = config.SEARCH_MIN_TOKEN_LENGTH
+    dialect = connection.dialect.name
+    if config.SEARCH_BACKEND == "like":
+        return SearchBackend(min_token_length)
+    if dialect == "mysql":
+        found = connection.execute(text(
+            "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() "
+            "AND table_name = 'bank_transaction' AND index_type = 'FULLTEXT' LIMIT 1"
+        )).first()
+        if found:
+            return MySQLFulltextBackend(min_token_length)
+    elif dialect == "sqlite":
+        found = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+        ).first()
+        if found:
+            return SQLiteFTS5Backend(min_token_length)
+    logger.warning(f"No full-text index found for {dialect}, searching with LIKE")
+    return SearchBackend(min_token_length)
+
+
+def get_search_backend() -> SearchBackend:
+    """The search backend of the current database, detected once per engine."""
+    engine = db.engine
+    backend = _backends.get(id(engine))
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(id(engine))
+            if backend is None:
+                backend = _backends[id(engine)] = _detect_backend(db.session.connection())
+                logger.info(f"Using search backend {backend.name}")
+    return backend
+
+
+def apply_search(query: Query, term: str, ranked: bool = False) -> Query:
+    """Restrict a BankTransaction query to the transactions matching a search term."""
+    return get_search_backend().apply(query, term, ranked)
@@ -0,0 +1,312 @@
+"""
+Statement Parsers
+
+This module holds the bank statement parsers of the CSV import. Each parser
+turns the CSV export of one bank into the canonical stream of transaction data
+dictionaries (see iter_dkb_transactions for the keys) that the middleware
+pipeline and TransactionService consume, so every format goes through the same
+single-pass import.
+
+Parsers are registered by name in PARSERS. An upload either names its parser
+or leaves it to detect_parser, which reads the first bytes of the file and
+asks every registered parser whether it recognizes the header lines.
+"""
+import csv
+import io
+import logging
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+from app.config import config
+from app.models.money import parse_amount_cents
+from app.utils.csv_import import DKB_HEADER_LINE, CsvImportError, iter_dkb_transactions, parse_date
+
+# Set up logger
+logger = logging.getLogger("money_backend.statement_parsers")
+
+# Parser name of uploads that leave the format to detection
+AUTO_DETECT = "auto"
+
+
+class StatementParser:
+    """Base class of the statement parsers."""
+
+    # Name an upload selects the parser by, and a human readable label
+    name = ""
+    label = ""
+
+    def detect(self, lines: List[str]) -> bool:
+        """Whether the first lines of a file look like this parser's format."""
+        raise NotImplementedError
+
+    def iter_transactions(self, stream: BinaryIO, user_id: int) -> Iterator[Dict[str, Any]]:
+        """
+        Parse a statement into transaction data dictionaries, one row at a time.
+
+        Raises:
+            CsvImportError: If the file layout or a row is invalid
+            UnicodeDecodeError: If the file is not UTF-8 encoded
+        """
+        raise NotImplementedError
+
+
+PARSERS: Dict[str, StatementParser] = {}
+
+
+def register_parser(parser: StatementParser) -> StatementParser:
+    """Register a parser; detection tries parsers in registration order."""
+    PARSERS[parser.name] = parser
+    return parser
+
+
+def _text(stream: BinaryIO) -> io.TextIOWrapper:
+    # utf-8-sig drops the byte order mark some exports start with
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+def _empty_transaction(user_id: int) -> Dict[str, Any]:
+    return {
+        "booking_date": None,
+        "value_date": None,
+        "status": "",
+        "payer": "",
+        "payee": "",
+        "purpose": "",
+        "transaction_type": "",
+        "iban": "",
+        "counterparty_iban": "",
+        "amount_cents": None,
+        "creditor_id": "",
+        "mandate_reference": "",
+        "customer_reference": "",
+        "user_id": user_id,
+    }
+
+
+def _require_columns(fieldnames: Optional[List[str]], required: List[str]) -> None:
+    missing = [column for column in required if column not in (fieldnames or [])]
+    if missing:
+        raise CsvImportError(f"CSV format error: Missing columns {', '.join(missing)}")
+
+
+class DKBParser(StatementParser):
+    """
+    DKB account export: account IBAN in the first line, column header in line 5,
+    German amounts and "dd.mm.yy" dates.
+    """
+
+    name = "dkb"
+    label = "DKB"
+
+    def detect(self, lines: List[str]) -> bool:
+        if len(lines) <= DKB_HEADER_LINE:
+            return False
+        header = lines[DKB_HEADER_LINE]
+        return "Buchungsdatum" in header and "Betrag (€)" in header
+
+    def iter_transactions(self, stream: BinaryIO, user_id: int) -> Iterator[Dict[str, Any]]:
+        return iter_dkb_transactions(stream, user_id)
+
+
+class TradeRepublicParser(StatementParser):
+    """
+    TradeRepublic export: column header in the first line, ISO dates and amounts
+    with a decimal point. The file carries no IBAN, transactions are booked on
+    TRADEREPUBLIC_IBAN; deposits recognized by TRADEREPUBLIC_DEPOSIT_KEYWORDS get
+    MAIN_IBAN as counterparty, so they are detected as internal transfers.
+    """
+
+    name = "traderepublic"
+    label = "TradeRepublic"
+
+    COLUMNS = ["Buchungsdatum", "Umsatztyp", "Betrag (€)", "Verwendungszweck"]
+    DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+    def detect(self, lines: List[str]) -> bool:
+        return bool(lines) and all(column in lines[0] for column in self.COLUMNS)
+
+    def iter_transactions(self, stream: BinaryIO, user_id: int) -> Iterator[Dict[str, Any]]:
+        reader = csv.DictReader(_text(stream), delimiter=";", restval="")
+        _require_columns(reader.fieldnames, self.COLUMNS)
+        for row_index, row in enumerate(reader, start=1):
+            try:
+                transaction = self._parse_row(row, row_index, user_id)
+            except CsvImportError as e:
+                e.line = reader.line_num
+                raise
+            yield transaction
+
+    @staticmethod
+    def _parse_amount_cents(text: str) -> int:
+        # Only the last point is the decimal separator ("1.234.56")
+        integer, point, fraction = text.rpartition(".")
+        return parse_amount_cents(f"{integer},{fraction}" if point else fraction)
+
+    def _parse_row(self, row: Dict[str, str], row_index: int, user_id: int) -> Dict[str, Any]:
+        amount = (row["Betrag (€)"] or "").strip()
+        try:
+            amount_cents = self._parse_amount_cents(amount)
+        except ValueError:
+            logger.error(f"Failed to parse amount in row {row_index}: {amount}")
+            raise CsvImportError(f"Invalid amount format in row {row_index}: {amount}")
+
+        booking_date = parse_date((row["Buchungsdatum"] or "").strip(), self.DATE_FORMAT)
+        if booking_date is None:
+            logger.warning(f"Could not parse booking date in row {row_index}: {row['Buchungsdatum']}")
+
+        purpose = row["Verwendungszweck"] or ""
+        deposit = config.MAIN_IBAN and any(keyword in purpose for keyword in config.TRADEREPUBLIC_DEPOSIT_KEYWORDS)
+
+        transaction = _empty_transaction(user_id)
+        transaction.update(
+            booking_date=booking_date,
+            value_date=booking_date,
+            # The export's transaction type is kept as status, the type follows the sign
+            status=row["Umsatztyp"] or "",
+            purpose=purpose,
+            transaction_type="Ausgang" if amount.startswith("-") else "Eingang",
+            iban=config.TRADEREPUBLIC_IBAN,
+            counterparty_iban=config.MAIN_IBAN if deposit else "",
+            amount_cents=amount_cents,
+        )
+        return transaction
+
+
+class PayPalParser(StatementParser):
+    """
+    PayPal activity download (German): column header in the first line, comma or
+    semicolon separated, "dd.mm.yyyy" dates and German amounts. The net amount is
+    imported, which includes PayPal's fees. Rows in other currencies than euro,
+    e.g. the two halves of a currency conversion, are skipped.
+    """
+
+    name = "paypal"
+    label = "PayPal"
+
+    COLUMNS = ["Datum", "Name", "Typ", "Status", "Währung", "Netto", "Transaktionscode"]
+    DATE_FORMATS = ("%d.%m.%Y", "%d/%m/%Y")
+    CURRENCY = "EUR"
+
+    def detect(self, lines: List[str]) -> bool:
+        return bool(lines) and "Transaktionscode" in lines[0] and "Netto" in lines[0]
+
+    def iter_transactions(self, stream: BinaryIO, user_id: int) -> Iterator[Dict[str, Any]]:
+        text = _text(stream)
+        first_line = text.readline()
+        delimiter = ";" if first_line.count(";") > first_line.count(",") else ","
+        header = next(csv.reader([first_line], delimiter=delimiter), [])
+        _require_columns(header, self.COLUMNS)
+
+        skipped = 0
+        reader = csv.reader(text, delimiter=delimiter)
+        for row_index, values in enumerate(reader, start=1):
+            if not values:
+                continue
+            row = dict(zip(header, values))
+            if row.get("Währung", "").strip() != self.CURRENCY:
+                skipped += 1
+                continue
+            try:
+                transaction = self._parse_row(row, row_index, user_id)
+            except CsvImportError as e:
+                # The header was read before the reader, which counts lines from there
+                e.line = reader.line_num + 1
+                raise
+            yield transaction
+        if skipped:
+            logger.info(f"Skipped {skipped} PayPal rows in other currencies than {self.CURRENCY}")
+
+    def _parse_date(self, text: str):
+        for date_format in self.DATE_FORMATS:
+            parsed = parse_date(text, date_format)
+            if parsed is not None:
+                return parsed
+        return None
+
+    def _parse_row(self, row: Dict[str, str], row_index: int, user_id: int) -> Dict[str, Any]:
+        amount = row.get("Netto", "").strip()
+        try:
+            amount_cents = parse_amount_cents(amount)
+        except ValueError:
+            logger.error(f"Failed to parse amount in row {row_index}: {amount}")
+            raise CsvImportError(f"Invalid amount format in row {row_index}: {amount}")
+
+        booking_date = self._parse_date(row.get("Datum", "").strip())
+        if booking_date is None:
+            logger.warning(f"Could not parse booking date in row {row_index}: {row.get('Datum')}")
+
+        # Name is the other party: the recipient of payments, the sender of receipts
+        name = row.get("Name", "")
+        purpose = " ".join(
+            text for text in (row.get("Betreff", "").strip(), row.get("Hinweis", "").strip()) if text
+        )
+
+        transaction = _empty_transaction(user_id)
+        transaction.update(
+            booking_date=booking_date,
+            value_date=booking_date,
+            status=row.get("Status", ""),
+            payer="" if amount_cents < 0 else name,
+            payee=name if amount_cents < 0 else "",
+            purpose=purpose,
+            # PayPal's type names can exceed the column length
+            transaction_type=row.get("Typ", "")[:50],
+            iban=config.PAYPAL_ACCOUNT,
+            amount_cents=amount_cents,
+            customer_reference=row.get("Transaktionscode", ""),
+        )
+        return transaction
+
+
+register_parser(DKBParser())
+register_parser(TradeRepublicParser())
+register_parser(PayPalParser())
+
+
+def get_parser(name: str) -> StatementParser:
+    """
+    The registered parser of a name.
+
+    Raises:
+        CsvImportError: If no parser has the name
+    """
+    parser = PARSERS.get(name)
+    if parser is None:
+        raise CsvImportError(
+            f"Unknown statement format: {name}. Available formats: {', '.join([AUTO_DETECT, *PARSERS])}"
+        )
+    return parser
+
+
+def detect_parser(stream: BinaryIO) -> StatementParser:
+    """
+    Detect the format of a statement from its first STATEMENT_SNIFF_BYTES bytes.
+    The stream must be seekable, it is returned to its position.
+
+    Raises:
+        CsvImportError: If no registered parser recognizes the file
+    """
+    start = stream.tell()
+    head = stream.read(config.STATEMENT_SNIFF_BYTES)
+    stream.seek(start)
+
+    # The last line may be cut off, the header lines are what matters
+    lines = head.decode("utf-8-sig", errors="replace").splitlines()
+    for parser in PARSERS.values():
+        if parser.detect(lines):
+            logger.debug(f"Detected statement format: {parser.name}")
+            return parser
+    raise CsvImportError(
+        f"Unrecognized statement format. Select one of: {', '.join(PARSERS)}"
+    )
+
+
+def resolve_parser(stream: BinaryIO, name: Optional[str] = None) -> StatementParser:
+    """
+    The parser an upload selects by name, or the detected one if the name is empty or "auto".
+
+    Raises:
+        CsvImportError: If the name is unknown or the format is not recognized
+    """
+    if not name or name == AUTO_DETECT:
+        return detect_parser(stream)
+    return get_parser(name)
@@ -0,0 +1,143 @@
+"""
+String Matching
+
+Multi-pattern string matchers used by the rule engine. Every matcher is built
+once from a set of patterns and then scans a text in a single pass, so the cost
+of a lookup depends on the length of the text, not on the number of patterns.
+
+Nodes are stored in flat lists rather than nested objects so the structures
+stay cheap to pickle.
+"""
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton reporting every pattern that occurs as a substring of a text.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        """
+        Build the automaton.
+
+        Args:
+            patterns: The patterns to search for. The empty pattern is ignored,
+                      callers handle it as "always matches".
+        """
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+        self._build_failure_links()
+
+    def _add(self, pattern: str) -> None:
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = next_node
+        self._out[node] += (len(self.patterns),)
+        self.patterns.append(pattern)
+
+    def _build_failure_links(self) -> None:
+        # Breadth-first, so the failure target of a node is always finished before the node
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] += self._out[self._fail[child]]
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def search(self, text: str) -> Set[int]:
+        """
+        Scan a text once.
+
+        Args:
+            text: The text to scan
+
+        Returns:
+            Indexes (into self.patterns) of every pattern occurring in the text
+        """
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class PrefixTrie:
+    """
+    Trie reporting every pattern that is a prefix of a text.
+    Build it from reversed patterns and search reversed texts to match suffixes.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._terminal: List[int] = [-1]
+
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+
+    def _add(self, pattern: str) -> None:
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._terminal.append(-1)
+            node = next_node
+        if self._terminal[node] == -1:
+            self._terminal[node] = len(self.patterns)
+            self.patterns.append(pattern)
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def search(self, text: str) -> Set[int]:
+        """
+        Walk the trie along a text.
+
+        Args:
+            text: The text whose prefixes are looked up
+
+        Returns:
+            Indexes (into self.patterns) of every pattern that is a prefix of the text
+        """
+        goto = self._goto
+        terminal = self._terminal
+        found = set()
+        node = 0
+        for char in text:
+            node = goto[node].get(char)
+            if node is None:
+                break
+            if terminal[node] != -1:
+                found.add(terminal[node])
+        return found
@@ -0,0 +1,133 @@
+"""
+Transaction Filter
+
+This module provides a declarative filter for selecting transactions that
+compiles to SQL, plus a helper that streams the selected transactions from the
+database in chunks. Batch jobs use it instead of loading the whole table and
+filtering with Python callables.
+"""
+from datetime import date
+from typing import Any, Iterator, List, Optional, Union
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.models.db import db
+from app.models.money import to_cents
+from app.models.transaction import BankTransaction
+
+# Special values for the category criterion
+CATEGORY_NULL = "null"
+CATEGORY_NOT_NULL = "not_null"
+
+
+class TransactionFilter:
+    """
+    Criteria for selecting transactions, combined with AND.
+    Criteria left as None are not applied.
+    """
+
+    def __init__(
+        self,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        category: Union[int, str, None] = None,
+        user_id: Optional[int] = None,
+        bank_account_id: Optional[int] = None,
+    ):
+        """
+        Args:
+            start_date: Earliest booking date (inclusive)
+            end_date: Latest booking date (inclusive)
+            min_amount: Smallest amount (inclusive)
+            max_amount: Largest amount (inclusive)
+            category: A category id, "null" for uncategorized or "not_null" for categorized
+            user_id: Only transactions of this user
+            bank_account_id: Only transactions of this bank account
+        """
+        if isinstance(category, str) and category not in (CATEGORY_NULL, CATEGORY_NOT_NULL):
+            category = int(category)
+
+        self.start_date = start_date
+        self.end_date = end_date
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.category = category
+        self.user_id = user_id
+        self.bank_account_id = bank_account_id
+
+    @classmethod
+    def uncategorized(cls, **kwargs: Any) -> "TransactionFilter":
+        """Filter for transactions without a category."""
+        return cls(category=CATEGORY_NULL, **kwargs)
+
+    def clauses(self) -> List[ColumnElement]:
+        """The WHERE clauses of this filter."""
+        clauses = []
+        if self.start_date is not None:
+            clauses.append(BankTransaction.booking_date >= self.start_date)
+        if self.end_date is not None:
+            clauses.append(BankTransaction.booking_date <= self.end_date)
+        if self.min_amount is not None:
+            clauses.append(BankTransaction.amount_cents >= to_cents(self.min_amount))
+        if self.max_amount is not None:
+            clauses.append(BankTransaction.amount_cents <= to_cents(self.max_amount))
+        if self.category == CATEGORY_NULL:
+            clauses.append(BankTransaction.category_id.is_(None))
+        elif self.category == CATEGORY_NOT_NULL:
+            clauses.append(BankTransaction.category_id.is_not(None))
+        elif self.category is not None:
+            clauses.append(BankTransaction.category_id == self.category)
+        if self.user_id is not None:
+            clauses.append(BankTransaction.user_id == self.user_id)
+        if self.bank_account_id is not None:
+            clauses.append(BankTransaction.bank_account_id == self.bank_account_id)
+        return clauses
+
+    def apply(self, statement: Select) -> Select:
+        """Add the filter's WHERE clauses to a select statement."""
+        clauses = self.clauses()
+        return statement.where(*clauses) if clauses else statement
+
+    def count(self) -> int:
+        """Number of transactions matching the filter."""
+        return db.session.scalar(self.apply(select(func.count(BankTransaction.id))))
+
+    def __repr__(self) -> str:
+        criteria = ", ".join(f"{key}={value!r}" for key, value in vars(self).items() if value is not None)
+        return f"<TransactionFilter {criteria}>"
+
+
+def iter_transaction_chunks(
+    transaction_filter: Optional[TransactionFilter] = None,
+    chunk_size: int = 1000,
+) -> Iterator[List[BankTransaction]]:
+    """
+    Stream the transactions matching a filter in chunks ordered by id.
+
+    Chunks are fetched with keyset pagination (id > last id of the previous chunk),
+    so the caller may modify and commit each chunk before asking for the next one,
+    even when the modification makes rows stop matching the filter.
+
+    Args:
+        transaction_filter: Which transactions to select; all transactions if None
+        chunk_size: Maximum number of transactions per chunk
+
+    Yields:
+        Lists of BankTransaction objects
+    """
+    statement = select(BankTransaction).order_by(BankTransaction.id).limit(chunk_size)
+    if transaction_filter is not None:
+        statement = transaction_filter.apply(statement)
+
+    last_id = 0
+    while True:
+        chunk = list(db.session.scalars(statement.where(BankTransaction.id > last_id)))
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+        yield chunk
+        if len(chunk) < chunk_size:
+            break
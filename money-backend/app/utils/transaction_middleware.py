@@ -6,9 +6,15 @@ Middlewares can be applied both during transaction import and to existing
 transactions in the database.
 """
 from abc import ABC, abstractmethod
-from typing import List, Union, Dict, Any, Optional, Callable, TypeVar, Generic
+from contextlib import contextmanager
+from typing import List, Union, Dict, Any, Optional, Callable, Iterator, TypeVar, Generic, TYPE_CHECKING
+import threading
+import time
 from app.models.transaction import BankTransaction
 
+if TYPE_CHECKING:
+    from app.utils.columnar import TransactionColumns
+
 # Type for processed transaction data before it becomes a BankTransaction
 TransactionData = Dict[str, Any]
 T = TypeVar('T', BankTransaction, TransactionData)
@@ -18,8 +24,23 @@ class TransactionMiddleware(Generic[T], ABC):
     Abstract base class for transaction middleware components.
     Each middleware can process either a BankTransaction object (for existing transactions)
     or a dictionary of transaction data (during import).
+    
+    Middlewares that do not touch the database once prepare() has run, and that
+    can be pickled, set pure = True; the pipeline may then run them in worker
+    processes (see app.utils.parallel_pipeline).
     """
     
+    pure = False
+    error_count = 0
+    
+    def record_error(self, error: Exception) -> None:
+        """Count an exception the middleware handled itself, so it shows up in the pipeline stats."""
+        self.error_count += 1
+    
+    def prepare(self) -> None:
+        """Load everything the middleware needs from the database before processing."""
+        pass
+    
     @abstractmethod
     def process(self, transaction: T) -> T:
         """
@@ -33,18 +54,192 @@ class TransactionMiddleware(Generic[T], ABC):
         """
         pass
     
+    def process_batch(self, transactions: List[T]) -> List[T]:
+        """
+        Process a batch of transactions and return the processed transactions.
+        Middlewares can override this to do their setup once per batch instead of
+        once per transaction; by default it calls process() for each transaction.
+        
+        Args:
+            transactions: BankTransaction instances or dictionaries of transaction data
+            
+        Returns:
+            The processed transactions, in the same order
+        """
+        return [self.process(transaction) for transaction in transactions]
+    
+    def process_columns(self, batch: "TransactionColumns") -> "TransactionColumns":
+        """
+        Process a columnar batch of imported transaction data (see app.utils.columnar).
+        Middlewares can override this with a vectorized implementation; by default
+        the batch is converted to dictionaries and passed through process_batch().
+        
+        Args:
+            batch: The transaction data, stored column by column
+            
+        Returns:
+            The processed batch
+        """
+        return type(batch).from_dicts(self.process_batch(batch.to_dicts()))
+    
     def __str__(self) -> str:
         return self.__class__.__name__
 
 
+class MiddlewareStats:
+    """
+    Cumulative counters for one middleware: calls, rows passed through, rows the
+    middleware changed, exceptions (raised or handled) and wall time in seconds.
+    """
+    
+    __slots__ = ("calls", "rows", "rows_changed", "errors", "seconds")
+    
+    def __init__(self):
+        self.calls = 0
+        self.rows = 0
+        self.rows_changed = 0
+        self.errors = 0
+        self.seconds = 0.0
+    
+    def add(self, other: "MiddlewareStats") -> None:
+        """Add another set of counters to this one."""
+        self.calls += other.calls
+        self.rows += other.rows
+        self.rows_changed += other.rows_changed
+        self.errors += other.errors
+        self.seconds += other.seconds
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "rows": self.rows,
+            "rows_changed": self.rows_changed,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 6),
+        }
+
+
+def _snapshot(transaction: Any) -> Dict[str, Any]:
+    """The field values of a transaction, to detect whether a middleware changed it."""
+    if isinstance(transaction, dict):
+        return dict(transaction)
+    return {key: value for key, value in vars(transaction).items() if not key.startswith("_")}
+
+
+def run_measured(
+    middleware: TransactionMiddleware,
+    run: Callable[[], Any],
+    rows: Callable[[Any], List[Any]],
+    before: List[Any],
+) -> Any:
+    """
+    Run one middleware call and measure it.
+    
+    Args:
+        middleware: The middleware being called
+        run: Performs the call and returns its result
+        rows: Extracts the processed rows from the result
+        before: The rows before the call
+        
+    Returns:
+        (result, stats) of the call
+    """
+    stats = MiddlewareStats()
+    snapshots = [_snapshot(row) for row in before]
+    errors_before = middleware.error_count
+    start = time.perf_counter()
+    try:
+        result = run()
+    except Exception:
+        stats.errors += 1
+        raise
+    finally:
+        stats.seconds = time.perf_counter() - start
+        stats.calls = 1
+        stats.rows = len(before)
+        stats.errors += middleware.error_count - errors_before
+    stats.rows_changed = sum(1 for snapshot, row in zip(snapshots, rows(result)) if _snapshot(row) != snapshot)
+    return result, stats
+
+
 class TransactionMiddlewarePipeline:
     """
     A pipeline for processing transactions through a sequence of middlewares.
     Can be used both for existing transactions and during the import process.
     """
     
-    def __init__(self, middlewares: Optional[List[TransactionMiddleware]] = None):
+    def __init__(
+        self,
+        middlewares: Optional[List[TransactionMiddleware]] = None,
+        parallel_workers: int = 1,
+        parallel_threshold: int = 20000,
+    ):
+        """
+        Args:
+            middlewares: The middlewares, in processing order
+            parallel_workers: Worker processes for bulk runs; 1 processes everything in-process
+            parallel_threshold: Minimum number of transactions before a bulk run uses the workers
+        """
         self.middlewares = middlewares or []
+        self.parallel_workers = parallel_workers
+        self.parallel_threshold = parallel_threshold
+        
+        # Per-middleware instrumentation, off by default
+        self.instrumented = False
+        self.stats: Dict[str, MiddlewareStats] = {}
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+    
+    def record_stats(self, name: str, stats: MiddlewareStats) -> None:
+        """Add the counters of a middleware call to the totals and to the current run, if any."""
+        with self._stats_lock:
+            self.stats.setdefault(name, MiddlewareStats()).add(stats)
+        run = getattr(self._local, "run", None)
+        if run is not None:
+            run.setdefault(name, MiddlewareStats()).add(stats)
+    
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """The cumulative counters per middleware."""
+        with self._stats_lock:
+            return {name: stats.to_dict() for name, stats in self.stats.items()}
+    
+    def reset_stats(self) -> None:
+        """Clear the cumulative counters."""
+        with self._stats_lock:
+            self.stats = {}
+    
+    @contextmanager
+    def measure_run(self) -> Iterator[Dict[str, MiddlewareStats]]:
+        """
+        Collect the counters of every middleware call made by the current thread
+        inside the with block (the calls are still added to the totals).
+        """
+        previous = getattr(self._local, "run", None)
+        run = {}
+        self._local.run = run
+        try:
+            yield run
+        finally:
+            self._local.run = previous
+            if previous is not None:
+                for name, stats in run.items():
+                    previous.setdefault(name, MiddlewareStats()).add(stats)
+    
+    @staticmethod
+    def format_stats(stats: Dict[str, MiddlewareStats]) -> str:
+        """One-line summary of per-middleware counters, for logging."""
+        return ", ".join(
+            f"{name}: {item.seconds * 1000:.1f} ms, {item.rows} rows, {item.rows_changed} changed, {item.errors} errors"
+            for name, item in stats.items()
+        )
+    
+    def run_batch(self, middleware: TransactionMiddleware, transactions: List[T]) -> List[T]:
+        """Run one middleware's process_batch, measured if the pipeline is instrumented."""
+        if not self.instrumented:
+            return middleware.process_batch(transactions)
+        result, stats = run_measured(middleware, lambda: middleware.process_batch(transactions), list, transactions)
+        self.record_stats(str(middleware), stats)
+        return result
         
     def add_middleware(self, middleware: TransactionMiddleware) -> None:
         """Add a middleware to the pipeline."""
@@ -65,13 +260,22 @@ class TransactionMiddlewarePipeline:
             The processed transaction after passing through all middlewares
         """
         result = transaction
+        if not self.instrumented:
+            for middleware in self.middlewares:
+                result = middleware.process(result)
+            return result
+        
         for middleware in self.middlewares:
-            result = middleware.process(result)
+            result, stats = run_measured(middleware, lambda: middleware.process(result), lambda row: [row], [result])
+            self.record_stats(str(middleware), stats)
         return result
     
     def process_bulk(self, transactions: List[T]) -> List[T]:
         """
         Process multiple transactions through the middleware pipeline.
+        The whole list is passed through each middleware's process_batch in turn.
+        Large lists are sharded across worker processes for the pure middlewares
+        when parallel_workers > 1.
         
         Args:
             transactions: A list of transactions (BankTransaction instances or dictionaries)
@@ -79,33 +283,84 @@ class TransactionMiddlewarePipeline:
         Returns:
             The processed transactions
         """
-        return [self.process_transaction(transaction) for transaction in transactions]
+        result = list(transactions)
+        if self._use_workers(result):
+            from app.utils.parallel_pipeline import process_bulk_parallel
+            return process_bulk_parallel(self, result)
+        
+        for middleware in self.middlewares:
+            result = self.run_batch(middleware, result)
+        return result
+    
+    def _use_workers(self, transactions: List[T]) -> bool:
+        """Whether a bulk run is large enough, and uniform enough, for the worker pool."""
+        if self.parallel_workers <= 1 or len(transactions) < self.parallel_threshold:
+            return False
+        if not any(middleware.pure for middleware in self.middlewares):
+            return False
+        kinds = {isinstance(transaction, dict) for transaction in transactions}
+        return len(kinds) == 1
+    
+    def process_columnar(self, transactions: List[TransactionData]) -> List[TransactionData]:
+        """
+        Process transaction data dictionaries in columnar mode.
+        The batch is viewed as NumPy columns and passed through each middleware's
+        process_columns; the results are the same as with process_bulk.
+        
+        Args:
+            transactions: A list of transaction data dictionaries
+            
+        Returns:
+            The processed transaction data dictionaries
+        """
+        from app.utils.columnar import TransactionColumns
+        
+        batch = TransactionColumns.from_dicts(transactions)
+        for middleware in self.middlewares:
+            if not self.instrumented:
+                batch = middleware.process_columns(batch)
+                continue
+            current = batch
+            batch, stats = run_measured(
+                middleware, lambda: middleware.process_columns(current), lambda result: result.to_dicts(), current.to_dicts()
+            )
+            self.record_stats(str(middleware), stats)
+        return batch.to_dicts()
     
-    def process_db_transactions(self, filter_func: Optional[Callable[[BankTransaction], bool]] = None) -> None:
+    def process_db_transactions(
+        self,
+        transaction_filter=None,
+        filter_func: Optional[Callable[[BankTransaction], bool]] = None,
+        chunk_size: int = 1000,
+    ) -> int:
         """
         Process existing transactions in the database through the middleware pipeline.
+        Transactions are selected in SQL, streamed in chunks and committed per chunk.
         
         Args:
-            filter_func: Optional function to filter which transactions to process
+            transaction_filter: Optional TransactionFilter selecting which transactions to process
+            filter_func: Optional additional Python predicate, applied to the selected transactions
+            chunk_size: Transactions per chunk
+            
+        Returns:
+            Number of transactions processed
         """
         from app.models.db import db
+        from app.utils.transaction_filter import iter_transaction_chunks
+        
+        processed_count = 0
+        for chunk in iter_transaction_chunks(transaction_filter, chunk_size):
+            if filter_func:
+                chunk = [tx for tx in chunk if filter_func(tx)]
+            
+            # process_bulk modifies the objects in place, so there is nothing else to do
+            self.process_bulk(chunk)
+            processed_count += len(chunk)
+            
+            # Commit the changes of this chunk to the database
+            db.session.commit()
         
-        # Query all transactions, applying filter if provided
-        query = BankTransaction.query
-        if filter_func:
-            # We can't directly filter with a Python function, so we'll filter after fetching
-            transactions = [tx for tx in query.all() if filter_func(tx)]
-        else:
-            transactions = query.all()
-        
-        # Process each transaction
-        for transaction in transactions:
-            processed = self.process_transaction(transaction)
-            # The process_transaction function returns the same object, already modified
-            # So we don't need to do anything else here
-        
-        # Commit the changes to the database
-        db.session.commit()
+        return processed_count
 
 # Global pipeline instance that can be configured at application startup
 transaction_pipeline = TransactionMiddlewarePipeline()
\ No newline at end of file
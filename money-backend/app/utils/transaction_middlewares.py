@@ -5,16 +5,21 @@ This module provides concrete implementations of transaction middleware componen
 that can be added to the middleware pipeline.
 """
 
-from datetime import datetime
+from datetime import date, datetime
 from typing import Dict, Any, Union, Optional, List, Pattern
 import re
 from decimal import Decimal
-import hashlib
+
+import numpy as np
 
 from app.models.transaction import BankTransaction
 from app.utils.transaction_middleware import TransactionMiddleware, TransactionData
 from app.models.rule import Rule
-from app.utils.rule_engine import RuleEngine
+from app.utils.rule_engine import DERIVED_FIELDS, CompiledRuleSet
+from app.models.money import to_cents
+from app.utils.columnar import TransactionColumns, amounts_to_cents, is_member, parse_dates, strip_strings
+from app.utils.fingerprint import FINGERPRINT_FIELDS, FINGERPRINT_VERSION, fingerprint, transaction_fingerprint
+from app.utils import metrics
 from app.config import config
 
 T = Union[BankTransaction, TransactionData]
@@ -26,8 +31,13 @@ class DateFormattingMiddleware(TransactionMiddleware[T]):
     Handles operations like trimming whitespace, standardizing formats, etc.
     """
 
+    pure = True
+
     def parse_date(self, date_str, format="%d.%m.%y"):
         INPUT_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+        if isinstance(date_str, date):
+            # Statement parsers other than DKB emit parsed dates
+            return date_str
         if "T" in date_str:
             try:
                 return datetime.strptime(date_str, INPUT_DATE_FORMAT)
@@ -48,15 +58,48 @@ class DateFormattingMiddleware(TransactionMiddleware[T]):
             if "value_date" in transaction and transaction["value_date"]:
                 transaction["value_date"] = self.parse_date(transaction["value_date"])
         else:
-            if transaction.booking_date:
+            # Stored transactions already hold date objects, only parse raw strings
+            if isinstance(transaction.booking_date, str):
                 transaction.booking_date = self.parse_date(
                     transaction.booking_date.strip()
                 )
-            if transaction.value_date:
+            if isinstance(transaction.value_date, str):
                 transaction.value_date = self.parse_date(transaction.value_date.strip())
 
         return transaction
 
+    def process_batch(self, transactions: List[T]) -> List[T]:
+        # A statement repeats the same few dates many times, parse each string once
+        parsed = {}
+        lookups = 0
+
+        def parse(date_str):
+            nonlocal lookups
+            lookups += 1
+            if date_str not in parsed:
+                parsed[date_str] = self.parse_date(date_str)
+            return parsed[date_str]
+
+        for transaction in transactions:
+            if isinstance(transaction, dict):
+                if transaction.get("booking_date"):
+                    transaction["booking_date"] = parse(transaction["booking_date"])
+                if transaction.get("value_date"):
+                    transaction["value_date"] = parse(transaction["value_date"])
+            else:
+                if isinstance(transaction.booking_date, str):
+                    transaction.booking_date = parse(transaction.booking_date.strip())
+                if isinstance(transaction.value_date, str):
+                    transaction.value_date = parse(transaction.value_date.strip())
+        metrics.record_cache("date_parse", lookups, len(parsed))
+        return transactions
+
+    def process_columns(self, batch: TransactionColumns) -> TransactionColumns:
+        for name in ("booking_date", "value_date"):
+            if name in batch:
+                batch.set(name, parse_dates(batch.get(name), self.parse_date))
+        return batch
+
 
 class DataCleaningMiddleware(TransactionMiddleware[T]):
     """
@@ -64,7 +107,37 @@ class DataCleaningMiddleware(TransactionMiddleware[T]):
     Handles operations like trimming whitespace, standardizing formats, etc.
     """
 
+    pure = True
+
     def process(self, transaction: T) -> T:
+        return self._clean(transaction, config.TRADEREPUBLIC_SAVING_PLAN_IBAN, config.TRADEREPUBLIC_IBAN)
+
+    def process_batch(self, transactions: List[T]) -> List[T]:
+        # Look up the IBAN configuration once for the whole batch
+        saving_plan_iban = config.TRADEREPUBLIC_SAVING_PLAN_IBAN
+        own_iban = config.TRADEREPUBLIC_IBAN
+        return [self._clean(transaction, saving_plan_iban, own_iban) for transaction in transactions]
+
+    def process_columns(self, batch: TransactionColumns) -> TransactionColumns:
+        for name in ("purpose", "payee", "payer"):
+            if name in batch:
+                batch.set(name, strip_strings(batch.get(name)), where=batch.present(name))
+        if "amount" in batch:
+            # Euro amounts from other sources become cents, like in _clean
+            cents, converted = amounts_to_cents(batch.get("amount"))
+            where = batch.present("amount") & converted
+            if where.any():
+                batch.set("amount_cents", cents, where=where)
+                batch.remove("amount", where=where)
+        if len(batch):
+            if not batch.present("iban").all():
+                raise KeyError("iban")
+            # replace Traderepublic saving plan IBAN with own TR IBAN
+            ibans = batch.get("iban")
+            batch.set("iban", np.where(ibans == config.TRADEREPUBLIC_SAVING_PLAN_IBAN, config.TRADEREPUBLIC_IBAN, ibans))
+        return batch
+
+    def _clean(self, transaction: T, saving_plan_iban: str, own_iban: str) -> T:
         if isinstance(transaction, dict):
             # Clean transaction data dictionary during import
             if "purpose" in transaction and transaction["purpose"]:
@@ -74,16 +147,15 @@ class DataCleaningMiddleware(TransactionMiddleware[T]):
             if "payer" in transaction and transaction["payer"]:
                 transaction["payer"] = transaction["payer"].strip()
 
-            # Convert amount strings to proper floats if needed
-            if "amount" in transaction and isinstance(transaction["amount"], str):
-                # Remove any thousands separators and convert decimal comma to point
-                amount_str = transaction["amount"].replace(".", "").replace(",", ".")
+            # Convert euro amounts (numbers or German formatted strings) to exact cents
+            if "amount" in transaction:
                 try:
-                    transaction["amount"] = float(amount_str)
-                except ValueError:
+                    transaction["amount_cents"] = to_cents(transaction["amount"])
+                    del transaction["amount"]
+                except (ValueError, TypeError):
                     pass  # Keep the original value if conversion fails
-            if transaction["iban"] == config.TRADEREPUBLIC_SAVING_PLAN_IBAN:
-                transaction["iban"] = config.TRADEREPUBLIC_IBAN
+            if transaction["iban"] == saving_plan_iban:
+                transaction["iban"] = own_iban
         else:
             # Clean BankTransaction object fields
             if transaction.purpose:
@@ -93,8 +165,8 @@ class DataCleaningMiddleware(TransactionMiddleware[T]):
             if transaction.payer:
                 transaction.payer = transaction.payer.strip()
             # replace Traderepublic saving plan IBAN with own TR IBAN
-            if transaction.iban == config.TRADEREPUBLIC_SAVING_PLAN_IBAN:
-                transaction.iban = config.TRADEREPUBLIC_IBAN
+            if transaction.iban == saving_plan_iban:
+                transaction.iban = own_iban
 
         return transaction
 
@@ -104,6 +176,8 @@ class ApplyRulesMiddleware(TransactionMiddleware[T]):
     Middleware for applying categorization rules to transactions.
     """
 
+    pure = True
+
     def __init__(self, rules: Optional[List[Rule]] = None):
         """
         Initialize with rules or load them from the database.
@@ -111,53 +185,56 @@ class ApplyRulesMiddleware(TransactionMiddleware[T]):
         Args:
             rules: Optional list of Rule objects. If None, rules will be loaded from the database.
         """
-        self.rules = rules
+        self.rules = None
+        self.rule_set = None
         self._rules_loaded = False
+        if rules is not None:
+            self.set_rules(rules)
+
+    def set_rules(self, rules: List[Rule]) -> None:
+        """Use the given rules (in priority order) and compile them."""
+        self.rules = rules
+        self.rule_set = CompiledRuleSet(rules)
+        self._rules_loaded = True
+
+    def prepare(self) -> None:
+        self._load_rules()
+
+    def __getstate__(self):
+        # Rule rows are bound to a session; workers only need the compiled rule set
+        state = self.__dict__.copy()
+        state["rules"] = None
+        return state
 
     def _load_rules(self):
         """Load rules from the database if they haven't been provided."""
         if not self._rules_loaded:
             from app.models.rule import Rule
             from sqlalchemy.orm import joinedload
-            from app.models.db import db
             
             # Use joinedload to eagerly load rule conditions to prevent detached instance errors
-            self.rules = Rule.query.options(joinedload(Rule.conditions)).order_by(Rule.created_at).all()
-            
-            # Ensure all rule conditions are accessed within this session context
-            for rule in self.rules:
-                # Touch the conditions to ensure they're loaded
-                _ = list(rule.conditions)
-            
-            self._rules_loaded = True
+            self.set_rules(
+                Rule.query.options(joinedload(Rule.conditions)).order_by(Rule.created_at).all()
+            )
 
     def process(self, transaction: T) -> T:
         """Process a transaction by applying rules to it."""
         try:
-            # Make sure we have rules loaded and they're attached to a session
+            # Make sure we have rules loaded and compiled
             self._load_rules()
             
             if isinstance(transaction, dict):
-                # For transaction data dictionary, we can't directly apply rules
-                # We'd need to create a temporary BankTransaction object
-                temp_transaction = BankTransaction()
-                for key, value in transaction.items():
-                    if hasattr(temp_transaction, key):
-                        setattr(temp_transaction, key, value)
-
-                # Apply rules
-                matched, category_id, rule_id = RuleEngine.apply_rules(
-                    temp_transaction, self.rules
-                )
+                # Transaction data dictionaries are matched directly, no temporary model needed
+                metrics.rule_evaluations.inc(source="pipeline")
+                matched, category_id, rule_id = self.rule_set.apply(transaction)
                 if matched:
                     transaction["category_id"] = category_id
                     transaction["rule_id"] = rule_id
             else:
                 # For BankTransaction object, apply rules directly
                 if not transaction.category_id:  # Only apply if not already categorized
-                    matched, category_id, rule_id = RuleEngine.apply_rules(
-                        transaction, self.rules
-                    )
+                    metrics.rule_evaluations.inc(source="pipeline")
+                    matched, category_id, rule_id = self.rule_set.apply(transaction)
                     if matched:
                         transaction.category_id = category_id
                         transaction.rule_id = rule_id
@@ -168,14 +245,83 @@ class ApplyRulesMiddleware(TransactionMiddleware[T]):
             import logging
             logger = logging.getLogger('money_backend.transaction_middlewares')
             logger.error(f"Error in ApplyRulesMiddleware: {str(e)}")
+            self.record_error(e)
             return transaction
 
+    def process_batch(self, transactions: List[T]) -> List[T]:
+        """Apply rules to a batch, loading and compiling them once."""
+        try:
+            self._load_rules()
+        except Exception as e:
+            import logging
+            logger = logging.getLogger('money_backend.transaction_middlewares')
+            logger.error(f"Error in ApplyRulesMiddleware: {str(e)}")
+            self.record_error(e)
+            return transactions
+
+        apply = self.rule_set.apply
+        evaluated = 0
+        for transaction in transactions:
+            if isinstance(transaction, dict):
+                evaluated += 1
+                matched, category_id, rule_id = apply(transaction)
+                if matched:
+                    transaction["category_id"] = category_id
+                    transaction["rule_id"] = rule_id
+            elif not transaction.category_id:  # Only apply if not already categorized
+                evaluated += 1
+                matched, category_id, rule_id = apply(transaction)
+                if matched:
+                    transaction.category_id = category_id
+                    transaction.rule_id = rule_id
+        metrics.rule_evaluations.inc(evaluated, source="pipeline")
+        return transactions
+
+    def process_columns(self, batch: TransactionColumns) -> TransactionColumns:
+        """Apply rules to a columnar batch, reading only the columns the rules use."""
+        try:
+            self._load_rules()
+            columns = {field: self._column_values(batch, field) for field in self.rule_set.fields}
+            results = self.rule_set.apply_columns(columns) if columns else [(False, None, None)] * len(batch)
+            metrics.rule_evaluations.inc(len(batch), source="pipeline")
+
+            matched = np.fromiter((result[0] for result in results), dtype=bool, count=len(batch))
+            category_ids = np.empty(len(batch), dtype=object)
+            category_ids[:] = [result[1] for result in results]
+            rule_ids = np.empty(len(batch), dtype=object)
+            rule_ids[:] = [result[2] for result in results]
+
+            batch.set("category_id", category_ids, where=matched)
+            batch.set("rule_id", rule_ids, where=matched)
+        except Exception as e:
+            import logging
+            logger = logging.getLogger('money_backend.transaction_middlewares')
+            logger.error(f"Error in ApplyRulesMiddleware: {str(e)}")
+            self.record_error(e)
+        return batch
+
+
+    @staticmethod
+    def _column_values(batch: TransactionColumns, field: str) -> List[Any]:
+        """The values of a rule field, derived from its stored column where rows lack it (see field_value)."""
+        if field not in DERIVED_FIELDS:
+            return batch.values(field)
+        source, convert = DERIVED_FIELDS[field]
+        values = batch.values(field)
+        present = batch.present(field)
+        for index, source_value in enumerate(batch.values(source)):
+            if not present[index]:
+                values[index] = convert(source_value)
+        return values
+
 
 class InternalTransferDetectionMiddleware(TransactionMiddleware[T]):
     """
     Middleware for detecting internal transfers between own bank accounts.
     """
 
+    pure = True
+
     def __init__(self, own_ibans: Optional[List[str]] = None):
         """
         Initialize with own IBANs or load them from the database.
@@ -185,6 +331,9 @@ class InternalTransferDetectionMiddleware(TransactionMiddleware[T]):
         """
         self.own_ibans = own_ibans
 
+    def prepare(self) -> None:
+        self._load_ibans()
+
     def _load_ibans(self):
         """Load own IBANs from the database if they haven't been provided."""
         if self.own_ibans is None:
@@ -224,41 +373,67 @@ class InternalTransferDetectionMiddleware(TransactionMiddleware[T]):
 
         return transaction
 
+    def process_batch(self, transactions: List[T]) -> List[T]:
+        """Flag internal transfers in a batch, loading the own IBANs once."""
+        self._load_ibans()
+        own_ibans = set(self.own_ibans)
+
+        for transaction in transactions:
+            if isinstance(transaction, dict):
+                iban = transaction.get("iban")
+                counterparty_iban = transaction.get("counterparty_iban")
+                transaction["is_internal_transfer"] = bool(
+                    iban and counterparty_iban and iban in own_ibans and counterparty_iban in own_ibans
+                )
+            else:
+                transaction.is_internal_transfer = bool(
+                    transaction.iban
+                    and transaction.counterparty_iban
+                    and transaction.iban in own_ibans
+                    and transaction.counterparty_iban in own_ibans
+                )
+        return transactions
+
+    def process_columns(self, batch: TransactionColumns) -> TransactionColumns:
+        self._load_ibans()
+        batch.set(
+            "is_internal_transfer",
+            is_member(batch.get("iban"), self.own_ibans) & is_member(batch.get("counterparty_iban"), self.own_ibans),
+        )
+        return batch
+
 
 class TransactionHashMiddleware(TransactionMiddleware[T]):
     """
     Middleware for generating a unique hash for each transaction to identify duplicates.
+    Uses the canonical fingerprint of app.utils.fingerprint on the parsed values,
+    so it has to run after DataCleaningMiddleware and DateFormattingMiddleware.
     """
 
+    pure = True
+
     def process(self, transaction: T) -> T:
         if isinstance(transaction, dict):
             # For transaction data dictionary, create hash based on key fields
-            hash_input = (
-                f"{transaction.get('booking_date', '')}"
-                f"{transaction.get('value_date', '')}"
-                f"{transaction.get('amount', '')}"
-                f"{transaction.get('payee', '')}"
-                f"{transaction.get('purpose', '')}"
-            )
-            transaction["transaction_hash"] = hashlib.md5(
-                hash_input.encode("utf-8")
-            ).hexdigest()
+            transaction["transaction_hash"] = transaction_fingerprint(transaction)
+            transaction["hash_version"] = FINGERPRINT_VERSION
         else:
             # For BankTransaction object, create hash if not already present
             if not transaction.transaction_hash:
-                hash_input = (
-                    f"{transaction.booking_date}"
-                    f"{transaction.value_date}"
-                    f"{transaction.amount}"
-                    f"{transaction.payee}"
-                    f"{transaction.purpose}"
-                )
-                transaction.transaction_hash = hashlib.md5(
-                    hash_input.encode("utf-8")
-                ).hexdigest()
+                transaction.transaction_hash = transaction_fingerprint(transaction)
+                transaction.hash_version = FINGERPRINT_VERSION
 
         return transaction
 
+    def process_columns(self, batch: TransactionColumns) -> TransactionColumns:
+        # Hashing is inherently per row, but reads each column only once
+        columns = [batch.values(name) for name in FINGERPRINT_FIELDS]
+        hashes = np.empty(len(batch), dtype=object)
+        hashes[:] = [fingerprint(values) for values in zip(*columns)]
+        batch.set("transaction_hash", hashes)
+        batch.set("hash_version", np.full(len(batch), FINGERPRINT_VERSION, dtype=object))
+        return batch
+
 
 class PatternExtractionMiddleware(TransactionMiddleware[T]):
     """
@@ -266,6 +441,8 @@ class PatternExtractionMiddleware(TransactionMiddleware[T]):
     Useful for getting reference numbers, invoice IDs, etc.
     """
 
+    pure = True
+
     def __init__(self, patterns: Dict[str, Pattern]):
         """
         Initialize with regex patterns to extract.
@@ -0,0 +1,189 @@
+"""
+Transaction Serialization
+
+This module converts BankTransaction rows to the dictionaries returned by the
+API, in one place for all routes. Category names are resolved from a cached
+category id -> name map instead of the lazy-loaded category relationship, so
+serializing a page of transactions does not issue a query per row.
+
+The map is reloaded after a category is inserted, updated or deleted in this
+process, and after CATEGORY_NAME_CACHE_TTL seconds at the latest, which bounds
+how long changes made by other processes stay invisible.
+
+List endpoints select only the requested fields (see transaction_columns and
+serialize_rows), so no ORM objects are built. Dates are left as date objects
+for the encoder: responses must be built with fast_json.json_response.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.config import config
+from app.models.category import Category
+from app.models.db import db
+from app.models.transaction import BankTransaction
+from app.utils import metrics
+
+
+class CategoryNameCache:
+    """Process-wide map of category ids to names."""
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl
+        self._names: Optional[Dict[int, str]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Dict[int, str]:
+        """The current map, loaded with a single query when missing or expired."""
+        names = self._names
+        if names is not None and time.monotonic() - self._loaded_at < self.ttl:
+            metrics.record_cache("category_names", 1, 0)
+            return names
+        with self._lock:
+            if self._names is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._names = dict(db.session.execute(select(Category.id, Category.name)).all())
+                self._loaded_at = time.monotonic()
+            metrics.record_cache("category_names", 1, 1)
+            return self._names
+
+    def invalidate(self) -> None:
+        self._names = None
+
+
+category_names = CategoryNameCache(config.CATEGORY_NAME_CACHE_TTL)
+
+
+def _invalidate_category_names(mapper, connection, target):
+    category_names.invalidate()
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(Category, _event, _invalidate_category_names)
+
+
+class InvalidFieldsError(ValueError):
+    """Raised when a fields= projection names an unknown field."""
+
+
+# Field name -> function(transaction, category names) producing the serialized value
+FIELD_GETTERS: Dict[str, Callable[[BankTransaction, Dict[int, str]], Any]] = {
+    "id": lambda tx, names: tx.id,
+    "booking_date": lambda tx, names: tx.booking_date,
+    "value_date": lambda tx, names: tx.value_date,
+    "amount": lambda tx, names: float(tx.amount) if tx.amount else 0.0,
+    "payee": lambda tx, names: tx.payee,
+    "payer": lambda tx, names: tx.payer,
+    "purpose": lambda tx, names: tx.purpose,
+    "transaction_type": lambda tx, names: tx.transaction_type,
+    "iban": lambda tx, names: tx.iban,
+    "creditor_id": lambda tx, names: tx.creditor_id,
+    "mandate_reference": lambda tx, names: tx.mandate_reference,
+    "customer_reference": lambda tx, names: tx.customer_reference,
+    "category_id": lambda tx, names: tx.category_id,
+    "category_name": lambda tx, names: names.get(tx.category_id) if tx.category_id is not None else None,
+    "transaction_hash": lambda tx, names: tx.transaction_hash,
+}
+
+# Field sets of the transaction endpoints
+LIST_FIELDS = (
+    "id", "booking_date", "value_date", "amount", "payee", "payer", "purpose",
+    "transaction_type", "iban", "creditor_id", "mandate_reference", "customer_reference",
+    "category_id", "category_name",
+)
+DETAIL_FIELDS = LIST_FIELDS + ("transaction_hash",)
+CATEGORY_LIST_FIELDS = tuple(field for field in DETAIL_FIELDS if field not in ("category_id", "category_name"))
+UNCATEGORIZED_FIELDS = (
+    "id", "booking_date", "value_date", "amount", "purpose", "payee", "payer",
+    "category_id", "transaction_hash",
+)
+SEARCH_FIELDS = (
+    "id", "booking_date", "value_date", "amount", "payee", "payer", "purpose",
+    "transaction_type", "iban", "category_id", "category_name", "transaction_hash",
+)
+
+
+def parse_fields(value: Optional[str], default: Sequence[str]) -> Tuple[str, ...]:
+    """
+    Parse a comma separated fields= argument.
+
+    Args:
+        value: The argument, None or empty for the default fields
+        default: The endpoint's default field set
+
+    Returns:
+        The field names, without duplicates
+
+    Raises:
+        InvalidFieldsError: If a field is unknown
+    """
+    if not value:
+        return tuple(default)
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(",") if field.strip()))
+    if not fields:
+        raise InvalidFieldsError("No fields requested")
+    unknown = [field for field in fields if field not in FIELD_GETTERS]
+    if unknown:
+        raise InvalidFieldsError(f"Unknown fields: {', '.join(unknown)}, allowed: {', '.join(FIELD_GETTERS)}")
+    return fields
+
+
+def transaction_columns(fields: Sequence[str], *extra: str) -> List[ColumnElement]:
+    """
+    The columns to select for a projection: one per field, in order, followed by
+    the extra columns (e.g. the sort column and id for keyset pagination) that
+    are not already among them.
+    """
+    columns = []
+    for field in fields:
+        if field == "category_name":
+            columns.append(BankTransaction.category_id.label("category_name"))
+        else:
+            columns.append(getattr(BankTransaction, field))
+    columns.extend(getattr(BankTransaction, name) for name in dict.fromkeys(extra) if name not in fields)
+    return columns
+
+
+def serialize_rows(rows: Iterable[Sequence[Any]], fields: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Convert rows selected with transaction_columns(fields, ...) to API dictionaries.
+    Values are taken in column order; extra columns past the fields are dropped.
+    """
+    result = [dict(zip(fields, row)) for row in rows]
+    if "amount" in fields:
+        for item in result:
+            if not item["amount"]:
+                item["amount"] = 0.0
+    if "category_name" in fields:
+        names = category_names.get()
+        for item in result:
+            if item["category_name"] is not None:
+                item["category_name"] = names.get(item["category_name"])
+    return result
+
+
+def serialize_transactions(
+    transactions: Iterable[BankTransaction],
+    fields: Sequence[str] = LIST_FIELDS,
+) -> List[Dict[str, Any]]:
+    """
+    Convert transactions to API dictionaries.
+
+    Args:
+        transactions: The transactions to serialize
+        fields: Names of the fields to include, keys of FIELD_GETTERS
+
+    Returns:
+        One dictionary per transaction
+    """
+    getters = [(field, FIELD_GETTERS[field]) for field in fields]
+    names = category_names.get() if "category_name" in fields else {}
+    return [{field: getter(tx, names) for field, getter in getters} for tx in transactions]
+
+
+def serialize_transaction(transaction: BankTransaction, fields: Sequence[str] = DETAIL_FIELDS) -> Dict[str, Any]:
+    """Convert a single transaction to an API dictionary."""
+    return serialize_transactions([transaction], fields)[0]
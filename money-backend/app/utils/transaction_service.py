@@ -4,17 +4,27 @@ Transaction Service
 This module provides services for processing bank transactions using the middleware pipeline.
 It serves as the main entry point for all transaction processing operations.
 """
-from typing import List, Dict, Any, Optional, Union, Callable
+from typing import List, Dict, Any, Optional, Union, Callable, Iterable, Set
 import logging
+import time
 import traceback
-from functools import wraps
+from functools import wraps, lru_cache
+from sqlalchemy import insert
+from sqlalchemy.dialects import mysql, sqlite
 from app.models.db import db
 from app.models.transaction import BankTransaction
 from app.utils.transaction_middleware import transaction_pipeline, TransactionData
+from app.utils.transaction_filter import TransactionFilter, iter_transaction_chunks
+from app.config import config
+from app.utils import metrics, rollup
+from app.utils.fingerprint_cache import fingerprint_cache, record_inserted
 
 # Set up logger
 logger = logging.getLogger('money_backend.transaction_service')
 
+# Times a bulk chunk is rechecked against the database when INSERT IGNORE skipped rows
+SKIPPED_ROW_RECHECKS = 2
+
 # Define the decorator outside the class to avoid circular reference
 def with_consistent_session(func):
     """
@@ -33,6 +43,48 @@ def with_consistent_session(func):
             raise
     return wrapper
 
+@lru_cache(maxsize=None)
+def _insertable_columns() -> Dict[str, Any]:
+    """
+    Column whitelist for bulk inserts, computed once.
+    Maps column name to its scalar default (or None) for every BankTransaction
+    column except the primary key.
+    """
+    columns = {}
+    for column in BankTransaction.__table__.columns:
+        if column.primary_key:
+            continue
+        default = column.default
+        columns[column.name] = default.arg if default is not None and default.is_scalar else None
+    return columns
+
+
+def _build_insert_statement(on_duplicate: str, update_columns: List[str]):
+    """
+    Build the INSERT statement for a bulk chunk, honouring the duplicate strategy
+    against the unique transaction_hash index where the dialect supports it.
+    """
+    table = BankTransaction.__table__
+    dialect = db.session.get_bind().dialect.name
+    
+    if on_duplicate == "update" and dialect == "mysql":
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update({name: stmt.inserted[name] for name in update_columns})
+    if on_duplicate == "update" and dialect == "sqlite":
+        stmt = sqlite.insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.transaction_hash],
+            set_={name: stmt.excluded[name] for name in update_columns}
+        )
+    if on_duplicate == "ignore":
+        return (
+            insert(table)
+            .prefix_with("IGNORE", dialect="mysql")
+            .prefix_with("OR IGNORE", dialect="sqlite")
+        )
+    return insert(table)
+
+
 class TransactionService:
     """
     Service for processing bank transactions through the middleware pipeline.
@@ -57,23 +109,21 @@ class TransactionService:
             from sqlalchemy.orm import joinedload
             from app.utils.transaction_middlewares import ApplyRulesMiddleware
             
-            # Eagerly load rules with their conditions in this session
-            rules = Rule.query.options(joinedload(Rule.conditions)).all()
+            # Eagerly load rules with their conditions in this session, in priority order
+            rules = Rule.query.options(joinedload(Rule.conditions)).order_by(Rule.created_at).all()
             logger.info(f"Preloaded {len(rules)} rules with their conditions")
-            
-            # Access the conditions to ensure they're loaded in this session
-            for rule in rules:
-                _ = list(rule.conditions)
                 
             # Configure middleware to use the preloaded rules
             for middleware in transaction_pipeline.middlewares:
                 if isinstance(middleware, ApplyRulesMiddleware):
-                    middleware.rules = rules
-                    middleware._rules_loaded = True
+                    middleware.set_rules(rules)
                     logger.debug(f"Injected preloaded rules into ApplyRulesMiddleware")
             
             # Process all transactions through the middleware pipeline
-            processed_data = transaction_pipeline.process_bulk(transaction_data_list)
+            if config.IMPORT_COLUMNAR:
+                processed_data = transaction_pipeline.process_columnar(transaction_data_list)
+            else:
+                processed_data = transaction_pipeline.process_bulk(transaction_data_list)
             logger.debug(f"Successfully processed {len(processed_data)} transactions through middleware")
             return processed_data
         except Exception as e:
@@ -81,37 +131,117 @@ class TransactionService:
             logger.error(f"Stack trace: {traceback.format_exc()}")
             raise
     
+    @staticmethod
+    def find_existing_hashes(hashes: Iterable[str], chunk_size: Optional[int] = None) -> Set[str]:
+        """
+        Resolve which of the given transaction hashes already exist in the database.
+        Uses chunked IN (...) lookups so the number of queries depends on the
+        number of chunks, not on the number of hashes.
+        
+        Args:
+            hashes: Transaction hashes to look up
+            chunk_size: Number of hashes per lookup query (defaults to config.DEDUP_LOOKUP_CHUNK_SIZE)
+            
+        Returns:
+            The subset of hashes that are already stored
+        """
+        chunk_size = chunk_size or config.DEDUP_LOOKUP_CHUNK_SIZE
+        unique_hashes = list({h for h in hashes if h})
+        existing = set()
+        
+        for start in range(0, len(unique_hashes), chunk_size):
+            chunk = unique_hashes[start:start + chunk_size]
+            rows = db.session.query(BankTransaction.transaction_hash).filter(
+                BankTransaction.transaction_hash.in_(chunk)
+            ).all()
+            existing.update(row.transaction_hash for row in rows)
+        
+        return existing
+    
+    @staticmethod
+    def find_duplicate_transactions(transaction_data_list: List[Dict[str, Any]]) -> Dict[int, str]:
+        """
+        Detect duplicates in a batch of processed transaction data.
+        A row is a duplicate if its hash is already stored in the database or if
+        an earlier row of the same batch has the same hash.
+        
+        Args:
+            transaction_data_list: List of dictionaries containing processed transaction data
+            
+        Returns:
+            Mapping of row index to the duplicate reason ("existing" or "batch")
+        """
+        if config.FINGERPRINT_CACHE_ENABLED:
+            # Known and certainly new hashes are answered from memory, only the rest is looked up
+            existing = fingerprint_cache.find_existing(
+                (data['transaction_hash'] for data in transaction_data_list if data.get('transaction_hash')),
+                TransactionService.find_existing_hashes,
+            )
+        else:
+            existing = TransactionService.find_existing_hashes(
+                data.get('transaction_hash') for data in transaction_data_list
+            )
+        
+        return TransactionService._batch_duplicates(transaction_data_list, existing)
+    
+    @staticmethod
+    def _batch_duplicates(transaction_data_list: List[Dict[str, Any]], existing: Set[str]) -> Dict[int, str]:
+        """Mark rows whose hash is in `existing` or repeats an earlier row of the batch."""
+        duplicates = {}
+        seen = set()
+        for i, data in enumerate(transaction_data_list):
+            transaction_hash = data.get('transaction_hash')
+            if not transaction_hash:
+                continue
+            if transaction_hash in existing:
+                duplicates[i] = "existing"
+            elif transaction_hash in seen:
+                duplicates[i] = "batch"
+            else:
+                seen.add(transaction_hash)
+        
+        return duplicates
+    
     @staticmethod
     @with_consistent_session
-    def save_transactions(transaction_data_list: List[Dict[str, Any]]) -> List[BankTransaction]:
+    def save_transactions(
+        transaction_data_list: List[Dict[str, Any]],
+        duplicates: Optional[List[Dict[str, Any]]] = None
+    ) -> List[BankTransaction]:
         """
         Save a list of processed transaction data to the database.
         
         Args:
             transaction_data_list: List of dictionaries containing processed transaction data
+            duplicates: Optional list that receives one entry per skipped duplicate row
+                        ({"index", "transaction_hash", "reason"})
             
         Returns:
             List of created BankTransaction objects
         """
         logger.info(f"Saving {len(transaction_data_list)} transactions to database")
         saved_transactions = []
-        duplicates = 0
         
         try:
+            # Resolve all duplicates of the batch up front
+            duplicate_rows = TransactionService.find_duplicate_transactions(transaction_data_list)
+            
             for i, data in enumerate(transaction_data_list):
                 try:
-                    # Check if a transaction with this hash already exists
-                    if 'transaction_hash' in data:
-                        existing = BankTransaction.query.filter_by(
-                            transaction_hash=data['transaction_hash']
-                        ).first()
-                        
-                        if existing:
-                            # Skip this transaction, it's a duplicate
-                            duplicates += 1
-                            logger.debug(f"Skipping duplicate transaction with hash {data['transaction_hash']}")
-                            continue
-                    else:
+                    if i in duplicate_rows:
+                        # Skip this transaction, it's a duplicate
+                        logger.debug(
+                            f"Skipping duplicate transaction at index {i} with hash "
+                            f"{data['transaction_hash']} ({duplicate_rows[i]})"
+                        )
+                        if duplicates is not None:
+                            duplicates.append({
+                                "index": i,
+                                "transaction_hash": data['transaction_hash'],
+                                "reason": duplicate_rows[i],
+                            })
+                        continue
+                    if not data.get('transaction_hash'):
                         logger.warning(f"Transaction at index {i} has no transaction_hash")
                 
                     # Create new transaction object
@@ -136,7 +266,7 @@ class TransactionService:
             # Commit all transactions
             logger.info(f"Committing {len(saved_transactions)} transactions to database")
             db.session.commit()
-            logger.info(f"Successfully saved {len(saved_transactions)} transactions, skipped {duplicates} duplicates")
+            logger.info(f"Successfully saved {len(saved_transactions)} transactions, skipped {len(duplicate_rows)} duplicates")
             
             return saved_transactions
             
@@ -148,24 +278,185 @@ class TransactionService:
     
     @staticmethod
     @with_consistent_session
-    def import_and_save_transactions(transaction_data_list: List[Dict[str, Any]]) -> List[BankTransaction]:
+    def bulk_save_transactions(
+        transaction_data_list: List[Dict[str, Any]],
+        duplicates: Optional[List[Dict[str, Any]]] = None,
+        chunk_size: Optional[int] = None,
+        on_duplicate: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Save processed transaction data with executemany INSERTs instead of ORM objects.
+        Rows are written and committed in chunks.
+        
+        Args:
+            transaction_data_list: List of dictionaries containing processed transaction data
+            duplicates: Optional list that receives one entry per skipped duplicate row
+            chunk_size: Rows per INSERT/commit (defaults to config.IMPORT_COMMIT_CHUNK_SIZE)
+            on_duplicate: How the database should treat rows whose transaction_hash
+                          already exists: "ignore" (INSERT IGNORE), "update"
+                          (ON DUPLICATE KEY UPDATE) or "error" (plain INSERT).
+                          Defaults to config.IMPORT_ON_DUPLICATE.
+            
+        Returns:
+            The transaction data rows the database inserted. Rows skipped by INSERT IGNORE
+            because another session stored their hash after the duplicate check are
+            reported in `duplicates` instead.
+        """
+        chunk_size = chunk_size or config.IMPORT_COMMIT_CHUNK_SIZE
+        on_duplicate = on_duplicate or config.IMPORT_ON_DUPLICATE
+        logger.info(f"Bulk saving {len(transaction_data_list)} transactions in chunks of {chunk_size} ({on_duplicate} on duplicate)")
+        
+        columns = _insertable_columns()
+        unknown_keys = set()
+        saved_rows = []
+        
+        try:
+            for start in range(0, len(transaction_data_list), chunk_size):
+                chunk = transaction_data_list[start:start + chunk_size]
+                
+                if on_duplicate == "update":
+                    # Existing rows are refreshed by the upsert, only drop repeats inside the batch
+                    duplicate_rows = TransactionService._batch_duplicates(chunk, set())
+                else:
+                    duplicate_rows = TransactionService.find_duplicate_transactions(chunk)
+                
+                for attempt in range(1, SKIPPED_ROW_RECHECKS + 2):
+                    rows = []
+                    chunk_keys = set()
+                    for i, data in enumerate(chunk):
+                        if i in duplicate_rows:
+                            continue
+                        unknown_keys.update(key for key in data if key not in columns)
+                        chunk_keys.update(key for key in data if key in columns)
+                        rows.append(data)
+                    
+                    if not rows:
+                        break
+                    
+                    # executemany needs the same keys in every parameter set
+                    keys = sorted(chunk_keys)
+                    params = [
+                        {key: data[key] if key in data else columns[key] for key in keys}
+                        for data in rows
+                    ]
+                    update_columns = [key for key in keys if key != 'transaction_hash']
+                    # Groups of existing rows the upsert may overwrite
+                    replaced_keys = set()
+                    if on_duplicate == "update":
+                        hashes = [data['transaction_hash'] for data in rows if data.get('transaction_hash')]
+                        if hashes:
+                            replaced_keys = rollup.keys_where(BankTransaction.transaction_hash.in_(hashes))
+                    result = db.session.execute(_build_insert_statement(on_duplicate, update_columns), params)
+                    skipped = (
+                        on_duplicate == "ignore"
+                        and result.rowcount is not None
+                        and 0 <= result.rowcount < len(rows)
+                    )
+                    if skipped and attempt <= SKIPPED_ROW_RECHECKS:
+                        # Another session stored some of the hashes after the duplicate check, so
+                        # INSERT IGNORE skipped those rows. Undo the chunk and check its hashes
+                        # against the database again, so they are reported as duplicates, not saved
+                        logger.info(f"Database skipped {len(rows) - result.rowcount} rows of chunk at {start}, rechecking")
+                        db.session.rollback()
+                        existing = TransactionService.find_existing_hashes(data.get('transaction_hash') for data in chunk)
+                        duplicate_rows = TransactionService._batch_duplicates(chunk, existing)
+                        continue
+                    
+                    record_inserted(rows)
+                    if on_duplicate == "update" or result.rowcount != len(rows):
+                        # Skipped or overwritten rows must not be counted twice, recompute their groups
+                        rollup.refresh_groups(replaced_keys | {
+                            rollup.rollup_key(data.get('user_id'), data.get('bank_account_id'), data.get('category_id'), data.get('booking_date'))
+                            for data in rows
+                        })
+                    else:
+                        rollup.add_rows(rows)
+                    db.session.commit()
+                    if skipped:
+                        # Still short after the rechecks: count only what the database inserted
+                        logger.warning(f"Database skipped {len(rows) - result.rowcount} rows of chunk at {start}")
+                        rows = rows[:result.rowcount]
+                    saved_rows.extend(rows)
+                    logger.debug(f"Committed chunk of {len(rows)} transactions at offset {start}")
+                    break
+                
+                if duplicates is not None:
+                    duplicates.extend(
+                        {
+                            "index": start + i,
+                            "transaction_hash": chunk[i]['transaction_hash'],
+                            "reason": reason,
+                        }
+                        for i, reason in sorted(duplicate_rows.items())
+                    )
+            
+            for key in sorted(unknown_keys):
+                logger.warning(f"Attribute '{key}' in transaction data does not exist on BankTransaction model")
+            logger.info(f"Successfully bulk saved {len(saved_rows)} transactions")
+            return saved_rows
+            
+        except Exception as e:
+            logger.error(f"Database error while bulk saving transactions: {str(e)}")
+            logger.error(f"Stack trace: {traceback.format_exc()}")
+            db.session.rollback()
+            raise
+    
+    @staticmethod
+    @with_consistent_session
+    def import_and_save_transactions(
+        transaction_data_list: List[Dict[str, Any]],
+        duplicates: Optional[List[Dict[str, Any]]] = None,
+        bulk: Optional[bool] = None,
+        stats: Optional[Dict[str, int]] = None
+    ) -> List[Union[BankTransaction, Dict[str, Any]]]:
         """
         Process and save a list of transaction data.
         
         Args:
             transaction_data_list: List of dictionaries containing transaction data
+            duplicates: Optional list that receives one entry per skipped duplicate row
+            bulk: Use the executemany write path (defaults to config.IMPORT_BULK_INSERT)
+            stats: Optional counters dict, incremented with the number of rows
+                   "parsed", "deduplicated", "categorized" and "inserted"
             
         Returns:
-            List of created BankTransaction objects
+            List of created BankTransaction objects, or the inserted data rows in bulk mode
         """
+        if bulk is None:
+            bulk = config.IMPORT_BULK_INSERT
         logger.info(f"Starting import and save of {len(transaction_data_list)} transactions")
         
+        start = time.perf_counter()
         try:
             # First process the data through middlewares
-            processed_data = TransactionService.process_import_data(transaction_data_list)
+            with transaction_pipeline.measure_run() as pipeline_stats:
+                processed_data = TransactionService.process_import_data(transaction_data_list)
+            if pipeline_stats:
+                logger.info(f"Pipeline stats: {transaction_pipeline.format_stats(pipeline_stats)}")
             
             # Then save to database
-            result = TransactionService.save_transactions(processed_data)
+            batch_duplicates = []
+            if bulk:
+                result = TransactionService.bulk_save_transactions(processed_data, batch_duplicates)
+            else:
+                result = TransactionService.save_transactions(processed_data, batch_duplicates)
+            
+            if duplicates is not None:
+                duplicates.extend(batch_duplicates)
+            if stats is not None:
+                duplicate_indexes = {duplicate["index"] for duplicate in batch_duplicates}
+                stats["parsed"] = stats.get("parsed", 0) + len(transaction_data_list)
+                stats["deduplicated"] = stats.get("deduplicated", 0) + len(batch_duplicates)
+                stats["categorized"] = stats.get("categorized", 0) + sum(
+                    1 for i, data in enumerate(processed_data)
+                    if data.get("category_id") and i not in duplicate_indexes
+                )
+                stats["inserted"] = stats.get("inserted", 0) + len(result)
+            
+            metrics.import_rows.inc(len(transaction_data_list), stage="parsed")
+            metrics.import_rows.inc(len(batch_duplicates), stage="deduplicated")
+            metrics.import_rows.inc(len(result), stage="inserted")
+            metrics.import_seconds.inc(time.perf_counter() - start)
             
             logger.info(f"Successfully imported and saved {len(result)} transactions")
             return result
@@ -175,52 +466,109 @@ class TransactionService:
             db.session.rollback()
             raise
     
+    @staticmethod
+    def import_transaction_stream(
+        transaction_data: Iterable[Dict[str, Any]],
+        chunk_size: Optional[int] = None,
+        duplicates: Optional[List[Dict[str, Any]]] = None,
+        stats: Optional[Dict[str, int]] = None,
+        progress: Optional[Callable[[Dict[str, int]], None]] = None
+    ) -> int:
+        """
+        Import a stream of transaction data in fixed-size chunks.
+        Each chunk is processed and saved before the next one is read, so memory
+        usage does not depend on the length of the stream.
+        
+        Chunks are committed as they are saved, the import is not all-or-nothing: if
+        the stream raises (e.g. CsvImportError for a malformed row), the chunks before
+        the failing one stay imported and the failing chunk is not saved. After the
+        error, stats["parsed"] is the number of leading rows that were committed
+        (inserted or skipped as duplicates) and stats["inserted"] the rows inserted.
+        
+        Args:
+            transaction_data: Iterable of dictionaries containing transaction data
+            chunk_size: Rows per chunk (defaults to config.IMPORT_CHUNK_SIZE)
+            duplicates: Optional list that receives one entry per skipped duplicate row,
+                        indexed by position in the whole stream
+            stats: Optional counters dict, see import_and_save_transactions
+            progress: Optional callback invoked with the counters after each chunk
+            
+        Returns:
+            Number of transactions inserted
+        """
+        from app.utils.csv_import import chunked
+        
+        chunk_size = chunk_size or config.IMPORT_CHUNK_SIZE
+        stats = stats if stats is not None else {}
+        parsed_count = 0
+        inserted_count = 0
+        
+        for chunk in chunked(transaction_data, chunk_size):
+            logger.debug(f"Importing chunk of {len(chunk)} transactions")
+            chunk_duplicates = []
+            saved = TransactionService.import_and_save_transactions(
+                chunk, chunk_duplicates, stats=stats
+            )
+            if duplicates is not None:
+                for duplicate in chunk_duplicates:
+                    duplicate["index"] += parsed_count
+                duplicates.extend(chunk_duplicates)
+            parsed_count += len(chunk)
+            inserted_count += len(saved)
+            if progress:
+                progress(stats)
+        
+        return inserted_count
+    
     @staticmethod
     @with_consistent_session
-    def process_existing_transactions(filter_func: Optional[Callable[[BankTransaction], bool]] = None) -> int:
+    def process_existing_transactions(
+        transaction_filter: Optional[TransactionFilter] = None,
+        filter_func: Optional[Callable[[BankTransaction], bool]] = None,
+        chunk_size: Optional[int] = None,
+    ) -> int:
         """
         Process existing transactions in the database through the middleware pipeline.
+        Transactions are selected in SQL, streamed in chunks and committed per chunk.
         
         Args:
-            filter_func: Optional function to filter which transactions to process
+            transaction_filter: Optional filter selecting which transactions to process
+            filter_func: Optional additional Python predicate, applied to the selected transactions
+            chunk_size: Transactions per chunk, defaults to config.PROCESS_CHUNK_SIZE
             
         Returns:
             Number of transactions processed
         """
-        logger.info("Processing existing transactions through middleware pipeline")
+        chunk_size = chunk_size or config.PROCESS_CHUNK_SIZE
+        logger.info(f"Processing existing transactions through middleware pipeline ({transaction_filter or 'all'})")
         
         try:
-            # Query relevant transactions
-            query = BankTransaction.query
-            
-            if filter_func:
-                transactions = [tx for tx in query.all() if filter_func(tx)]
-                logger.info(f"Filtered {len(transactions)} transactions to process")
-            else:
-                transactions = query.all()
-                logger.info(f"Processing all {len(transactions)} transactions")
-            
-            # Process each transaction through the pipeline
             processed_count = 0
-            for transaction in transactions:
+            for chunk in iter_transaction_chunks(transaction_filter, chunk_size):
+                if filter_func:
+                    chunk = [tx for tx in chunk if filter_func(tx)]
+                
+                # Process the chunk through the pipeline, stage by stage
                 try:
-                    transaction_pipeline.process_transaction(transaction)
-                    processed_count += 1
-                    
-                    # Log progress periodically
-                    if processed_count % 100 == 0:
-                        logger.info(f"Processed {processed_count} of {len(transactions)} transactions")
-                        
+                    transaction_pipeline.process_bulk(chunk)
+                    processed_count += len(chunk)
                 except Exception as e:
-                    logger.error(f"Error processing transaction {transaction.id}: {str(e)}")
-                    logger.error(f"Stack trace: {traceback.format_exc()}")
-                    # Continue processing other transactions
-            
-            # Commit the changes
-            logger.info(f"Committing changes for {processed_count} processed transactions")
-            db.session.commit()
+                    logger.error(f"Error processing chunk, retrying transaction by transaction: {str(e)}")
+                    for transaction in chunk:
+                        try:
+                            transaction_pipeline.process_transaction(transaction)
+                            processed_count += 1
+                        except Exception as e:
+                            logger.error(f"Error processing transaction {transaction.id}: {str(e)}")
+                            logger.error(f"Stack trace: {traceback.format_exc()}")
+                            # Continue processing other transactions
+                
+                # Commit the chunk so memory and lock time stay bounded
+                db.session.commit()
+                logger.info(f"Processed {processed_count} transactions so far")
             
-            return len(transactions)
+            logger.info(f"Committed changes for {processed_count} processed transactions")
+            return processed_count
             
         except Exception as e:
             logger.error(f"Error in process_existing_transactions: {str(e)}")
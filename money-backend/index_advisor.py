@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Index Advisor CLI
+
+Runs EXPLAIN over the query shapes of the hot transaction routes against the
+configured database (DATABASE_URI) and flags full scans of large tables.
+Exits with status 1 if any query needs a full scan, so it can run in CI.
+
+Usage:
+    python index_advisor.py                 # check the configured database
+    python index_advisor.py --seed 100000   # fill an empty database first
+    python index_advisor.py --verbose       # print the SQL and plan of every query
+"""
+import argparse
+import sys
+
+from app import create_app
+from app.models.db import db
+from app.utils.index_advisor import explain_route_queries, seed_transactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flag route queries that would scan whole tables.')
+    parser.add_argument('--seed', type=int, default=0, help='Create this many synthetic transactions first (empty database only)')
+    parser.add_argument('--create-tables', action='store_true', help='Create missing tables first (scratch databases)')
+    parser.add_argument('--verbose', action='store_true', help='Print the SQL and plan of every query')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.create_tables:
+            db.create_all()
+        if args.seed:
+            seed_transactions(args.seed)
+
+        results = explain_route_queries()
+        failures = 0
+        for result in results:
+            status = f"FULL SCAN ({', '.join(result['full_scans'])})" if result['full_scans'] else "ok"
+            print(f"{result['name']:<36} {status}")
+            if args.verbose or result['full_scans']:
+                print(f"    {result['sql']}".replace("\n", " "))
+                for step in result['plan']:
+                    print(f"      {step}")
+            failures += bool(result['full_scans'])
+
+        print(f"{len(results)} queries checked, {failures} with full scans")
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""add category_closure table
+
+Revision ID: 5e92c0a7b1f4
+Revises: d4b8e6f13a70
+Create Date: 2026-10-17 18:11:09.562083
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e92c0a7b1f4'
+down_revision = 'd4b8e6f13a70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    closure = op.create_table('category_closure',
+    sa.Column('ancestor_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('descendant_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['category.id'], ),
+    sa.ForeignKeyConstraint(['descendant_id'], ['category.id'], ),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    with op.batch_alter_table('category_closure', schema=None) as batch_op:
+        batch_op.create_index('ix_category_closure_descendant_id', ['descendant_id'], unique=False)
+
+    # Backfill by walking the parent links of the existing categories
+    category = sa.table('category', sa.column('id', sa.Integer()), sa.column('parent_id', sa.Integer()))
+    parents = dict(op.get_bind().execute(sa.select(category.c.id, category.c.parent_id)).all())
+    rows = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id in parents and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append({'ancestor_id': ancestor_id, 'descendant_id': category_id, 'depth': depth})
+            ancestor_id, depth = parents[ancestor_id], depth + 1
+    if rows:
+        op.bulk_insert(closure, rows)
+
+
+def downgrade():
+    with op.batch_alter_table('category_closure', schema=None) as batch_op:
+        batch_op.drop_index('ix_category_closure_descendant_id')
+
+    op.drop_table('category_closure')
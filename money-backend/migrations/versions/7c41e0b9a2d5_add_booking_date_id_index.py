@@ -0,0 +1,26 @@
+"""add (booking_date, id) index for keyset pagination
+
+Revision ID: 7c41e0b9a2d5
+Revises: 3f2a9c71d4e8
+Create Date: 2026-10-17 14:05:12.731940
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c41e0b9a2d5'
+down_revision = '3f2a9c71d4e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        batch_op.create_index('ix_bank_transaction_booking_date_id', ['booking_date', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_bank_transaction_booking_date_id')
@@ -0,0 +1,55 @@
+"""add full-text search index on bank_transaction
+
+Revision ID: a61f3d8c2e57
+Revises: 5e92c0a7b1f4
+Create Date: 2026-10-17 19:28:44.105372
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a61f3d8c2e57'
+down_revision = '5e92c0a7b1f4'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of the FTS5 table and its triggers as of this revision; later changes to
+# app.utils.search must not change what this migration creates
+FTS_TABLE = 'bank_transaction_fts'
+FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS bank_transaction_fts USING fts5("
+    "payee, payer, purpose, content='bank_transaction', content_rowid='id', tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS bank_transaction_fts_ai AFTER INSERT ON bank_transaction BEGIN
+        INSERT INTO bank_transaction_fts(rowid, payee, payer, purpose) VALUES (new.id, new.payee, new.payer, new.purpose);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS bank_transaction_fts_ad AFTER DELETE ON bank_transaction BEGIN
+        INSERT INTO bank_transaction_fts(bank_transaction_fts, rowid, payee, payer, purpose) VALUES ('delete', old.id, old.payee, old.payer, old.purpose);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS bank_transaction_fts_au AFTER UPDATE OF payee, payer, purpose ON bank_transaction BEGIN
+        INSERT INTO bank_transaction_fts(bank_transaction_fts, rowid, payee, payer, purpose) VALUES ('delete', old.id, old.payee, old.payer, old.purpose);
+        INSERT INTO bank_transaction_fts(rowid, payee, payer, purpose) VALUES (new.id, new.payee, new.payer, new.purpose);
+    END""",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.create_index('ft_bank_transaction_search', 'bank_transaction', ['payee', 'payer', 'purpose'],
+                        unique=False, mysql_prefix='FULLTEXT')
+    elif dialect == 'sqlite':
+        for statement in FTS_DDL:
+            op.execute(statement)
+        op.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.drop_index('ft_bank_transaction_search', table_name='bank_transaction')
+    elif dialect == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
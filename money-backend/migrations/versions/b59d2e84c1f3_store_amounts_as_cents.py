@@ -0,0 +1,142 @@
+"""store transaction amounts as integer cents
+
+Revision ID: b59d2e84c1f3
+Revises: e3c7a9150b6d
+Create Date: 2026-10-17 21:36:52.817094
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b59d2e84c1f3'
+down_revision = 'e3c7a9150b6d'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of the FTS5 triggers as of this revision (see a61f3d8c2e57), independent of app.utils.search
+FTS_TABLE = 'bank_transaction_fts'
+FTS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS bank_transaction_fts_ai AFTER INSERT ON bank_transaction BEGIN
+        INSERT INTO bank_transaction_fts(rowid, payee, payer, purpose) VALUES (new.id, new.payee, new.payer, new.purpose);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS bank_transaction_fts_ad AFTER DELETE ON bank_transaction BEGIN
+        INSERT INTO bank_transaction_fts(bank_transaction_fts, rowid, payee, payer, purpose) VALUES ('delete', old.id, old.payee, old.payer, old.purpose);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS bank_transaction_fts_au AFTER UPDATE OF payee, payer, purpose ON bank_transaction BEGIN
+        INSERT INTO bank_transaction_fts(bank_transaction_fts, rowid, payee, payer, purpose) VALUES ('delete', old.id, old.payee, old.payer, old.purpose);
+        INSERT INTO bank_transaction_fts(rowid, payee, payer, purpose) VALUES (new.id, new.payee, new.payer, new.purpose);
+    END""",
+]
+
+# Rows per UPDATE when converting the amounts, so no single statement locks the whole table
+CHUNK_SIZE = 10000
+
+transaction = sa.table('bank_transaction',
+    sa.column('id', sa.Integer()),
+    sa.column('user_id', sa.Integer()),
+    sa.column('bank_account_id', sa.Integer()),
+    sa.column('category_id', sa.Integer()),
+    sa.column('booking_date', sa.Date()),
+    sa.column('amount', sa.Float()),
+    sa.column('amount_cents', sa.BigInteger()),
+)
+
+
+def _update_in_chunks(values):
+    bind = op.get_bind()
+    first, last = bind.execute(sa.select(sa.func.min(transaction.c.id), sa.func.max(transaction.c.id))).one()
+    if first is None:
+        return
+    for start in range(first, last + 1, CHUNK_SIZE):
+        bind.execute(
+            transaction.update()
+            .where(transaction.c.id >= start, transaction.c.id < start + CHUNK_SIZE)
+            .values(**values)
+        )
+
+
+def _restore_search_triggers():
+    # Batch mode recreates bank_transaction on SQLite, which drops the triggers of the FTS5 table
+    if op.get_bind().dialect.name == 'sqlite':
+        found = op.get_bind().execute(
+            sa.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+        ).first()
+        if found:
+            for statement in FTS_TRIGGERS:
+                op.execute(statement)
+
+
+def _create_rollup(amount_type, total, minimum, maximum, amount):
+    rollup = op.create_table('transaction_rollup',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('bank_account_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('category_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('year_month', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column(total, amount_type, nullable=False),
+    sa.Column('transaction_count', sa.Integer(), nullable=False),
+    sa.Column(minimum, amount_type, nullable=True),
+    sa.Column(maximum, amount_type, nullable=True),
+    sa.PrimaryKeyConstraint('user_id', 'bank_account_id', 'category_id', 'year_month')
+    )
+    with op.batch_alter_table('transaction_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_transaction_rollup_year_month', ['year_month'], unique=False)
+
+    # Backfill from the existing transactions
+    keys = [
+        sa.func.coalesce(transaction.c.user_id, 0),
+        sa.func.coalesce(transaction.c.bank_account_id, 0),
+        sa.func.coalesce(transaction.c.category_id, 0),
+        sa.func.coalesce(
+            sa.extract('year', transaction.c.booking_date) * 100 + sa.extract('month', transaction.c.booking_date), 0
+        ),
+    ]
+    op.execute(
+        rollup.insert().from_select(
+            ['user_id', 'bank_account_id', 'category_id', 'year_month',
+             total, 'transaction_count', minimum, maximum],
+            sa.select(
+                *keys,
+                sa.func.coalesce(sa.func.sum(amount), 0),
+                sa.func.count(),
+                sa.func.min(amount),
+                sa.func.max(amount),
+            ).group_by(*keys)
+        )
+    )
+
+
+def _drop_rollup():
+    with op.batch_alter_table('transaction_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_rollup_year_month')
+
+    op.drop_table('transaction_rollup')
+
+
+def upgrade():
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('amount_cents', sa.BigInteger(), nullable=True))
+
+    _update_in_chunks({'amount_cents': sa.func.round(transaction.c.amount * 100)})
+
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        batch_op.drop_column('amount')
+    _restore_search_triggers()
+
+    _drop_rollup()
+    _create_rollup(sa.BigInteger(), 'total_cents', 'min_cents', 'max_cents', transaction.c.amount_cents)
+
+
+def downgrade():
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('amount', sa.Float(), nullable=True))
+
+    _update_in_chunks({'amount': transaction.c.amount_cents / sa.literal_column('100.0')})
+
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        batch_op.drop_column('amount_cents')
+    _restore_search_triggers()
+
+    _drop_rollup()
+    _create_rollup(sa.Float(), 'total_amount', 'min_amount', 'max_amount', transaction.c.amount)
@@ -0,0 +1,174 @@
+"""add hash_version and rehash transactions with the versioned fingerprint
+
+Downgrading drops hash_version but leaves the BLAKE2b fingerprints in
+transaction_hash: the former MD5 hashes cannot be restored. The code of the
+previous revision computes MD5 hashes on import, so it does not recognize
+reimports of transactions that were rehashed here until it rehashes them itself
+(python -m app.utils.generate_transaction_hashes of that code).
+
+Revision ID: c8a41f6d2b97
+Revises: b59d2e84c1f3
+Create Date: 2026-10-17 22:41:08.930215
+
+"""
+import os
+from datetime import date, datetime
+from hashlib import blake2b
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8a41f6d2b97'
+down_revision = 'b59d2e84c1f3'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of the FTS5 triggers as of this revision (see a61f3d8c2e57), independent of app.utils.search
+FTS_TABLE = 'bank_transaction_fts'
+FTS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS bank_transaction_fts_ai AFTER INSERT ON bank_transaction BEGIN
+        INSERT INTO bank_transaction_fts(rowid, payee, payer, purpose) VALUES (new.id, new.payee, new.payer, new.purpose);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS bank_transaction_fts_ad AFTER DELETE ON bank_transaction BEGIN
+        INSERT INTO bank_transaction_fts(bank_transaction_fts, rowid, payee, payer, purpose) VALUES ('delete', old.id, old.payee, old.payer, old.purpose);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS bank_transaction_fts_au AFTER UPDATE OF payee, payer, purpose ON bank_transaction BEGIN
+        INSERT INTO bank_transaction_fts(bank_transaction_fts, rowid, payee, payer, purpose) VALUES ('delete', old.id, old.payee, old.payer, old.purpose);
+        INSERT INTO bank_transaction_fts(rowid, payee, payer, purpose) VALUES (new.id, new.payee, new.payer, new.purpose);
+    END""",
+]
+
+# Frozen copy of fingerprint version 2 (app.utils.fingerprint as of this revision), so later
+# versions of the fingerprint do not change what this migration writes
+FINGERPRINT_VERSION = 2
+DUPLICATE_HASH_VERSION = -2
+FINGERPRINT_FIELDS = (
+    'booking_date', 'value_date', 'amount_cents', 'payee', 'payer', 'purpose', 'transaction_type', 'iban',
+)
+BACKFILL_CHUNK_SIZE = 5000
+LOOKUP_CHUNK_SIZE = 500
+
+transaction = sa.table('bank_transaction',
+    sa.column('id', sa.Integer()),
+    sa.column('booking_date', sa.Date()),
+    sa.column('value_date', sa.Date()),
+    sa.column('amount_cents', sa.BigInteger()),
+    sa.column('payee', sa.String()),
+    sa.column('payer', sa.String()),
+    sa.column('purpose', sa.Text()),
+    sa.column('transaction_type', sa.String()),
+    sa.column('iban', sa.String()),
+    sa.column('transaction_hash', sa.String()),
+    sa.column('hash_version', sa.SmallInteger()),
+)
+
+
+def _base_digest():
+    # FINGERPRINT_KEY is deployment configuration, loaded from .env by the app like at runtime
+    key = os.environ.get('FINGERPRINT_KEY', '').encode('utf-8')
+    if len(key) > blake2b.MAX_KEY_SIZE:
+        key = blake2b(key).digest()
+    return blake2b(digest_size=16, key=key, person=b'money-tx-fp-v2')
+
+
+def _canonical(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.strip()
+    return str(value)
+
+
+def _backfill_chunk(bind, base_digest, after_id):
+    """
+    Rehash the next chunk; duplicates of a stored fingerprint keep their hash and
+    are marked with DUPLICATE_HASH_VERSION. Returns the last id or None.
+    """
+    c = transaction.c
+    rows = bind.execute(
+        sa.select(c.id, *(c[name] for name in FINGERPRINT_FIELDS))
+        .where(c.id > after_id, sa.or_(
+            c.hash_version.is_(None), c.hash_version.not_in((FINGERPRINT_VERSION, DUPLICATE_HASH_VERSION))
+        ))
+        .order_by(c.id)
+        .limit(BACKFILL_CHUNK_SIZE)
+    ).all()
+    if not rows:
+        return None
+
+    new_hashes = {}
+    for row in rows:
+        digest = base_digest.copy()
+        digest.update('\x1f'.join(_canonical(value) for value in row[1:]).encode('utf-8'))
+        new_hashes[row[0]] = digest.hexdigest()
+
+    holders = {}
+    hashes = list(set(new_hashes.values()))
+    for start in range(0, len(hashes), LOOKUP_CHUNK_SIZE):
+        holders.update(
+            (transaction_hash, transaction_id)
+            for transaction_id, transaction_hash in bind.execute(
+                sa.select(c.id, c.transaction_hash).where(c.transaction_hash.in_(hashes[start:start + LOOKUP_CHUNK_SIZE]))
+            )
+        )
+
+    params = []
+    duplicates = []
+    for transaction_id, transaction_hash in new_hashes.items():
+        holder = holders.get(transaction_hash)
+        if holder is not None and holder != transaction_id:
+            duplicates.append(transaction_id)
+            continue
+        holders[transaction_hash] = transaction_id
+        params.append({'_id': transaction_id, '_hash': transaction_hash})
+    if params:
+        bind.execute(
+            transaction.update()
+            .where(c.id == sa.bindparam('_id'))
+            .values(transaction_hash=sa.bindparam('_hash'), hash_version=FINGERPRINT_VERSION),
+            params,
+        )
+    if duplicates:
+        bind.execute(
+            transaction.update().where(c.id.in_(duplicates)).values(hash_version=DUPLICATE_HASH_VERSION)
+        )
+    return rows[-1][0]
+
+
+def _restore_search_triggers():
+    # Batch mode may recreate bank_transaction on SQLite, which drops the triggers of the FTS5 table
+    if op.get_bind().dialect.name == 'sqlite':
+        found = op.get_bind().execute(
+            sa.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+        ).first()
+        if found:
+            for statement in FTS_TRIGGERS:
+                op.execute(statement)
+
+
+def upgrade():
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('hash_version', sa.SmallInteger(), nullable=True))
+
+    _restore_search_triggers()
+
+    # Imports only recognize current fingerprints, so rehash the stored transactions right away.
+    # Duplicates keep their MD5 hash and are marked with DUPLICATE_HASH_VERSION
+    base_digest = _base_digest()
+    last_id = 0
+    while last_id is not None:
+        last_id = _backfill_chunk(op.get_bind(), base_digest, last_id)
+
+
+def downgrade():
+    # The BLAKE2b fingerprints stay in transaction_hash, the former MD5 hashes cannot be restored
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        batch_op.drop_column('hash_version')
+
+    _restore_search_triggers()
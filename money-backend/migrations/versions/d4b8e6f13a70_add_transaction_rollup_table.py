@@ -0,0 +1,69 @@
+"""add transaction_rollup table
+
+Revision ID: d4b8e6f13a70
+Revises: 7c41e0b9a2d5
+Create Date: 2026-10-17 16:42:37.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4b8e6f13a70'
+down_revision = '7c41e0b9a2d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    rollup = op.create_table('transaction_rollup',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('bank_account_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('category_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('year_month', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('total_amount', sa.Float(), nullable=False),
+    sa.Column('transaction_count', sa.Integer(), nullable=False),
+    sa.Column('min_amount', sa.Float(), nullable=True),
+    sa.Column('max_amount', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('user_id', 'bank_account_id', 'category_id', 'year_month')
+    )
+    with op.batch_alter_table('transaction_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_transaction_rollup_year_month', ['year_month'], unique=False)
+
+    # Backfill from the existing transactions
+    transaction = sa.table('bank_transaction',
+        sa.column('user_id', sa.Integer()),
+        sa.column('bank_account_id', sa.Integer()),
+        sa.column('category_id', sa.Integer()),
+        sa.column('booking_date', sa.Date()),
+        sa.column('amount', sa.Float()),
+    )
+    keys = [
+        sa.func.coalesce(transaction.c.user_id, 0),
+        sa.func.coalesce(transaction.c.bank_account_id, 0),
+        sa.func.coalesce(transaction.c.category_id, 0),
+        sa.func.coalesce(
+            sa.extract('year', transaction.c.booking_date) * 100 + sa.extract('month', transaction.c.booking_date), 0
+        ),
+    ]
+    op.execute(
+        rollup.insert().from_select(
+            ['user_id', 'bank_account_id', 'category_id', 'year_month',
+             'total_amount', 'transaction_count', 'min_amount', 'max_amount'],
+            sa.select(
+                *keys,
+                sa.func.coalesce(sa.func.sum(transaction.c.amount), 0.0),
+                sa.func.count(),
+                sa.func.min(transaction.c.amount),
+                sa.func.max(transaction.c.amount),
+            ).group_by(*keys)
+        )
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('transaction_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_rollup_year_month')
+
+    op.drop_table('transaction_rollup')
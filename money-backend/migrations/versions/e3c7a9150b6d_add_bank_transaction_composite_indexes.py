@@ -0,0 +1,53 @@
+"""add composite indexes on bank_transaction
+
+Revision ID: e3c7a9150b6d
+Revises: a61f3d8c2e57
+Create Date: 2026-10-17 20:47:15.318420
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3c7a9150b6d'
+down_revision = 'a61f3d8c2e57'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_bank_transaction_user_id_booking_date_id', ['user_id', 'booking_date', 'id']),
+    ('ix_bank_transaction_category_id_booking_date', ['category_id', 'booking_date']),
+    ('ix_bank_transaction_rule_id', ['rule_id']),
+    ('ix_bank_transaction_bank_account_id_booking_date', ['bank_account_id', 'booking_date']),
+]
+
+# Columns with a foreign key, served by the indexes above after the upgrade
+FOREIGN_KEY_COLUMNS = ['user_id', 'category_id', 'rule_id', 'bank_account_id']
+
+
+def upgrade():
+    # MySQL drops the implicit foreign key indexes on these columns once the new indexes can serve the constraints
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('bank_transaction')}
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        for name, columns in INDEXES:
+            if name not in existing:
+                batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        # The implicit foreign key indexes were dropped by the upgrade; MySQL refuses to drop an index
+        # that backs a foreign key (errno 1553), so recreate them under their implicit names first
+        names = {name for name, _ in INDEXES}
+        remaining = [
+            index for index in sa.inspect(op.get_bind()).get_indexes('bank_transaction')
+            if index['name'] not in names
+        ]
+        for column in FOREIGN_KEY_COLUMNS:
+            if not any(index['column_names'][:1] == [column] for index in remaining):
+                op.create_index(column, 'bank_transaction', [column], unique=False)
+
+    with op.batch_alter_table('bank_transaction', schema=None) as batch_op:
+        for name, _ in reversed(INDEXES):
+            batch_op.drop_index(name)
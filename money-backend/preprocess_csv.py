@@ -1,3 +1,6 @@
+# Superseded by the "traderepublic" parser of app/utils/statement_parsers.py: TradeRepublic
+# exports can be uploaded to /api/v1/transactions/import directly. Kept for converting files
+# for older backends.
 import csv
 import os
 from datetime import datetime
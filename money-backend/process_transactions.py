@@ -9,12 +9,14 @@ import argparse
 import sys
 import datetime
 import logging
+import logging.handlers
 import os
 from typing import Optional, List, Dict, Any
 from flask import current_app
 from app import create_app
 from app.models.transaction import BankTransaction
 from app.utils.transaction_service import TransactionService
+from app.utils.transaction_filter import TransactionFilter
 from app.utils.transaction_middleware import transaction_pipeline
 from app.utils.transaction_middlewares import (
     DataCleaningMiddleware,
@@ -65,52 +67,50 @@ def process_transactions(args):
     app = create_app()
     
     with app.app_context():
-        # Build filter function based on arguments
-        filters = []
+        # Build the SQL filter based on arguments
+        filter_args = {}
         
         if args.start_date:
             start_date = parse_date(args.start_date)
             if start_date:
-                filters.append(lambda tx: tx.booking_date >= start_date)
+                filter_args['start_date'] = start_date
                 
         if args.end_date:
             end_date = parse_date(args.end_date)
             if end_date:
-                filters.append(lambda tx: tx.booking_date <= end_date)
+                filter_args['end_date'] = end_date
                 
         if args.category_id:
-            if args.category_id == 'null':
-                filters.append(lambda tx: tx.category_id is None)
-            elif args.category_id == 'not_null':
-                filters.append(lambda tx: tx.category_id is not None)
+            if args.category_id in ('null', 'not_null'):
+                filter_args['category'] = args.category_id
             else:
                 try:
-                    category_id = int(args.category_id)
-                    filters.append(lambda tx: tx.category_id == category_id)
+                    filter_args['category'] = int(args.category_id)
                 except ValueError:
                     logger.error(f"Invalid category ID: {args.category_id}")
                     return
         
         if args.min_amount:
             try:
-                min_amount = float(args.min_amount)
-                filters.append(lambda tx: tx.amount >= min_amount)
+                filter_args['min_amount'] = float(args.min_amount)
             except ValueError:
                 logger.error(f"Invalid min amount: {args.min_amount}")
                 return
                 
         if args.max_amount:
             try:
-                max_amount = float(args.max_amount)
-                filters.append(lambda tx: tx.amount <= max_amount)
+                filter_args['max_amount'] = float(args.max_amount)
             except ValueError:
                 logger.error(f"Invalid max amount: {args.max_amount}")
                 return
+        
+        if args.user_id:
+            filter_args['user_id'] = args.user_id
+            
+        if args.bank_account_id:
+            filter_args['bank_account_id'] = args.bank_account_id
                 
-        # Combine filters with AND logic
-        filter_func = None
-        if filters:
-            filter_func = lambda tx: all(f(tx) for f in filters)
+        transaction_filter = TransactionFilter(**filter_args)
         
         # Configure custom middleware if needed
         if args.only_rules:
@@ -135,7 +135,7 @@ def process_transactions(args):
 
         # Process transactions
         logger.info("Starting transaction processing...")
-        count = TransactionService.process_existing_transactions(filter_func)
+        count = TransactionService.process_existing_transactions(transaction_filter, chunk_size=args.chunk_size)
         logger.info(f"Processed {count} transactions")
 
 def main():
@@ -156,6 +156,9 @@ def main():
     process_parser.add_argument('--category-id', help='Filter by category ID (use "null" for uncategorized, "not_null" for categorized)')
     process_parser.add_argument('--min-amount', help='Minimum transaction amount')
     process_parser.add_argument('--max-amount', help='Maximum transaction amount')
+    process_parser.add_argument('--user-id', type=int, help='Only process transactions of this user')
+    process_parser.add_argument('--bank-account-id', type=int, help='Only process transactions of this bank account')
+    process_parser.add_argument('--chunk-size', type=int, help='Transactions per chunk and commit (default: PROCESS_CHUNK_SIZE)')
     
     # Middleware options
     process_parser.add_argument('--only-rules', action='store_true', help='Only apply categorization rules')
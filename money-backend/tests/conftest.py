@@ -0,0 +1,188 @@
+import importlib.util
+import io
+from datetime import date
+
+import pytest
+
+from app import create_app
+from app.config import config
+from app.config.config import Config
+from app.models import Category, Rule, RuleCondition, User, db
+from app.utils.fingerprint_cache import fingerprint_cache
+from app.utils.transaction_middleware import TransactionMiddlewarePipeline
+from app.utils.transaction_middlewares import (
+    ApplyRulesMiddleware,
+    DataCleaningMiddleware,
+    DateFormattingMiddleware,
+    InternalTransferDetectionMiddleware,
+    TransactionHashMiddleware,
+)
+
+DKB_METADATA = '"Girokonto";"DE11111111111111111111"\n"Zeitraum:";"-"\n"Kontostand";"-"\n""\n'
+DKB_HEADER = (
+    '"Buchungsdatum";"Wertstellung";"Status";"Zahlungspflichtige*r";"Zahlungsempfänger*in";'
+    '"Verwendungszweck";"Umsatztyp";"IBAN";"Betrag (€)";"Gläubiger-ID";"Mandatsreferenz";"Kundenreferenz"\n'
+)
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    METRICS_ENABLED = False
+    IMPORT_JOB_RECOVERY = False
+
+
+# (date, payee, purpose, amount) rows of a small DKB statement
+STATEMENT = [("01.05.24", "Vermieter GmbH", "Miete Mai", "-800,00"), ("02.05.24", "REWE", "Einkauf", "-23,45")]
+
+
+def config_default(monkeypatch, name):
+    """The value of a Config setting when its environment variable is not set."""
+    monkeypatch.delenv(name, raising=False)
+    spec = importlib.util.spec_from_file_location("config_defaults", importlib.import_module("app.config.config").__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module.Config, name)
+
+
+def dkb_csv(rows):
+    """A DKB export of (date, payee, purpose, amount) rows."""
+    lines = [DKB_METADATA, DKB_HEADER]
+    for booking_date, payee, purpose, amount in rows:
+        lines.append(
+            f'"{booking_date}";"{booking_date}";"Gebucht";"Me";"{payee}";"{purpose}";"Ausgang";"DE22";"{amount}";"";"";""\n'
+        )
+    return "".join(lines).encode("utf-8")
+
+
+def post_csv(client, data, user_id, **form):
+    fields = {"file": (io.BytesIO(data), "statement.csv"), "user_id": str(user_id), **form}
+    return client.post("/api/v1/transactions/import", data=fields, content_type="multipart/form-data")
+
+
+def make_rule(category, conditions, logical_operator="AND"):
+    """A stored rule of (field, operator, value) conditions."""
+    rule = Rule(name="Rule", category_id=category.id, logical_operator=logical_operator)
+    rule.conditions = [
+        RuleCondition(field=field, operator=operator, value=value, sequence=sequence)
+        for sequence, (field, operator, value) in enumerate(conditions)
+    ]
+    db.session.add(rule)
+    db.session.commit()
+    return rule
+
+
+# Account of the statement rows, an own account of the pipeline fixture
+OWN_IBAN = "DE11111111111111111111"
+
+
+def statement_row(**values):
+    """A parsed statement row, as the CSV parsers emit it."""
+    transaction = {
+        "booking_date": "01.05.24",
+        "value_date": "02.05.24",
+        "status": "Gebucht",
+        "payer": "Me",
+        "payee": "Edeka",
+        "purpose": "Einkauf",
+        "transaction_type": "Ausgang",
+        "iban": OWN_IBAN,
+        "counterparty_iban": "DE22",
+        "amount_cents": -2345,
+        "creditor_id": "",
+        "mandate_reference": "",
+        "customer_reference": "",
+        "user_id": 1,
+    }
+    transaction.update(values)
+    return transaction
+
+
+def without(key, **values):
+    """A statement row lacking one key."""
+    transaction = statement_row(**values)
+    del transaction[key]
+    return transaction
+
+
+PIPELINE_CASES = {
+    "plain": [statement_row(), statement_row(payee="REWE Markt")],
+    "padded strings": [statement_row(payee="  REWE  ", purpose=" Miete Mai ", payer="\tMe ")],
+    "empty and missing strings": [statement_row(payee="", purpose=None), without("payer")],
+    "euro amount string": [without("amount_cents", amount="-1.234,56")],
+    "euro amount number": [without("amount_cents", amount=-23.45)],
+    "invalid euro amount": [without("amount_cents", amount="kaputt")],
+    "iso datetime": [statement_row(booking_date="2024-05-01T10:30:00", value_date="2024-05-01T10:30:00")],
+    "parsed dates": [statement_row(booking_date=date(2024, 5, 1), value_date=date(2024, 5, 1))],
+    "invalid and empty dates": [
+        statement_row(booking_date="32.13.24", value_date=""),
+        statement_row(value_date=None),
+    ],
+    "saving plan iban": [statement_row(iban=config.TRADEREPUBLIC_SAVING_PLAN_IBAN, counterparty_iban=OWN_IBAN)],
+    "internal transfer": [statement_row(counterparty_iban=config.TRADEREPUBLIC_IBAN)],
+    "non-ascii": [statement_row(payee="Bäckerei Müller", purpose="Brötchen ÄÖÜ")],
+    "exact amount rule": [
+        statement_row(amount_cents=-80000, purpose="Miete Juni"),
+        statement_row(amount_cents=-80001, purpose="Miete Juli"),
+    ],
+    "or rule": [statement_row(payee="Stadtwerke", purpose="Strom"), statement_row(payee="Gaswerk", purpose="Abschlag")],
+    "same row twice": [statement_row(), statement_row()],
+}
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    fingerprint_cache.clear()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(app):
+    user = User(name="Test", email="test@example.com")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def category(app):
+    category = Category(name="Rent")
+    db.session.add(category)
+    db.session.commit()
+    return category
+
+
+@pytest.fixture(params=[False, True], ids=["dicts", "columnar"])
+def import_mode(request, monkeypatch):
+    """Run an import test in dictionary and in columnar middleware mode."""
+    monkeypatch.setattr(config, "IMPORT_COLUMNAR", request.param)
+    return request.param
+
+
+@pytest.fixture
+def pipeline(category):
+    """The default middleware stages with rules on text, amount and date fields."""
+    rules = [
+        make_rule(category, [("payee", "contains", "rewe")]),
+        make_rule(category, [("purpose", "starts_with", "miete"), ("amount", "equals", "-800.0")]),
+        make_rule(category, [("payee", "equals", "stadtwerke"), ("purpose", "ends_with", "schlag")], "OR"),
+        make_rule(category, [("payee", "ends_with", "müller")]),
+        make_rule(category, [("booking_date", "starts_with", "2024-05-01 10")]),
+    ]
+    return TransactionMiddlewarePipeline([
+        DataCleaningMiddleware(),
+        DateFormattingMiddleware(),
+        TransactionHashMiddleware(),
+        InternalTransferDetectionMiddleware([OWN_IBAN, config.TRADEREPUBLIC_IBAN]),
+        ApplyRulesMiddleware(rules),
+    ])
@@ -0,0 +1,40 @@
+from app.models import BankTransaction, db
+from app.utils.rule_sql import apply_rule_to_transactions
+
+from tests.conftest import STATEMENT, dkb_csv, make_rule, post_csv
+
+
+def categorized(category):
+    return {t.purpose: t.rule_id for t in BankTransaction.query.filter_by(category_id=category.id)}
+
+
+def test_amount_rule_matches_on_import(client, user, category, import_mode):
+    rule = make_rule(category, [("amount", "starts_with", "-800")])
+
+    response = post_csv(client, dkb_csv(STATEMENT), user.id)
+
+    assert response.status_code == 201
+    assert categorized(category) == {"Miete Mai": rule.id}
+
+
+def test_amount_rule_matches_when_applied(client, user, category):
+    post_csv(client, dkb_csv(STATEMENT), user.id)
+    rule = make_rule(category, [("amount", "equals", "-800.0")])
+
+    assert apply_rule_to_transactions(rule) == 1
+    db.session.commit()
+
+    assert categorized(category) == {"Miete Mai": rule.id}
+
+
+def test_amount_rule_matches_when_edited(client, user, category):
+    post_csv(client, dkb_csv(STATEMENT), user.id)
+    rule = make_rule(category, [("payee", "equals", "nobody")])
+
+    response = client.put(
+        f"/api/v1/rules/{rule.id}",
+        json={"conditions": [{"field": "amount", "operator": "starts_with", "value": "-800"}]},
+    )
+
+    assert response.status_code == 200
+    assert categorized(category) == {"Miete Mai": rule.id}
@@ -0,0 +1,18 @@
+from app.models import BankTransaction, db
+from app.utils.transaction_service import TransactionService
+
+from tests.conftest import STATEMENT, dkb_csv, post_csv
+
+
+def test_rows_skipped_by_the_database_are_not_counted_as_inserted(client, user, monkeypatch):
+    post_csv(client, dkb_csv(STATEMENT[:1]), user.id)
+
+    # The duplicate check misses the stored row, as if another session inserted it right after the check
+    monkeypatch.setattr(TransactionService, "find_duplicate_transactions", staticmethod(lambda rows: {}))
+    response = post_csv(client, dkb_csv(STATEMENT), user.id)
+
+    body = response.get_json()
+    assert response.status_code == 201
+    assert "1 transactions added, 1 duplicates skipped" in body["message"]
+    assert [duplicate["row"] for duplicate in body["duplicates"]] == [1]
+    assert BankTransaction.query.count() == 2
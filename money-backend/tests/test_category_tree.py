@@ -0,0 +1,116 @@
+import pytest
+from sqlalchemy import select
+
+from app.models import BankTransaction, CategoryClosure, db
+from app.utils import category_tree
+
+
+def create(client, name, parent_id=None):
+    response = client.post("/api/v1/categories/", json={"name": name, "parent_id": parent_id})
+    assert response.status_code == 201
+    return response.get_json()["data"]["id"]
+
+
+def move(client, category_id, parent_id):
+    return client.put(f"/api/v1/categories/{category_id}", json={"parent_id": parent_id})
+
+
+def closure():
+    table = CategoryClosure.__table__
+    return set(db.session.execute(select(table.c.ancestor_id, table.c.descendant_id, table.c.depth)).all())
+
+
+def assert_closure_consistent():
+    """The maintained closure rows are those a rebuild from parent_id writes."""
+    maintained = closure()
+    category_tree.rebuild()
+    assert closure() == maintained
+    db.session.rollback()
+
+
+def subtree(category_id):
+    return set(db.session.scalars(category_tree.descendant_ids(category_id)))
+
+
+@pytest.fixture
+def tree(client):
+    """food > groceries > bakery, and a separate household category."""
+    food = create(client, "Food")
+    groceries = create(client, "Groceries", food)
+    bakery = create(client, "Bakery", groceries)
+    household = create(client, "Household")
+    return {"food": food, "groceries": groceries, "bakery": bakery, "household": household}
+
+
+def test_created_categories_are_in_their_ancestors_subtrees(tree):
+    assert subtree(tree["food"]) == {tree["food"], tree["groceries"], tree["bakery"]}
+    assert subtree(tree["groceries"]) == {tree["groceries"], tree["bakery"]}
+    assert subtree(tree["household"]) == {tree["household"]}
+    assert_closure_consistent()
+
+
+def test_reparenting_moves_the_whole_subtree(client, tree):
+    assert move(client, tree["groceries"], tree["household"]).status_code == 200
+
+    assert subtree(tree["food"]) == {tree["food"]}
+    assert subtree(tree["household"]) == {tree["household"], tree["groceries"], tree["bakery"]}
+    assert_closure_consistent()
+
+    assert move(client, tree["groceries"], None).status_code == 200
+
+    assert subtree(tree["household"]) == {tree["household"]}
+    assert subtree(tree["groceries"]) == {tree["groceries"], tree["bakery"]}
+    assert_closure_consistent()
+
+
+@pytest.mark.parametrize("parent", ["food", "groceries", "bakery"])
+def test_moving_below_own_subtree_is_refused(client, tree, parent):
+    before = closure()
+
+    response = move(client, tree["food"], tree[parent])
+
+    assert response.status_code == 400
+    assert closure() == before
+    assert_closure_consistent()
+
+
+def test_moving_below_missing_parent_is_refused(client, tree):
+    before = closure()
+
+    assert move(client, tree["bakery"], 999).status_code == 400
+    assert closure() == before
+
+
+def test_category_with_children_cannot_be_deleted(client, tree):
+    before = closure()
+
+    response = client.delete(f"/api/v1/categories/{tree['groceries']}")
+
+    assert response.status_code == 400
+    assert closure() == before
+
+
+def test_deleting_a_leaf_removes_it_from_the_tree(client, tree):
+    assert client.delete(f"/api/v1/categories/{tree['bakery']}").status_code == 200
+
+    assert subtree(tree["food"]) == {tree["food"], tree["groceries"]}
+    assert_closure_consistent()
+
+
+@pytest.mark.parametrize(
+    "include_subcategories, expected",
+    [(None, {"Brot", "Milch", "Essen"}), ("true", {"Brot", "Milch", "Essen"}), ("false", {"Essen"})],
+)
+def test_transaction_filter_includes_subcategories(client, user, tree, include_subcategories, expected):
+    for purpose, category in [("Essen", "food"), ("Milch", "groceries"), ("Brot", "bakery"), ("Seife", "household")]:
+        db.session.add(BankTransaction(purpose=purpose, category_id=tree[category], user_id=user.id))
+    db.session.commit()
+    query = {"category_id": tree["food"], "fields": "purpose"}
+    if include_subcategories is not None:
+        query["include_subcategories"] = include_subcategories
+
+    listed = client.get("/api/v1/transactions/", query_string=query).get_json()["data"]
+    by_category = client.get(f"/api/v1/transactions/by-category/{tree['food']}", query_string=query).get_json()
+
+    assert {item["purpose"] for item in listed} == expected
+    assert {item["purpose"] for item in by_category["data"]["transactions"]} == expected
@@ -0,0 +1,24 @@
+import copy
+
+import pytest
+
+from tests.conftest import PIPELINE_CASES
+
+
+def assert_columnar_matches_bulk(pipeline, rows):
+    expected = pipeline.process_bulk(copy.deepcopy(rows))
+    result = pipeline.process_columnar(copy.deepcopy(rows))
+    assert result == expected
+    for expected_row, result_row in zip(expected, result):
+        assert {key: type(value) for key, value in result_row.items()} == {
+            key: type(value) for key, value in expected_row.items()
+        }
+
+
+@pytest.mark.parametrize("rows", PIPELINE_CASES.values(), ids=PIPELINE_CASES.keys())
+def test_columnar_matches_bulk(pipeline, rows):
+    assert_columnar_matches_bulk(pipeline, rows)
+
+
+def test_columnar_matches_bulk_on_mixed_batch(pipeline):
+    assert_columnar_matches_bulk(pipeline, [transaction for rows in PIPELINE_CASES.values() for transaction in rows])
@@ -0,0 +1,123 @@
+import base64
+import json
+from datetime import date
+
+import pytest
+
+from app.models import BankTransaction, Category, db
+
+# (payee, category, amount_cents, booking_date): ties and NULLs in every sort column
+TRANSACTIONS = [
+    ("B", 1, -100, date(2024, 5, 1)),
+    ("A", None, -100, date(2024, 5, 1)),
+    (None, 2, 50, date(2024, 5, 2)),
+    ("B", 1, None, date(2024, 5, 2)),
+    (None, None, 50, date(2024, 5, 1)),
+    ("A", 2, -100, date(2024, 5, 3)),
+    ("C", 1, 2000, date(2024, 5, 3)),
+    ("B", None, -100, date(2024, 5, 1)),
+    (None, 1, None, date(2024, 5, 2)),
+    ("A", 2, 50, date(2024, 5, 4)),
+]
+
+SORTS = {
+    "payee": lambda transaction: transaction.payee,
+    "category_id": lambda transaction: transaction.category_id,
+    "amount": lambda transaction: transaction.amount_cents,
+    "booking_date": lambda transaction: transaction.booking_date,
+    "id": lambda transaction: transaction.id,
+}
+
+
+@pytest.fixture
+def transactions(app):
+    categories = [Category(name="Rent"), Category(name="Food")]
+    db.session.add_all(categories)
+    db.session.flush()
+    transactions = [
+        BankTransaction(
+            payee=payee,
+            category_id=categories[category - 1].id if category else None,
+            amount_cents=amount_cents,
+            booking_date=booking_date,
+        )
+        for payee, category, amount_cents, booking_date in TRANSACTIONS
+    ]
+    db.session.add_all(transactions)
+    db.session.commit()
+    return transactions
+
+
+def expected_ids(transactions, sort_by, sort_order):
+    """(sort column, id) order with NULLs first, reversed for descending order."""
+    key = SORTS[sort_by]
+    ordered = sorted(transactions, key=lambda t: (key(t) is not None, key(t) if key(t) is not None else 0, t.id))
+    ids = [transaction.id for transaction in ordered]
+    return ids[::-1] if sort_order == "desc" else ids
+
+
+def get_page(client, sort_by, sort_order, cursor=""):
+    response = client.get(
+        "/api/v1/transactions/",
+        query_string={"sort_by": sort_by, "sort_order": sort_order, "per_page": 3, "fields": "id", "cursor": cursor},
+    )
+    assert response.status_code == 200
+    body = response.get_json()
+    return [item["id"] for item in body["data"]], body["pagination"]
+
+
+@pytest.mark.parametrize("sort_order", ["asc", "desc"])
+@pytest.mark.parametrize("sort_by", SORTS.keys())
+def test_cursor_pages_forward_and_backward(client, transactions, sort_by, sort_order):
+    pages = []
+    ids, pagination = get_page(client, sort_by, sort_order)
+    assert pagination["prev_cursor"] is None
+    assert pagination["total_items"] == len(TRANSACTIONS)
+    pages.append(ids)
+    while pagination["next_cursor"]:
+        ids, pagination = get_page(client, sort_by, sort_order, pagination["next_cursor"])
+        pages.append(ids)
+
+    assert [id_ for page in pages for id_ in page] == expected_ids(transactions, sort_by, sort_order)
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+
+    # Back from the last page, every page comes out as it did going forward
+    back = [pages[-1]]
+    while pagination["prev_cursor"]:
+        ids, pagination = get_page(client, sort_by, sort_order, pagination["prev_cursor"])
+        back.append(ids)
+    assert back == pages[::-1]
+
+
+def cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "not a cursor!",
+        cursor({"s": "payee", "o": "desc", "v": "A", "i": 1}),
+        cursor({"s": "payee", "o": "desc", "v": "A", "i": "x", "d": "next"}),
+        cursor({"s": "payee", "o": "desc", "v": "A", "i": 1, "d": "sideways"}),
+        cursor({"s": "payee", "o": "desc", "v": 5, "i": 1, "d": "next"}),
+        cursor({"s": "booking_date", "o": "desc", "v": "2024-05-01", "i": 1, "d": "next"}),
+        cursor({"s": "payee", "o": "asc", "v": "A", "i": 1, "d": "next"}),
+    ],
+    ids=["garbage", "missing key", "bad id", "bad direction", "wrong value type", "other column", "other order"],
+)
+def test_invalid_cursor_is_rejected(client, transactions, value):
+    response = client.get(
+        "/api/v1/transactions/", query_string={"sort_by": "payee", "sort_order": "desc", "cursor": value}
+    )
+
+    assert response.status_code == 400
+    assert response.get_json()["status"] == "error"
+
+
+def test_invalid_date_in_cursor_is_rejected(client, transactions):
+    value = cursor({"s": "booking_date", "o": "desc", "v": "yesterday", "i": 1, "d": "next"})
+
+    response = client.get("/api/v1/transactions/", query_string={"sort_by": "booking_date", "cursor": value})
+
+    assert response.status_code == 400
@@ -0,0 +1,81 @@
+from datetime import date
+
+import pytest
+
+from app.models import BankTransaction, db
+from app.utils.fingerprint import (
+    DUPLICATE_HASH_VERSION, FINGERPRINT_VERSION, backfill_chunk, transaction_fingerprint
+)
+from app.utils.generate_transaction_hashes import update_transaction_hashes
+
+
+def legacy(n, purpose):
+    return BankTransaction(
+        booking_date=date(2024, 5, 1), amount_cents=-100, purpose=purpose, iban="DE11", transaction_hash=f"{n:032x}"
+    )
+
+
+@pytest.fixture
+def transactions(app):
+    """Stored transactions with MD5 hashes, two pairs of them duplicates under the new fingerprint."""
+    current = BankTransaction(booking_date=date(2024, 5, 1), amount_cents=-100, purpose="Held", iban="DE11")
+    current.transaction_hash = transaction_fingerprint(current)
+    current.hash_version = FINGERPRINT_VERSION
+    transactions = [
+        current,
+        legacy(1, "A"),
+        legacy(2, "Held"),  # Duplicate of a stored current fingerprint
+        legacy(3, "B"),
+        legacy(4, "B "),  # Duplicate of the previous one, strings are compared stripped
+        legacy(5, "C"),
+    ]
+    db.session.add_all(transactions)
+    db.session.commit()
+    return transactions
+
+
+def versions():
+    return {t.purpose: t.hash_version for t in BankTransaction.query}
+
+
+def test_chunks_resume_after_id_and_mark_duplicates(transactions):
+    connection = db.session.connection()
+    held_id = transactions[0].id
+
+    last_id, updated, duplicates = backfill_chunk(connection, 0, chunk_size=2)
+    assert (updated, duplicates) == (1, [(last_id, held_id)])
+
+    # The next chunk starts after the last id, duplicates split across chunks are found too
+    last_id, updated, duplicates = backfill_chunk(connection, last_id, chunk_size=2)
+    assert (updated, len(duplicates)) == (1, 1)
+    last_id, updated, duplicates = backfill_chunk(connection, last_id, chunk_size=2)
+    assert (updated, duplicates) == (1, [])
+    assert backfill_chunk(connection, last_id, chunk_size=2) == (None, 0, [])
+    db.session.commit()
+
+    stored = BankTransaction.query.all()
+    assert all(t.transaction_hash == transaction_fingerprint(t) for t in stored if t.hash_version == FINGERPRINT_VERSION)
+    assert sorted(t.transaction_hash for t in stored if t.hash_version == DUPLICATE_HASH_VERSION) == [
+        f"{2:032x}", f"{4:032x}"
+    ]
+
+    # Marked duplicates are not selected again, a new run has nothing left to do
+    assert backfill_chunk(db.session.connection(), 0, chunk_size=2) == (None, 0, [])
+
+
+def test_limited_runs_continue_where_the_last_one_stopped(transactions):
+    assert update_transaction_hashes(chunk_size=2, limit=2) == (1, 1)
+    assert update_transaction_hashes(chunk_size=2, limit=2) == (1, 1)
+    assert update_transaction_hashes(chunk_size=2) == (1, 0)
+    assert update_transaction_hashes(chunk_size=2) == (0, 0)
+
+
+def test_duplicates_are_retried_on_request(transactions):
+    update_transaction_hashes()
+    db.session.delete(transactions[0])
+    db.session.commit()
+
+    assert update_transaction_hashes() == (0, 0)
+    assert update_transaction_hashes(retry_duplicates=True) == (1, 1)
+    assert versions() == {"A": FINGERPRINT_VERSION, "Held": FINGERPRINT_VERSION, "B": FINGERPRINT_VERSION,
+                          "B ": DUPLICATE_HASH_VERSION, "C": FINGERPRINT_VERSION}
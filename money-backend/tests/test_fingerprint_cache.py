@@ -0,0 +1,140 @@
+import pytest
+
+from app.config import config
+from app.models import BankTransaction, User, db
+from app.utils import fingerprint_cache as fingerprint_cache_module
+from app.utils.fingerprint_cache import BloomFilter, fingerprint_cache
+from app.utils.transaction_service import TransactionService
+
+from tests.conftest import STATEMENT, dkb_csv, post_csv
+
+
+@pytest.mark.parametrize("bulk", [False, True], ids=["orm", "bulk"])
+def test_fingerprints_of_other_users_are_duplicates(client, user, monkeypatch, bulk):
+    monkeypatch.setattr(config, "FINGERPRINT_CACHE_ENABLED", True)
+    monkeypatch.setattr(config, "IMPORT_BULK_INSERT", bulk)
+    other = User(name="Other", email="other@example.com")
+    db.session.add(other)
+    db.session.commit()
+
+    # Load the cache while the table is empty, then store the statement for one user
+    assert post_csv(client, dkb_csv(STATEMENT), other.id).status_code == 201
+    response = post_csv(client, dkb_csv(STATEMENT), user.id)
+
+    # transaction_hash is unique across users, so the rows are duplicates, not a constraint violation
+    assert response.status_code == 201
+    assert "0 transactions added, 2 duplicates skipped" in response.get_json()["message"]
+    assert BankTransaction.query.count() == 2
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Fingerprints passed to the database lookup of the duplicate check, per call."""
+    monkeypatch.setattr(config, "FINGERPRINT_CACHE_ENABLED", True)
+    calls = []
+    find_existing_hashes = TransactionService.find_existing_hashes
+
+    def counted(hashes):
+        hashes = list(hashes)
+        calls.append(hashes)
+        return find_existing_hashes(hashes)
+
+    monkeypatch.setattr(TransactionService, "find_existing_hashes", staticmethod(counted))
+    return calls
+
+
+def cache_stats(client):
+    response = client.get("/api/v1/pipeline/fingerprint-cache")
+    assert response.status_code == 200
+    return response.get_json()["data"]["stats"]
+
+
+def test_reimport_is_answered_by_the_lru(client, user, lookups):
+    assert post_csv(client, dkb_csv(STATEMENT), user.id).status_code == 201
+    before = cache_stats(client)
+
+    response = post_csv(client, dkb_csv(STATEMENT), user.id)
+
+    assert "0 transactions added, 2 duplicates skipped" in response.get_json()["message"]
+    assert lookups == []
+    after = cache_stats(client)
+    assert after["lru_hit"] - before["lru_hit"] == 2
+    assert after["lookups"] - before["lookups"] == 2
+    assert after["db_hit"] == before["db_hit"]
+    assert after["loaded"] and after["confirmed_fingerprints"] == 2
+
+
+def test_new_rows_are_answered_by_the_bloom_filter(client, user, lookups):
+    before = cache_stats(client)
+
+    assert post_csv(client, dkb_csv(STATEMENT), user.id).status_code == 201
+
+    assert lookups == []
+    after = cache_stats(client)
+    assert after["bloom_negative"] - before["bloom_negative"] == 2
+    assert after["loads"] - before["loads"] == 1
+    assert after["hit_rate"] > 0
+
+
+def test_deleted_rows_can_be_imported_again(client, user, lookups):
+    post_csv(client, dkb_csv(STATEMENT), user.id)
+    deleted = BankTransaction.query.filter_by(purpose="Miete Mai").one()
+    deleted_hash = deleted.transaction_hash
+    db.session.delete(deleted)
+    db.session.commit()
+    before = cache_stats(client)
+
+    response = post_csv(client, dkb_csv(STATEMENT), user.id)
+
+    # The deleted fingerprint left the LRU; the Bloom filter still contains it, so the database decides
+    assert "1 transactions added, 1 duplicates skipped" in response.get_json()["message"]
+    assert lookups == [[deleted_hash]]
+    after = cache_stats(client)
+    assert after["false_positive"] - before["false_positive"] == 1
+    assert after["lru_hit"] - before["lru_hit"] == 1
+    assert BankTransaction.query.count() == 2
+
+
+def test_fingerprints_are_reloaded_after_the_ttl(client, user, lookups, monkeypatch):
+    post_csv(client, dkb_csv(STATEMENT[:1]), user.id)
+    # Store the second row behind the cache's back
+    monkeypatch.setattr(config, "FINGERPRINT_CACHE_ENABLED", False)
+    post_csv(client, dkb_csv(STATEMENT), user.id)
+    monkeypatch.setattr(config, "FINGERPRINT_CACHE_ENABLED", True)
+    loads = cache_stats(client)["loads"]
+    lookups.clear()
+
+    monkeypatch.setattr(fingerprint_cache, "ttl", 0)
+    response = post_csv(client, dkb_csv(STATEMENT), user.id)
+
+    assert "0 transactions added, 2 duplicates skipped" in response.get_json()["message"]
+    assert lookups == []
+    assert cache_stats(client)["loads"] == loads + 1
+
+
+def test_full_bloom_filter_is_reloaded(client, user, lookups, monkeypatch):
+    monkeypatch.setattr(fingerprint_cache_module, "MIN_CAPACITY", 1)
+    # Sized for the empty table, the filter is full after the first commit
+    post_csv(client, dkb_csv(STATEMENT), user.id)
+    loads = cache_stats(client)["loads"]
+
+    post_csv(client, dkb_csv(STATEMENT), user.id)
+    assert cache_stats(client)["loads"] == loads + 1
+
+    # The reloaded filter is sized for the stored rows
+    post_csv(client, dkb_csv(STATEMENT), user.id)
+    assert cache_stats(client)["loads"] == loads + 1
+    assert lookups == []
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(100, 0.01)
+    items = [f"fingerprint-{i}" for i in range(100)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+    assert sum(f"other-{i}" in bloom for i in range(1000)) < 50
+    assert not bloom.full
+    bloom.add("one more")
+    assert bloom.full
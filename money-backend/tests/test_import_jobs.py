@@ -0,0 +1,134 @@
+import os
+
+import pytest
+
+from app.config import config
+from app.models import BankTransaction, ImportJob, db
+from app.utils import import_jobs
+
+from tests.conftest import dkb_csv, post_csv
+
+ROWS = [(f"0{day}.05.24", "REWE", f"Einkauf {day}", f"-{day},00") for day in range(1, 6)]
+
+
+class DeferredExecutor:
+    """Holds submitted jobs until the test runs them."""
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, fn, *args):
+        self.calls.append((fn, args))
+
+    def run(self):
+        for fn, args in self.calls:
+            fn(*args)
+        self.calls = []
+
+
+@pytest.fixture
+def executor(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "IMPORT_SPOOL_DIR", str(tmp_path))
+    executor = DeferredExecutor()
+    monkeypatch.setattr(import_jobs, "_get_executor", lambda: executor)
+    return executor
+
+
+@pytest.fixture
+def progress(monkeypatch):
+    """Status of the job at every progress update."""
+    statuses = []
+    update_job = import_jobs._update_job
+
+    def recording(job, stats):
+        statuses.append(job.status)
+        update_job(job, stats)
+
+    monkeypatch.setattr(import_jobs, "_update_job", recording)
+    return statuses
+
+
+def queue(client, user, rows):
+    response = post_csv(client, dkb_csv(rows), user.id, **{"async": "true"})
+    assert response.status_code == 202
+    return response.get_json()["data"]["job_id"]
+
+
+def get_job(client, job_id):
+    return client.get(f"/api/v1/jobs/{job_id}").get_json()["data"]
+
+
+def test_job_runs_to_completion(client, user, executor, progress, monkeypatch):
+    monkeypatch.setattr(config, "IMPORT_CHUNK_SIZE", 2)
+    job_id = queue(client, user, ROWS)
+    assert get_job(client, job_id)["status"] == "queued"
+    assert len(os.listdir(config.IMPORT_SPOOL_DIR)) == 1
+
+    executor.run()
+
+    job = get_job(client, job_id)
+    assert job["status"] == "completed"
+    assert progress == ["running", "running", "running", "completed"]
+    assert (job["rows_parsed"], job["rows_inserted"], job["rows_deduplicated"]) == (5, 5, 0)
+    assert job["started_at"] and job["finished_at"]
+    assert BankTransaction.query.count() == 5
+    assert os.listdir(config.IMPORT_SPOOL_DIR) == []
+
+
+def test_job_fails_on_malformed_row_with_its_line(client, user, executor, monkeypatch):
+    monkeypatch.setattr(config, "IMPORT_CHUNK_SIZE", 2)
+    rows = ROWS[:4] + [("05.05.24", "REWE", "Einkauf 5", "kaputt")]
+    job_id = queue(client, user, rows)
+
+    executor.run()
+
+    job = get_job(client, job_id)
+    assert job["status"] == "failed"
+    # The two chunks before the failing row stay imported
+    assert (job["rows_parsed"], job["rows_inserted"]) == (4, 4)
+    assert job["errors"] == ["Invalid amount format in row 5: kaputt (line 10)"]
+    assert os.listdir(config.IMPORT_SPOOL_DIR) == []
+
+
+def test_spool_file_is_removed_when_the_result_cannot_be_recorded(client, user, executor, monkeypatch):
+    job_id = queue(client, user, ROWS)
+
+    def failing(job, stats):
+        raise import_jobs.SQLAlchemyError("database is gone")
+
+    monkeypatch.setattr(import_jobs, "_update_job", failing)
+    executor.run()
+
+    assert db.session.get(ImportJob, job_id).status == "running"
+    assert os.listdir(config.IMPORT_SPOOL_DIR) == []
+
+
+def test_spool_file_is_removed_when_the_job_cannot_be_created(client, user, executor, monkeypatch):
+    def failing():
+        raise import_jobs.SQLAlchemyError("database is gone")
+
+    monkeypatch.setattr(db.session, "commit", failing)
+    response = post_csv(client, dkb_csv(ROWS), user.id, **{"async": "true"})
+
+    assert response.status_code == 500
+    assert executor.calls == []
+    assert os.listdir(config.IMPORT_SPOOL_DIR) == []
+
+
+def test_stale_jobs_fail_on_startup(app, user, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "IMPORT_SPOOL_DIR", str(tmp_path))
+    jobs = {status: ImportJob(status=status, user_id=user.id) for status in ("queued", "running", "completed")}
+    db.session.add_all(jobs.values())
+    db.session.commit()
+    (tmp_path / f"{import_jobs.SPOOL_PREFIX}orphan.csv").write_bytes(b"")
+    (tmp_path / "unrelated.txt").write_bytes(b"")
+
+    import_jobs.recover_jobs(app)
+
+    assert {status: db.session.get(ImportJob, job.id).status for status, job in jobs.items()} == {
+        "queued": "failed",
+        "running": "failed",
+        "completed": "completed",
+    }
+    assert db.session.get(ImportJob, jobs["running"].id).errors
+    assert os.listdir(tmp_path) == ["unrelated.txt"]
@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from app.models import db
+
+from tests.conftest import TestConfig, config_default
+
+
+class MetricsConfig(TestConfig):
+    METRICS_ENABLED = True
+    METRICS_TOKEN = ""
+
+
+class TokenConfig(MetricsConfig):
+    METRICS_TOKEN = "scrape-secret"
+
+
+@pytest.fixture
+def metrics_app():
+    app = create_app(MetricsConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_metrics_are_disabled_by_default(monkeypatch, client):
+    assert config_default(monkeypatch, "METRICS_ENABLED") is False
+    assert client.get("/metrics").status_code == 404
+
+
+def test_exposition(metrics_app):
+    client = metrics_app.test_client()
+    assert client.get("/api/v1/categories/").status_code == 200
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type == "text/plain; version=0.0.4; charset=utf-8"
+    body = response.get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_request_duration_seconds_count{endpoint="categories.get_categories",method="GET",status="200"}' in body
+    assert 'http_request_db_queries_bucket{endpoint="categories.get_categories",le="+Inf"}' in body
+    assert "# TYPE db_queries_total counter" in body
+    assert "db_pool_checkout_seconds_count" in body
+
+
+def test_failed_statements_leave_no_query_timer(metrics_app):
+    with db.engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text("SELECT * FROM missing_table"))
+            connection.rollback()
+        connection.execute(text("SELECT 1"))
+
+        assert "query_start" not in connection.info
+
+
+def test_token_is_required_when_set():
+    app = create_app(TokenConfig)
+    with app.app_context():
+        client = app.test_client()
+
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
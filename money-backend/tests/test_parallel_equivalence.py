@@ -0,0 +1,55 @@
+import copy
+
+import pytest
+
+from app.models import BankTransaction
+from app.utils import parallel_pipeline
+from app.utils.transaction_middleware import TransactionMiddlewarePipeline
+
+from tests.conftest import PIPELINE_CASES
+
+COLUMNS = [column.key for column in BankTransaction.__table__.columns]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def worker_pool():
+    yield
+    parallel_pipeline._reset_executor()
+
+
+def sharded(pipeline):
+    """The same stages, run in two worker processes for any batch size."""
+    return TransactionMiddlewarePipeline(pipeline.middlewares, parallel_workers=2, parallel_threshold=1)
+
+
+def stored(rows):
+    """Unsaved BankTransactions of statement rows, as process_db_transactions passes them."""
+    return [BankTransaction(**{key: value for key, value in row.items() if key in COLUMNS}) for row in rows]
+
+
+def column_values(transactions):
+    return [{name: getattr(transaction, name) for name in COLUMNS} for transaction in transactions]
+
+
+ALL_ROWS = [transaction for rows in PIPELINE_CASES.values() for transaction in rows]
+BATCHES = {**PIPELINE_CASES, "mixed batch": ALL_ROWS}
+
+
+@pytest.mark.parametrize("rows", BATCHES.values(), ids=BATCHES.keys())
+def test_parallel_matches_bulk_on_dicts(pipeline, rows):
+    expected = pipeline.process_bulk(copy.deepcopy(rows))
+    result = sharded(pipeline).process_bulk(copy.deepcopy(rows))
+    assert result == expected
+
+
+@pytest.mark.parametrize("rows", BATCHES.values(), ids=BATCHES.keys())
+def test_parallel_matches_bulk_on_stored_transactions(pipeline, rows):
+    expected = pipeline.process_bulk(stored(rows))
+    result = sharded(pipeline).process_bulk(stored(rows))
+    assert column_values(result) == column_values(expected)
+
+
+def test_parallel_updates_the_original_objects(pipeline):
+    transactions = stored(ALL_ROWS)
+    result = sharded(pipeline).process_bulk(transactions)
+    assert all(processed is original for processed, original in zip(result, transactions))
@@ -0,0 +1,129 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+from app.models import BankTransaction, TransactionRollup, User, db
+from app.utils import rollup
+from app.utils.rule_sql import apply_rule_to_transactions
+
+from tests.conftest import dkb_csv, make_rule, post_csv
+
+ROWS = [
+    ("30.04.24", "Vermieter GmbH", "Miete April", "-800,00"),
+    ("01.05.24", "Vermieter GmbH", "Miete Mai", "-800,00"),
+    ("15.05.24", "REWE", "Einkauf", "-23,45"),
+    ("31.05.24", "Arbeitgeber", "Gehalt", "2.500,00"),
+    ("01.06.24", "REWE", "Einkauf", "-12,10"),
+    ("20.06.24", "Bäckerei", "Brötchen", "-3,50"),
+]
+
+RANGES = [
+    (None, None),
+    ("2024-05-01", "2024-05-31"),
+    ("2024-04-30", "2024-06-01"),
+    ("2024-05-10", "2024-06-30"),
+    ("2024-01-01", "2024-12-31"),
+    ("2024-06-02", "2024-06-19"),
+]
+
+
+def rollup_rows():
+    table = TransactionRollup.__table__
+    return set(db.session.execute(select(table)).all())
+
+
+def assert_rollup_matches_base_table(client):
+    """The maintained rollup equals a rebuild, and the statistics match bank_transaction."""
+    db.session.commit()
+    maintained = rollup_rows()
+    rollup.rebuild()
+    assert rollup_rows() == maintained
+    db.session.rollback()
+
+    transactions = BankTransaction.query.all()
+    for start, end in RANGES:
+        query = {key: value for key, value in (("start_date", start), ("end_date", end)) if value}
+        data = client.get("/api/v1/transactions/statistics", query_string=query).get_json()["data"]
+        expected = [
+            t for t in transactions
+            if (start is None or (t.booking_date and t.booking_date >= date.fromisoformat(start)))
+            and (end is None or (t.booking_date and t.booking_date <= date.fromisoformat(end)))
+        ]
+        amounts = [t.amount_cents for t in expected if t.amount_cents is not None]
+        assert data["summary"]["total_transactions"] == len(expected), (start, end)
+        assert round(data["summary"]["total_amount"] * 100) == sum(amounts), (start, end)
+        assert round(data["summary"]["min_amount"] * 100) == min(amounts, default=0), (start, end)
+        assert round(data["summary"]["max_amount"] * 100) == max(amounts, default=0), (start, end)
+
+        by_category = {}
+        for t in expected:
+            if t.category_id:
+                by_category[t.category_id] = by_category.get(t.category_id, 0) + 1
+        assert {item["id"]: item["transaction_count"] for item in data["categories"]} == by_category, (start, end)
+
+        by_month = {}
+        for t in expected:
+            if t.booking_date:
+                month = (t.booking_date.year, t.booking_date.month)
+                by_month[month] = by_month.get(month, 0) + (t.amount_cents or 0)
+        assert {
+            (item["year"], item["month"]): round(item["total_amount"] * 100) for item in data["monthly_trends"]
+        } == by_month, (start, end)
+
+
+@pytest.fixture
+def imported(client, user, category):
+    """The statement, written with bulk Core inserts, and one ORM transaction."""
+    assert post_csv(client, dkb_csv(ROWS), user.id).status_code == 201
+    db.session.add(BankTransaction(payee="Bar", amount_cents=-500, booking_date=date(2024, 5, 20), user_id=user.id))
+    db.session.commit()
+
+
+def first(purpose):
+    return BankTransaction.query.filter_by(purpose=purpose).first()
+
+
+def test_rollup_after_inserts(client, imported):
+    assert rollup_rows()
+    assert_rollup_matches_base_table(client)
+
+
+def test_rollup_after_amount_change(client, imported):
+    first("Einkauf").amount_cents = -99999
+    assert_rollup_matches_base_table(client)
+
+
+@pytest.mark.parametrize("booking_date", [date(2024, 6, 30), date(2023, 12, 1), None])
+def test_rollup_after_date_change(client, imported, booking_date):
+    first("Miete Mai").booking_date = booking_date
+    assert_rollup_matches_base_table(client)
+
+
+def test_rollup_after_category_change(client, imported, category):
+    first("Gehalt").category_id = category.id
+    assert_rollup_matches_base_table(client)
+
+    response = client.put(f"/api/v1/transactions/{first('Brötchen').id}/category", json={"category_id": category.id})
+    assert response.status_code == 200
+    assert_rollup_matches_base_table(client)
+
+
+def test_rollup_after_rule_applied_in_sql(client, imported, category):
+    rule = make_rule(category, [("payee", "contains", "rewe")])
+    assert apply_rule_to_transactions(rule) == 2
+    assert_rollup_matches_base_table(client)
+
+
+def test_rollup_after_delete(client, imported, category):
+    first("Gehalt").category_id = category.id
+    db.session.commit()
+
+    db.session.delete(first("Gehalt"))
+    db.session.delete(first("Miete April"))
+    assert_rollup_matches_base_table(client)
+
+
+def test_rollup_after_user_delete(client, imported, user):
+    db.session.delete(db.session.get(User, user.id))
+    assert_rollup_matches_base_table(client)
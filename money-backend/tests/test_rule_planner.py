@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import BankTransaction, Category, db
+from app.utils.rule_planner import RuleChangePlanner
+
+from tests.conftest import make_rule
+
+# payee of the stored transactions
+PAYEES = ["Vermieter GmbH", "Vermieter AG", "REWE Markt", "Stadtwerke"]
+
+
+@pytest.fixture
+def groceries(app):
+    category = Category(name="Groceries")
+    db.session.add(category)
+    db.session.commit()
+    return category
+
+
+@pytest.fixture
+def transactions(user):
+    transactions = {
+        payee: BankTransaction(payee=payee, purpose="", amount_cents=-100, user_id=user.id) for payee in PAYEES
+    }
+    db.session.add_all(transactions.values())
+    db.session.commit()
+    return transactions
+
+
+@pytest.fixture
+def rules(category, groceries, transactions):
+    """An earlier groceries rule and the rent rule that is edited, applied to the transactions."""
+    earlier = make_rule(groceries, [("payee", "contains", "rewe")])
+    earlier.created_at = datetime.now() - timedelta(days=1)
+    rent = make_rule(category, [("payee", "ends_with", "gmbh")])
+    categorize(transactions["REWE Markt"], earlier)
+    categorize(transactions["Vermieter GmbH"], rent)
+    db.session.commit()
+    return earlier, rent
+
+
+def categorize(transaction, rule):
+    transaction.category_id = rule.category_id
+    transaction.rule_id = rule.id
+
+
+def categorization(transactions):
+    db.session.expire_all()
+    return {payee: (transaction.category_id, transaction.rule_id) for payee, transaction in transactions.items()}
+
+
+def update_rule(client, rule, conditions, **data):
+    response = client.put(f"/api/v1/rules/{rule.id}", json={
+        "conditions": [{"field": field, "operator": operator, "value": value} for field, operator, value in conditions],
+        **data,
+    })
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_edit_that_removes_matches(client, category, transactions, rules):
+    earlier, rent = rules
+
+    update_rule(client, rent, [("payee", "equals", "nobody")])
+
+    assert categorization(transactions) == {
+        "Vermieter GmbH": (None, None),
+        "Vermieter AG": (None, None),
+        "REWE Markt": (earlier.category_id, earlier.id),
+        "Stadtwerke": (None, None),
+    }
+
+
+def test_edit_that_adds_matches(client, category, transactions, rules):
+    earlier, rent = rules
+
+    body = update_rule(client, rent, [("payee", "starts_with", "vermieter"), ("payee", "contains", "rewe")], logical_operator="OR")
+
+    assert categorization(transactions) == {
+        "Vermieter GmbH": (category.id, rent.id),
+        "Vermieter AG": (category.id, rent.id),
+        # The earlier rule still wins the rows it matches
+        "REWE Markt": (earlier.category_id, earlier.id),
+        "Stadtwerke": (None, None),
+    }
+    assert "1 previous categorizations re-evaluated, 1 transactions re-categorized" in body["message"]
+
+
+def test_edit_leaves_manual_categories(client, category, groceries, transactions, rules):
+    earlier, rent = rules
+    manual = transactions["Stadtwerke"]
+    manual.category_id = groceries.id
+    db.session.commit()
+
+    update_rule(client, rent, [("payee", "contains", "stadtwerke")])
+
+    assert categorization(transactions)["Stadtwerke"] == (groceries.id, None)
+    assert categorization(transactions)["Vermieter GmbH"] == (None, None)
+
+
+def test_edit_without_reapply_only_reverts(client, category, transactions, rules):
+    earlier, rent = rules
+
+    update_rule(client, rent, [("payee", "starts_with", "vermieter")], reapply_rule=False)
+
+    assert categorization(transactions)["Vermieter GmbH"] == (None, None)
+    assert categorization(transactions)["Vermieter AG"] == (None, None)
+
+
+def test_plan_covers_old_and_new_matches_only(category, transactions, rules):
+    earlier, rent = rules
+    planner = RuleChangePlanner(rent)
+    rent.conditions[0].value = "ag"
+    db.session.flush()
+
+    assert planner.affected_ids() == {transactions["Vermieter GmbH"].id, transactions["Vermieter AG"].id}
+    assert sorted(planner.plan(), key=lambda change: change["id"]) == [
+        {"id": transactions["Vermieter GmbH"].id, "category_id": None, "rule_id": None},
+        {"id": transactions["Vermieter AG"].id, "category_id": category.id, "rule_id": rent.id},
+    ]
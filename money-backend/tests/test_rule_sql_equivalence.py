@@ -0,0 +1,88 @@
+from datetime import date
+
+import pytest
+
+from app.models import BankTransaction, db
+from app.utils.rule_engine import CompiledRuleSet, RuleEngine
+from app.utils.rule_sql import apply_rule_to_transactions, find_matching_transaction_ids
+
+from tests.conftest import make_rule
+
+# (payee, purpose, amount_cents, booking_date) of the stored transactions
+TRANSACTIONS = [
+    ("REWE Markt", "Einkauf", -2345, date(2024, 5, 1)),
+    ("rewe", "Einkauf REWE", -1200, date(2024, 6, 1)),
+    ("Vermieter GmbH", "Miete Mai", -80000, date(2024, 5, 2)),
+    ("Vermieter GmbH", "Miete Juni", -80001, date(2024, 6, 2)),
+    ("Bäckerei MÜLLER", "Brötchen", -350, date(2024, 5, 3)),
+    ("Rabatt", "100% zurück", 500, date(2024, 5, 4)),
+    ("Rabatt", "100 Prozent", 500, date(2024, 5, 4)),
+    ("Shop", "order_id 7", -999, date(2024, 5, 5)),
+    ("Shop", "orderxid 7", -999, date(2024, 5, 5)),
+    ("Shop", "C:\\pfad", -1, date(2024, 5, 6)),
+    (None, "Ohne Empfänger", -100, None),
+    ("Ohne Betrag", "", None, date(2024, 5, 7)),
+]
+
+RULES = {
+    "equals": ([("payee", "equals", "rewe")], "AND"),
+    "equals ignores case": ([("payee", "equals", "REWE markt")], "AND"),
+    "contains": ([("purpose", "contains", "rewe")], "AND"),
+    "starts_with": ([("purpose", "starts_with", "miete")], "AND"),
+    "ends_with": ([("payee", "ends_with", "gmbh")], "AND"),
+    "empty value": ([("purpose", "contains", "")], "AND"),
+    "like percent": ([("purpose", "contains", "100%")], "AND"),
+    "like underscore": ([("purpose", "contains", "order_id")], "AND"),
+    "backslash": ([("purpose", "ends_with", "\\pfad")], "AND"),
+    "non-ascii": ([("payee", "contains", "müller")], "AND"),
+    "non-ascii in data only": ([("payee", "starts_with", "bäckerei")], "AND"),
+    "amount equals": ([("amount", "equals", "-800.0")], "AND"),
+    "amount starts_with": ([("amount", "starts_with", "-800")], "AND"),
+    "date": ([("booking_date", "starts_with", "2024-05")], "AND"),
+    "unknown field": ([("nonexistent", "contains", "a")], "AND"),
+    "unknown operator": ([("payee", "greater_than", "a")], "AND"),
+    "and": ([("payee", "contains", "vermieter"), ("purpose", "ends_with", "mai")], "AND"),
+    "or": ([("payee", "equals", "rabatt"), ("purpose", "starts_with", "einkauf")], "OR"),
+    "or with unknown field": ([("nonexistent", "equals", "a"), ("payee", "equals", "shop")], "OR"),
+    "and with fallback field": ([("payee", "equals", "rabatt"), ("amount", "equals", "5.0")], "AND"),
+}
+
+
+@pytest.fixture
+def transactions(user):
+    transactions = [
+        BankTransaction(payee=payee, purpose=purpose, amount_cents=amount_cents, booking_date=booking_date, user_id=user.id)
+        for payee, purpose, amount_cents, booking_date in TRANSACTIONS
+    ]
+    db.session.add_all(transactions)
+    db.session.commit()
+    return transactions
+
+
+def engine_matches(rule, transactions):
+    """Ids the Python rule engine, and the compiled rule set, match."""
+    expected = {transaction.id for transaction in transactions if RuleEngine.evaluate_rule(transaction, rule)}
+    rule_set = CompiledRuleSet([rule])
+    assert {transaction.id for transaction in transactions if rule_set.apply(transaction)[0]} == expected
+    return expected
+
+
+@pytest.mark.parametrize("conditions, logical_operator", RULES.values(), ids=RULES.keys())
+def test_sql_matches_rule_engine(category, transactions, conditions, logical_operator):
+    rule = make_rule(category, conditions, logical_operator)
+
+    assert set(find_matching_transaction_ids(rule)) == engine_matches(rule, transactions)
+
+
+@pytest.mark.parametrize("conditions, logical_operator", RULES.values(), ids=RULES.keys())
+def test_applied_rule_categorizes_rule_engine_matches(category, transactions, conditions, logical_operator):
+    rule = make_rule(category, conditions, logical_operator)
+    expected = engine_matches(rule, transactions)
+
+    assert apply_rule_to_transactions(rule) == len(expected)
+    db.session.commit()
+
+    categorized = {
+        transaction.id for transaction in BankTransaction.query.filter_by(category_id=category.id, rule_id=rule.id)
+    }
+    assert categorized == expected
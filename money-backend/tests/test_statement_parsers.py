@@ -0,0 +1,138 @@
+import io
+from datetime import date
+
+import pytest
+
+from app.config import config
+from app.utils.csv_import import CsvImportError
+from app.utils.statement_parsers import PayPalParser, TradeRepublicParser, detect_parser, iter_dkb_transactions
+
+from tests.conftest import config_default, dkb_csv
+
+# DKB exports have four metadata lines and the column header before the first row
+DKB_FIRST_ROW_LINE = 6
+
+TRADEREPUBLIC = (
+    "Buchungsdatum;Umsatztyp;Betrag (€);Verwendungszweck\n"
+    "2024-05-01T10:15:00;Einzahlung;1.500.00;Einzahlung\n"
+    "2024-05-02T08:00:00;Kartenzahlung;-12.5;REWE Markt\n"
+    "2024-05-03T09:30:00;Zinsen;0.07;Zinsen Mai\n"
+)
+
+PAYPAL = (
+    '"Datum","Uhrzeit","Zeitzone","Name","Typ","Status","Währung","Brutto","Gebühr","Netto","Transaktionscode","Betreff"\n'
+    '"01.05.2024","10:00:00","CEST","Shop GmbH","Handyzahlung","Abgeschlossen","EUR","-1.234,56","0,00","-1.234,56","1AB","Bestellung 7"\n'
+    '"02.05.2024","11:00:00","CEST","Shop Inc","Allgemeine Zahlung","Abgeschlossen","USD","-10,00","0,00","-10,00","2CD",""\n'
+    '"03.05.2024","12:00:00","CEST","Anna","Zahlung erhalten","Abgeschlossen","EUR","20,00","-0,50","19,50","3EF","Danke"\n'
+)
+
+
+def parse(parser, text, user_id=1):
+    return list(parser.iter_transactions(io.BytesIO(text.encode("utf-8")), user_id))
+
+
+def test_dkb_rows():
+    rows = list(iter_dkb_transactions(io.BytesIO(dkb_csv([("01.05.24", "REWE", "Einkauf", "-1.234,56")])), 7))
+
+    assert rows == [{
+        "booking_date": "01.05.24",
+        "value_date": "01.05.24",
+        "status": "Gebucht",
+        "payer": "Me",
+        "payee": "REWE",
+        "purpose": "Einkauf",
+        "transaction_type": "Ausgang",
+        "iban": "DE11111111111111111111",
+        "counterparty_iban": "DE22",
+        "amount_cents": -123456,
+        "creditor_id": "",
+        "mandate_reference": "",
+        "customer_reference": "",
+        "user_id": 7,
+    }]
+
+
+def test_dkb_malformed_row_reports_its_line():
+    data = dkb_csv([("01.05.24", "REWE", "Einkauf", "-1,00"), ("02.05.24", "REWE", "Einkauf", "1,2,3")])
+
+    with pytest.raises(CsvImportError) as error:
+        list(iter_dkb_transactions(io.BytesIO(data), 1))
+
+    assert "row 2" in str(error.value)
+    assert error.value.line == DKB_FIRST_ROW_LINE + 1
+
+
+def test_traderepublic_rows(monkeypatch):
+    monkeypatch.setattr(config, "MAIN_IBAN", "DE99999999999999999999")
+
+    rows = parse(TradeRepublicParser(), TRADEREPUBLIC)
+
+    assert [(row["booking_date"], row["amount_cents"], row["transaction_type"], row["status"]) for row in rows] == [
+        (date(2024, 5, 1), 150000, "Eingang", "Einzahlung"),
+        (date(2024, 5, 2), -1250, "Ausgang", "Kartenzahlung"),
+        (date(2024, 5, 3), 7, "Eingang", "Zinsen"),
+    ]
+    assert {row["iban"] for row in rows} == {config.TRADEREPUBLIC_IBAN}
+    # Only the deposit is booked against the main account
+    assert [row["counterparty_iban"] for row in rows] == ["DE99999999999999999999", "", ""]
+
+
+def test_traderepublic_deposits_need_a_main_iban(monkeypatch):
+    monkeypatch.setattr(config, "MAIN_IBAN", "")
+
+    assert [row["counterparty_iban"] for row in parse(TradeRepublicParser(), TRADEREPUBLIC)] == ["", "", ""]
+
+
+def test_traderepublic_malformed_row_reports_its_line():
+    with pytest.raises(CsvImportError) as error:
+        parse(TradeRepublicParser(), TRADEREPUBLIC + "2024-05-04T10:00:00;Kartenzahlung;zwölf;Kiosk\n")
+
+    assert "row 4" in str(error.value)
+    assert error.value.line == 5
+
+
+def test_traderepublic_missing_columns():
+    with pytest.raises(CsvImportError, match="Missing columns Umsatztyp"):
+        parse(TradeRepublicParser(), "Buchungsdatum;Betrag (€);Verwendungszweck\n")
+
+
+def test_paypal_rows_in_euro():
+    rows = parse(PayPalParser(), PAYPAL)
+
+    assert [
+        (row["booking_date"], row["amount_cents"], row["payer"], row["payee"], row["purpose"], row["customer_reference"])
+        for row in rows
+    ] == [
+        (date(2024, 5, 1), -123456, "", "Shop GmbH", "Bestellung 7", "1AB"),
+        (date(2024, 5, 3), 1950, "Anna", "", "Danke", "3EF"),
+    ]
+
+
+def test_paypal_malformed_row_reports_its_line():
+    data = PAYPAL + '"04.05.2024","13:00:00","CEST","Kiosk","Handyzahlung","Abgeschlossen","EUR","x","0,00","x","4GH",""\n'
+
+    with pytest.raises(CsvImportError) as error:
+        parse(PayPalParser(), data)
+
+    assert error.value.line == 5
+
+
+@pytest.mark.parametrize(
+    "data, name",
+    [
+        (dkb_csv([("01.05.24", "REWE", "Einkauf", "-1,00")]), "dkb"),
+        (TRADEREPUBLIC.encode("utf-8"), "traderepublic"),
+        (PAYPAL.encode("utf-8"), "paypal"),
+    ],
+)
+def test_detect_parser(data, name):
+    assert detect_parser(io.BytesIO(data)).name == name
+
+
+def test_detect_parser_rejects_unknown_formats():
+    with pytest.raises(CsvImportError, match="Unrecognized statement format"):
+        detect_parser(io.BytesIO(b"a;b;c\n1;2;3\n"))
+
+
+def test_deposit_keywords_default(monkeypatch):
+    assert config_default(monkeypatch, "TRADEREPUBLIC_DEPOSIT_KEYWORDS") == ["Einzahlung"]
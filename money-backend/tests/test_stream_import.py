@@ -0,0 +1,22 @@
+from app.config import config
+from app.models import BankTransaction
+
+from tests.conftest import dkb_csv, post_csv
+
+# DKB exports have four metadata lines and the column header before the first row
+FIRST_ROW_LINE = 6
+
+
+def test_malformed_row_reports_line_and_committed_rows(client, user, monkeypatch):
+    monkeypatch.setattr(config, "IMPORT_CHUNK_SIZE", 2)
+    rows = [(f"0{day}.05.24", "REWE", f"Einkauf {day}", f"-{day},00") for day in range(1, 6)]
+    rows[4] = ("05.05.24", "REWE", "Einkauf 5", "kaputt")
+
+    response = post_csv(client, dkb_csv(rows), user.id)
+
+    body = response.get_json()
+    assert response.status_code == 400
+    # The two chunks before the failing one stay imported
+    assert body["data"] == {"rows_committed": 4, "inserted": 4, "line": FIRST_ROW_LINE + 4}
+    assert f"line {FIRST_ROW_LINE + 4}" in body["message"]
+    assert BankTransaction.query.count() == 4
@@ -0,0 +1,7 @@
+def test_columns_list_rule_fields(client):
+    response = client.get("/api/v1/transactions/columns")
+
+    columns = response.get_json()["data"]["columns"]
+    assert "amount" in columns
+    assert "amount_cents" not in columns
+    assert "hash_version" not in columns
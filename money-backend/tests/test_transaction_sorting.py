@@ -0,0 +1,39 @@
+import pytest
+
+from app.models import BankTransaction, db
+
+from tests.conftest import dkb_csv, post_csv
+
+ROWS = [("02.05.24", "B", "Zwei", "-2,00"), ("03.05.24", "A", "Drei", "-3,00"), ("01.05.24", "C", "Eins", "-1,00")]
+
+
+@pytest.fixture
+def imported(client, user):
+    assert post_csv(client, dkb_csv(ROWS), user.id).status_code == 201
+
+
+@pytest.mark.parametrize("sort_by", ["foo", "category", "__class__"])
+@pytest.mark.parametrize("cursor", [False, True], ids=["pages", "cursor"])
+def test_unknown_sort_by_falls_back_to_booking_date(client, imported, sort_by, cursor):
+    query = {"sort_by": sort_by, "fields": "purpose"}
+    if cursor:
+        query["cursor"] = ""
+
+    response = client.get("/api/v1/transactions/", query_string=query)
+
+    assert response.status_code == 200
+    assert [item["purpose"] for item in response.get_json()["data"]] == ["Drei", "Zwei", "Eins"]
+
+
+@pytest.mark.parametrize("cursor", [False, True], ids=["pages", "cursor"])
+def test_unknown_sort_by_falls_back_to_booking_date_by_category(client, category, imported, cursor):
+    BankTransaction.query.update({"category_id": category.id})
+    db.session.commit()
+    query = {"sort_by": "foo", "sort_order": "asc", "fields": "purpose", "include_subcategories": "false"}
+    if cursor:
+        query["cursor"] = ""
+
+    response = client.get(f"/api/v1/transactions/by-category/{category.id}", query_string=query)
+
+    assert response.status_code == 200
+    assert [item["purpose"] for item in response.get_json()["data"]["transactions"]] == ["Eins", "Zwei", "Drei"]